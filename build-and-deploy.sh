@@ -11,6 +11,21 @@ mkdir -p rag/web/data/processed/index
 cp rag/data/processed/index/faiss.index rag/web/data/processed/index/
 cp rag/data/processed/index/chunks.csv rag/web/data/processed/index/
 cp rag/data/processed/index/config.json rag/web/data/processed/index/
+if [ -d rag/data/processed/index/chunks.cols ]; then
+    cp -r rag/data/processed/index/chunks.cols rag/web/data/processed/index/  # columnar chunk metadata (else chunks.csv is read)
+fi
+if [ -f rag/data/processed/index/lexical.npz ]; then
+    cp rag/data/processed/index/lexical.npz rag/web/data/processed/index/  # course codes + BM25 postings
+fi
+if [ -f rag/data/processed/index/vectors.f32.npy ]; then
+    cp rag/data/processed/index/vectors.f32.npy rag/web/data/processed/index/  # full-precision re-rank vectors (--vectors float16/int8)
+fi
+if [ -f rag/data/processed/index/similar.npz ]; then
+    cp rag/data/processed/index/similar.npz rag/web/data/processed/index/  # precomputed similar courses
+fi
+if [ -d rag/data/processed/index/encoder ]; then
+    cp -r rag/data/processed/index/encoder rag/web/data/processed/index/  # exported ONNX query encoder
+fi
 
 echo "✅ Data files copied successfully"
 
@@ -13,6 +13,8 @@ function AIAssistant() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [hasSearched, setHasSearched] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   // API URL - using Render deployment
   const API_URL = 'https://schedule-sculptor-rag-811303121618.us-central1.run.app//query';
@@ -28,6 +30,7 @@ function AIAssistant() {
     setLoading(true);
     setError('');
     setHasSearched(true);
+    setNextCursor(null);
 
     try {
       console.log('🔄 [Frontend] Sending request to API:', {
@@ -38,7 +41,8 @@ function AIAssistant() {
 
       const requestBody = {
         query: query,
-        top_courses: 8
+        top_courses: 8,
+        paginate: true
       };
 
       console.log('📤 [Frontend] Request body:', JSON.stringify(requestBody, null, 2));
@@ -94,6 +98,7 @@ function AIAssistant() {
       });
       
       setResults(data.results || []);
+      setNextCursor(data.next_cursor || null);
       
     } catch (err) {
       console.error('❌ [Frontend] Search failed:', {
@@ -108,6 +113,41 @@ function AIAssistant() {
     }
   };
 
+  // Next page of the same search: the server reads it from the stored ranking instead of searching again
+  const handleShowMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    setError('');
+
+    try {
+      const response = await fetch(`${API_URL}/next`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ cursor: nextCursor }),
+      });
+      const data = await response.json();
+
+      if (response.status === 410) {
+        // The index was reloaded since the first page: the search has to be run again
+        setNextCursor(null);
+        throw new Error('These results have expired - please search again');
+      }
+      if (!response.ok || data.error) {
+        throw new Error(data.error || `Request failed with status: ${response.status}`);
+      }
+
+      setResults((prev) => [...prev, ...(data.results || [])]);
+      setNextCursor(data.next_cursor || null);
+    } catch (err) {
+      console.error('❌ [Frontend] Loading more results failed:', err);
+      setError(`Unable to load more courses: ${err.message}`);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const exampleQueries = [
     "Courses about machine learning",
     "Classes with no prerequisites",
@@ -207,7 +247,7 @@ function AIAssistant() {
                 <div
                   key={idx}
                   className="bg-white border border-gray-200 rounded-lg p-6 hover:shadow-lg transition-shadow animate-fade-in"
-                  style={{ animationDelay: `${idx * 0.1}s` }}
+                  style={{ animationDelay: `${(idx % 8) * 0.1}s` }}
                 >
                   <div className="flex justify-between items-start mb-3">
                     <div>
@@ -233,6 +273,18 @@ function AIAssistant() {
                 </div>
               ))}
             </div>
+
+            {nextCursor && (
+              <div className="text-center mt-8">
+                <button
+                  onClick={handleShowMore}
+                  disabled={loadingMore}
+                  className="px-6 py-2 bg-purple-700 text-white rounded-lg hover:bg-purple-800 transition-colors disabled:bg-gray-400 disabled:cursor-not-allowed"
+                >
+                  {loadingMore ? 'Loading...' : 'Show More Courses'}
+                </button>
+              </div>
+            )}
           </div>
         )}
 
@@ -255,6 +307,7 @@ function AIAssistant() {
                 setQuery('');
                 setHasSearched(false);
                 setResults([]);
+                setNextCursor(null);
               }}
               className="px-6 py-2 bg-purple-700 text-white rounded-lg hover:bg-purple-800 transition-colors"
             >
@@ -13,6 +13,7 @@ export function generatePlan(preferences, parsedAudit, courseCatalog) {
   const completedCodes = (parsedAudit?.completedCourses || []).map(c => c.code);
   const inProgressCodes = (parsedAudit?.inProgressCourses || []).map(c => c.code);
   const takenCodes = new Set([...completedCodes, ...inProgressCodes]);
+  const completedSet = new Set(completedCodes);
 
   // 2. Build a direct mapping: requirement -> { needed, courseList }
   const reqMap = {};
@@ -25,8 +26,12 @@ export function generatePlan(preferences, parsedAudit, courseCatalog) {
   });
 
   // 3. Helper: find a valid catalog entry for a given code
+  const catalogByCode = new Map();
+  for (const c of courseCatalog) {
+    if (!catalogByCode.has(c.code)) catalogByCode.set(c.code, c);
+  }
   function getCatalogEntry(code) {
-    return courseCatalog.find(c => c.code === code) || null;
+    return catalogByCode.get(code) || null;
   }
 
   // 4. Build the final suggestion ensuring each requirement is fulfilled
@@ -45,7 +50,7 @@ export function generatePlan(preferences, parsedAudit, courseCatalog) {
       
       const eligible = checkPrerequisites(
         catalogCourse.prereqs,
-        completedCodes
+        completedSet
       );
       if (!eligible) continue;
       validCandidates.push({ ...catalogCourse, category });
@@ -75,9 +80,9 @@ export function generatePlan(preferences, parsedAudit, courseCatalog) {
   };
 }
 
-function checkPrerequisites(prereqCodes, completedCodes) {
+function checkPrerequisites(prereqCodes, completedSet) {
   if (!prereqCodes || prereqCodes.length === 0) return true;
-  return prereqCodes.every(code => completedCodes.includes(code));
+  return prereqCodes.every(code => completedSet.has(code));
 }
 
 // --- UPDATED RATIONALE GENERATOR ---
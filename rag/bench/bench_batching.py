@@ -0,0 +1,66 @@
+# rag/bench/bench_batching.py
+"""
+Throughput comparison: one-at-a-time /query path vs. micro-batched (coalesced) path.
+
+Fires the same query mix from N concurrent client threads against the Flask
+app's retrieval core, with the query caches disabled so every request really
+encodes and searches.
+
+    python bench_batching.py --requests 512 --concurrency 16 --window-ms 2 --max-batch 32
+"""
+import argparse, os, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Measure raw encode+search cost, not cache hits
+os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+os.environ["RESULTS_CACHE_SIZE"] = "0"
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "web"))
+
+import app  # noqa: E402
+from coalescer import QueryCoalescer  # noqa: E402
+
+QUERIES = [
+    "machine learning", "no prerequisites", "CS 211", "natural language processing",
+    "data visualization electives", "intro to statistics", "database design",
+    "cybersecurity", "microeconomics", "cognitive psychology", "operations research",
+    "bioinformatics", "financial accounting", "public speaking", "organic chemistry",
+    "art history survey",
+]
+
+def run(n_requests: int, concurrency: int, top_courses: int) -> float:
+    qs = [f"{QUERIES[i % len(QUERIES)]} {i}" for i in range(n_requests)]  # unique texts
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        t0 = time.perf_counter()
+        list(pool.map(lambda q: app.retrieve_and_group(q, top_courses), qs))
+        return time.perf_counter() - t0
+
+def main(requests: int, concurrency: int, window_ms: float, max_batch: int, top_courses: int):
+    app.load_index()
+    if not app.index_loaded:
+        raise SystemExit("[bench] index failed to load")
+    run(concurrency, concurrency, top_courses)  # warm-up
+
+    app.QUERY_BATCH_WINDOW_MS = 0
+    t_single = run(requests, concurrency, top_courses)
+
+    app.QUERY_BATCH_WINDOW_MS = window_ms
+    app.coalescer = QueryCoalescer(app._retrieve_batch_for_coalescer, window_ms=window_ms, max_batch=max_batch)
+    t_batched = run(requests, concurrency, top_courses)
+    stats = app.coalescer.stats()
+
+    print(f"\n[bench] {requests} requests, concurrency={concurrency}, top_courses={top_courses}")
+    print(f"  one-at-a-time : {t_single:7.2f}s  {requests / t_single:8.1f} req/s")
+    print(f"  coalesced     : {t_batched:7.2f}s  {requests / t_batched:8.1f} req/s"
+          f"  (window={window_ms}ms, max_batch={max_batch}, avg batch={stats['avg_batch_size']})")
+    print(f"  speedup       : {t_single / t_batched:.2f}x")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=512)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--window-ms", type=float, default=2.0)
+    ap.add_argument("--max-batch", type=int, default=32)
+    ap.add_argument("--top-courses", type=int, default=8)
+    args = ap.parse_args()
+    main(args.requests, args.concurrency, args.window_ms, args.max_batch, args.top_courses)
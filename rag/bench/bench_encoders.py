@@ -0,0 +1,141 @@
+# rag/bench/bench_encoders.py
+"""
+Encoder backend parity and latency check (rag/src/encoders.py).
+
+Encodes the golden queries (expanded exactly like the API does) and a sample
+of chunk texts with the full-precision torch reference and with each candidate
+backend, then reports per backend:
+  drift           1 - cos(reference, candidate) embedding: mean / max
+  top-k overlap   |top-k chunks (reference) ∩ top-k chunks (candidate)| / k
+  course overlap  the same for the grouped top courses the API returns
+  latency         single-query encode p50/p99 (ms) and batched chunks/s
+
+ONNX backends not already exported next to the index are exported into a
+temporary directory first (needs `pip install "sentence-transformers[onnx]"`).
+Exits 1 when a backend exceeds --max-drift or falls below --min-overlap.
+
+    python bench_encoders.py --backends torch_int8 onnx onnx_int8
+"""
+import argparse, json, sys, tempfile, time
+from pathlib import Path
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+from ann_index import apply_search_params, read_index  # noqa: E402
+from course_table import CourseTable  # noqa: E402
+from encoders import ENCODER_BACKENDS, QUANTIZE_TARGETS, encoder_config, export_encoder, load_encoder  # noqa: E402
+from metadata_store import load_chunk_table  # noqa: E402
+from query_expansion import expand_query  # noqa: E402
+
+def candidate(cfg: dict, index_dir: Path, backend: str, tmp: Path, quantize_for: str):
+    """Config + base dir for `backend`, reusing the index's own export when it matches."""
+    if encoder_config(cfg)["backend"] == backend:
+        return cfg, index_dir
+    return {**cfg, "encoder": export_encoder(cfg["model"], backend, tmp / backend, quantize_for)}, tmp
+
+def latency(model, queries: list, runs: int) -> dict:
+    times = []
+    for _ in range(runs):
+        for q in queries:
+            t0 = time.perf_counter()
+            model.encode([q], normalize_embeddings=True)
+            times.append(time.perf_counter() - t0)
+    ms = np.asarray(times) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99))}
+
+def throughput(model, texts: list) -> float:
+    t0 = time.perf_counter()
+    model.encode(texts, batch_size=64, normalize_embeddings=True)
+    return len(texts) / (time.perf_counter() - t0)
+
+def encode(model, texts: list) -> np.ndarray:
+    return np.asarray(model.encode(texts, batch_size=64, normalize_embeddings=True), dtype="float32")
+
+def overlap(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean([len(set(x[x >= 0]) & set(y[y >= 0])) / max(1, len(x)) for x, y in zip(a, b)]))
+
+def course_overlap(table: CourseTable, ref: tuple, cand: tuple, top_courses: int) -> float:
+    vals = []
+    for rs, ri, cs, ci in zip(ref[0], ref[1], cand[0], cand[1]):
+        a = {r["course_code"] for r in table.group(rs, ri, top_courses)}
+        b = {r["course_code"] for r in table.group(cs, ci, top_courses)}
+        vals.append(len(a & b) / max(1, len(a)))
+    return float(np.mean(vals))
+
+def measure(model, queries, docs, index, table, ref: dict, k: int, top_courses: int, runs: int) -> dict:
+    q_embs, d_embs = encode(model, queries), encode(model, docs)
+    drift = np.concatenate([1 - (q_embs * ref["q_embs"]).sum(1), 1 - (d_embs * ref["d_embs"]).sum(1)])
+    search = index.search(q_embs, max(k, top_courses * 5))
+    return {
+        "drift_mean": float(drift.mean()),
+        "drift_max": float(drift.max()),
+        "topk_overlap": overlap(ref["search"][1][:, :k], search[1][:, :k]),
+        "course_overlap": course_overlap(table, ref["search"], search, top_courses),
+        **latency(model, queries, runs),
+        "docs_per_s": throughput(model, docs),
+    }
+
+def main(index_dir: Path, golden: Path, backends: list, n_docs: int, k: int, top_courses: int, runs: int,
+         quantize_for: str, max_drift: float, min_overlap: float, out: Path = None):
+    cfg = json.loads((index_dir / "config.json").read_text())
+    index = read_index(index_dir / "faiss.index", cfg)
+    apply_search_params(index, cfg)
+    chunks = load_chunk_table(index_dir)
+    table = CourseTable(chunks)
+    queries = [expand_query(q["query"]) for q in json.loads(golden.read_text())["queries"]]
+    rng = np.random.default_rng(0)
+    texts = np.asarray(chunks["text"], dtype=object)
+    docs = [str(t) for t in texts[rng.choice(len(texts), min(n_docs, len(texts)), replace=False)]]
+
+    reference = load_encoder({"model": cfg["model"]})
+    q_ref = encode(reference, queries)
+    ref = {"q_embs": q_ref, "d_embs": encode(reference, docs), "search": index.search(q_ref, max(k, top_courses * 5))}
+    rows = {"torch": measure(reference, queries, docs, index, table, ref, k, top_courses, runs)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            if backend == "torch":
+                continue
+            b_cfg, base = candidate(cfg, index_dir, backend, Path(tmp), quantize_for)
+            rows[backend] = measure(load_encoder(b_cfg, base), queries, docs, index, table, ref, k, top_courses, runs)
+
+    print(f"\n[encoders] {cfg['model']}: {len(queries)} golden queries + {len(docs)} chunks, k={k}, top_courses={top_courses}")
+    print(f"{'backend':>11} {'drift mean':>10} {'drift max':>9} {'top-k ovl':>9} {'course ovl':>10} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'chunks/s':>9} {'speedup':>7}  check")
+    failed = []
+    base_p50 = rows["torch"]["p50_ms"]
+    for backend, r in rows.items():
+        ok = r["drift_max"] <= max_drift and r["topk_overlap"] >= min_overlap
+        r["pass"] = ok
+        if not ok:
+            failed.append(backend)
+        print(f"{backend:>11} {r['drift_mean']:>10.5f} {r['drift_max']:>9.5f} {r['topk_overlap']:>9.3f} {r['course_overlap']:>10.3f} "
+              f"{r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f} {r['docs_per_s']:>9.1f} {base_p50 / r['p50_ms']:>6.2f}x  {'ok' if ok else 'FAIL'}")
+
+    if out:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps({"model": cfg["model"], "k": k, "top_courses": top_courses, "backends": rows},
+                                  indent=2, sort_keys=True))
+        print(f"[encoders] report written to {out}")
+    if failed:
+        print(f"[encoders] over budget (max drift {max_drift}, min top-k overlap {min_overlap}): {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=str(BENCH_DIR.parent / "data" / "processed" / "index"))
+    ap.add_argument("--golden", default=str(BENCH_DIR / "golden" / "golden_queries_v1.json"))
+    ap.add_argument("--backends", nargs="+", choices=ENCODER_BACKENDS, default=["torch_int8", "onnx", "onnx_int8"])
+    ap.add_argument("--docs", type=int, default=256, help="chunk texts sampled for drift and throughput")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--top-courses", type=int, default=8)
+    ap.add_argument("--runs", type=int, default=5, help="passes over the queries for latency")
+    ap.add_argument("--quantize-for", choices=QUANTIZE_TARGETS, default="avx2")
+    ap.add_argument("--max-drift", type=float, default=0.02, help="max allowed 1 - cosine for any text")
+    ap.add_argument("--min-overlap", type=float, default=0.9, help="min mean top-k chunk overlap")
+    ap.add_argument("--out", help="optional JSON report path")
+    args = ap.parse_args()
+    main(Path(args.index_dir), Path(args.golden), args.backends, args.docs, args.k, args.top_courses, args.runs,
+         args.quantize_for, args.max_drift, args.min_overlap, Path(args.out) if args.out else None)
@@ -0,0 +1,91 @@
+# rag/bench/bench_expansion.py
+"""
+Query expansion modes (rag/src/query_expansion.py) on the golden query set.
+
+Runs every golden query through concat (synonyms appended to the text), none,
+and vector mode at each --weights value, and reports per mode:
+  tokens      mean / max tokens the encoder sees per query
+  expand+encode  single-query p50/p99 (ms), including the topic-vector blend
+  quality     recall@k, MRR and hit rate (same scoring as run_benchmarks.py)
+plus the one-time cost of embedding the synonym groups for vector mode.
+
+    python bench_expansion.py --weights 0.5 0.6 0.7 0.8 --out reports/expansion.json
+"""
+import argparse, json, sys, time
+from pathlib import Path
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+from course_table import CourseTable  # noqa: E402
+from query import load_index  # noqa: E402
+from query_expansion import DEFAULT_QUERY_WEIGHT, QueryExpander  # noqa: E402
+from run_benchmarks import percentiles, run_query, score_query  # noqa: E402
+
+def token_counts(model, texts: list) -> np.ndarray:
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return np.asarray([len(t.split()) for t in texts])
+    return np.asarray([len(ids) for ids in tokenizer(texts)["input_ids"]])
+
+def measure(expander: QueryExpander, queries: list, index, model, table, top_courses: int, repeat: int) -> dict:
+    run_query(queries[0]["query"], top_courses, index, model, table, expander)  # warm-up
+    times, scored = [], []
+    for q in queries:
+        for _ in range(repeat):
+            results, t = run_query(q["query"], top_courses, index, model, table, expander)
+            times.append(t["expand"] + t["encode"])
+        scored.append(score_query([r["course_code"] for r in results], q["expected"]))
+    tokens = token_counts(model, expander.prepare([q["query"] for q in queries])[0])
+    lat = percentiles(times)
+    return {
+        "tokens_mean": round(float(tokens.mean()), 1),
+        "tokens_max": int(tokens.max()),
+        "encode_p50_ms": lat["p50"],
+        "encode_p99_ms": lat["p99"],
+        "recall_at_k": round(float(np.mean([s["recall"] for s in scored])), 4),
+        "mrr": round(float(np.mean([s["rr"] for s in scored])), 4),
+        "hit_rate": round(float(np.mean([s["rank"] is not None for s in scored])), 4),
+    }
+
+def main(index_dir: Path, golden: Path, weights: list, top_courses: int, repeat: int, out: Path = None):
+    queries = json.loads(golden.read_text())["queries"]
+    index, df, model, cfg = load_index(index_dir.resolve())
+    table = CourseTable(df)
+
+    t0 = time.perf_counter()
+    group_vecs = QueryExpander(mode="vector").group_vectors(model)
+    setup_ms = (time.perf_counter() - t0) * 1000
+
+    modes = {"concat": QueryExpander(mode="concat"), "none": QueryExpander(mode="none")}
+    for w in weights:
+        modes[f"vector@{w:g}"] = QueryExpander(mode="vector", query_weight=w)
+    rows = {name: measure(exp, queries, index, model, table, top_courses, repeat) for name, exp in modes.items()}
+
+    print(f"\n[expansion] {cfg['model']}: {len(queries)} golden queries x {repeat}, recall@{top_courses}; "
+          f"{len(group_vecs)} topic vectors embedded once in {setup_ms:.1f} ms")
+    print(f"{'mode':>11} {'tokens':>7} {'max':>4} {'p50 ms':>7} {'p99 ms':>7} {'speedup':>7} {'recall':>7} {'MRR':>6} {'hits':>5}")
+    base = rows["concat"]
+    for name, r in rows.items():
+        print(f"{name:>11} {r['tokens_mean']:>7.1f} {r['tokens_max']:>4} {r['encode_p50_ms']:>7.2f} {r['encode_p99_ms']:>7.2f} "
+              f"{base['encode_p50_ms'] / r['encode_p50_ms']:>6.2f}x {r['recall_at_k']:>7.3f} {r['mrr']:>6.3f} {r['hit_rate']:>5.2f}")
+
+    if out:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps({"model": cfg["model"], "top_courses": top_courses, "repeat": repeat,
+                                   "topic_vectors_ms": round(setup_ms, 1), "modes": rows}, indent=2, sort_keys=True))
+        print(f"[expansion] report written to {out}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=str(BENCH_DIR.parent / "data" / "processed" / "index"))
+    ap.add_argument("--golden", default=str(BENCH_DIR / "golden" / "golden_queries_v1.json"))
+    ap.add_argument("--weights", type=float, nargs="+", default=[0.5, 0.6, DEFAULT_QUERY_WEIGHT, 0.8],
+                    help="raw query weights to try in vector mode")
+    ap.add_argument("--top-courses", type=int, default=8, help="k for recall@k / MRR")
+    ap.add_argument("--repeat", type=int, default=5, help="timed runs per query")
+    ap.add_argument("--out", help="optional JSON report path")
+    args = ap.parse_args()
+    main(Path(args.index_dir), Path(args.golden), args.weights, args.top_courses, args.repeat,
+         Path(args.out) if args.out else None)
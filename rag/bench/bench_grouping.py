@@ -0,0 +1,91 @@
+# rag/bench/bench_grouping.py
+"""
+Per-query course-grouping cost: the previous pandas path (iloc copy, sort_values,
+drop_duplicates, iterrows) vs. CourseTable.group (NumPy over idxs/scores).
+
+No model or FAISS needed: hit rows are sampled from the chunk table with
+descending scores, which is exactly what index.search hands to the grouper.
+
+    python bench_grouping.py --queries 2000 --chunk-k 50 --top-courses 8
+"""
+import argparse, sys, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from course_table import CourseTable  # noqa: E402
+from metadata_store import load_chunk_table  # noqa: E402
+
+def legacy_group(chunks_df: pd.DataFrame, scores, idxs, top_courses: int):
+    """The pre-CourseTable retrieve_and_group grouping, kept here as the baseline."""
+    res_df = chunks_df.iloc[idxs].copy()
+    res_df.insert(0, "score", scores)
+    if "metadata.parent_id" not in res_df.columns:
+        res_df["metadata.parent_id"] = res_df["id"]
+    best = (
+        res_df
+        .sort_values("score", ascending=False)
+        .drop_duplicates(subset=["metadata.parent_id"], keep="first")
+        .copy()
+    )
+    top = best.head(top_courses).copy()
+
+    def safe_get(row, col, default=""):
+        val = row.get(col, default)
+        return str(val) if pd.notna(val) else default
+
+    results = []
+    for _, row in top.iterrows():
+        results.append({
+            "course_code": safe_get(row, "metadata.course_code"),
+            "class_name": safe_get(row, "metadata.class_name"),
+            "subject": safe_get(row, "metadata.subject") or safe_get(row, "metadata.subject_code"),
+            "description": safe_get(row, "text"),
+            "score": float(row["score"]) if "score" in row else 0.0,
+        })
+    return results
+
+def time_per_query(fn, hits) -> float:
+    t0 = time.perf_counter()
+    for scores, idxs in hits:
+        fn(scores, idxs)
+    return (time.perf_counter() - t0) / len(hits) * 1e6  # µs
+
+def main(index_dir: str, queries: int, chunk_k: int, top_courses: int, fmt: str):
+    chunks = load_chunk_table(Path(index_dir), fmt=fmt)
+    t0 = time.perf_counter()
+    table = CourseTable(chunks)
+    t_build = time.perf_counter() - t0
+
+    rng = np.random.default_rng(0)
+    hits = []
+    for _ in range(queries):
+        idxs = rng.integers(0, len(chunks), chunk_k)
+        scores = np.sort(rng.random(chunk_k).astype("float32"))[::-1]
+        hits.append((scores, idxs))
+
+    mismatches = sum(
+        legacy_group(chunks, s.tolist(), i.tolist(), top_courses) != table.group(s, i, top_courses)
+        for s, i in hits[:100]
+    )
+    us_old = time_per_query(lambda s, i: legacy_group(chunks, s.tolist(), i.tolist(), top_courses), hits)
+    us_new = time_per_query(lambda s, i: table.group(s, i, top_courses), hits)
+
+    print(f"[bench] {len(chunks):,} chunks / {len(table):,} courses ({fmt} table); "
+          f"CourseTable built in {t_build * 1000:.1f} ms")
+    print(f"[bench] {queries} queries, chunk_k={chunk_k}, top_courses={top_courses}")
+    print(f"  pandas grouping    : {us_old:9.1f} µs/query")
+    print(f"  CourseTable.group  : {us_new:9.1f} µs/query")
+    print(f"  speedup            : {us_old / us_new:.1f}x  (result mismatches on 100 samples: {mismatches})")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=str(Path(__file__).resolve().parents[1] / "data" / "processed" / "index"))
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--chunk-k", type=int, default=50)
+    ap.add_argument("--top-courses", type=int, default=8)
+    ap.add_argument("--format", choices=("auto", "columnar", "csv"), default="auto")
+    args = ap.parse_args()
+    main(args.index_dir, args.queries, args.chunk_k, args.top_courses, args.format)
@@ -0,0 +1,65 @@
+# rag/bench/bench_metadata_store.py
+"""
+Cold-start time and resident memory: chunks.csv (pandas) vs. the mmap'd columnar store.
+
+Each format is measured in a fresh subprocess: load the chunk table, then fetch
+a few hundred random rows the way the /query path does.
+
+    python bench_metadata_store.py --index-dir ../data/processed/index
+"""
+import argparse, json, subprocess, sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+
+CHILD = r"""
+import json, sys, time
+import numpy as np
+sys.path.insert(0, sys.argv[1])
+from metadata_store import load_chunk_table
+
+def mem():
+    out = {}
+    for line in open("/proc/self/status"):
+        key = line.split(":")[0]
+        if key in ("VmRSS", "RssAnon", "RssFile"):
+            out[key] = int(line.split()[1]) / 1024.0  # MiB
+    return out
+
+before = mem()
+t0 = time.perf_counter()
+tbl = load_chunk_table(sys.argv[2], fmt=sys.argv[3])
+t_load = time.perf_counter() - t0
+rng = np.random.default_rng(0)
+t0 = time.perf_counter()
+for _ in range(200):
+    tbl.iloc[rng.integers(0, len(tbl), 50).tolist()]
+t_fetch = (time.perf_counter() - t0) / 200
+after = mem()
+print(json.dumps({"rows": len(tbl), "load_s": t_load, "fetch_ms": t_fetch * 1000,
+                  "rss_mib": after["VmRSS"] - before["VmRSS"],
+                  "anon_mib": after.get("RssAnon", 0) - before.get("RssAnon", 0),
+                  "file_mib": after.get("RssFile", 0) - before.get("RssFile", 0)}))
+"""
+
+def measure(index_dir: str, fmt: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", CHILD, str(SRC_DIR), index_dir, fmt],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main(index_dir: str):
+    print(f"[bench] index dir: {index_dir}")
+    print(f"{'format':<10} {'rows':>7} {'load (s)':>9} {'fetch 50 rows (ms)':>19} "
+          f"{'RSS +MiB':>9} {'anon +MiB':>10} {'file-backed +MiB':>17}")
+    for fmt in ("csv", "columnar"):
+        r = measure(index_dir, fmt)
+        print(f"{fmt:<10} {r['rows']:>7,} {r['load_s']:>9.3f} {r['fetch_ms']:>19.2f} "
+              f"{r['rss_mib']:>9.1f} {r['anon_mib']:>10.1f} {r['file_mib']:>17.1f}")
+    print("\nFile-backed pages of the columnar store live in the page cache and are shared "
+          "by every worker; anonymous memory is private per process.")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=str(Path(__file__).resolve().parents[1] / "data" / "processed" / "index"))
+    args = ap.parse_args()
+    main(args.index_dir)
@@ -0,0 +1,145 @@
+# rag/bench/bench_planner.py
+"""
+Plan search (rag/src/plan_optimizer.py) vs. the frontend's greedy generatePlan.
+
+Builds --audits synthetic degree audits from the catalog in the index. Each
+audit has a few requirement groups in one subject ("3 of these core courses",
+"2 of these 300/400-level courses", "1 of these gen-eds") plus some completed
+100-level courses. Both planners then schedule every audit:
+  greedy   generatePlan run term after term: shuffle each requirement's eligible
+           courses and take them until the credit cap (prerequisites outside the
+           requirement lists are never scheduled)
+  search   PlanOptimizer.solve at each --budgets value (ms)
+and reports, per planner: share of audits fully planned, share of requirement
+slots filled, mean terms and credits of the complete plans, share proven
+optimal, and p50/p99 latency.
+
+    python bench_planner.py --audits 200 --budgets 20 100 500 --out reports/planner.json
+"""
+import argparse, json, random, sys, time
+from pathlib import Path
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+from filters import FilterIndex  # noqa: E402
+from metadata_store import load_chunk_table  # noqa: E402
+from plan_optimizer import PlanOptimizer, Requirement  # noqa: E402
+from prereq_graph import PrereqGraph  # noqa: E402
+from run_benchmarks import percentiles  # noqa: E402
+
+def make_audits(graph, n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    catalog = graph.codes[:graph.catalog_size]
+    by_subject = {}
+    for code in catalog:
+        by_subject.setdefault(code.split(" ")[0], []).append(code)
+    gated = {graph.codes[i] for i in graph.gated.tolist()}
+    subjects = [s for s, codes in by_subject.items() if len(codes) >= 15 and len(gated.intersection(codes)) >= 3]
+    audits = []
+    for _ in range(n):
+        codes = by_subject[rng.choice(subjects)]
+        core = rng.sample(sorted(gated.intersection(codes)), min(6, len(gated.intersection(codes))))
+        upper = [c for c in codes if c.split(" ")[1][0] in "34" and c not in core]
+        intro = [c for c in codes if c.split(" ")[1][0] == "1"]
+        requirements = [Requirement("Core", rng.randint(2, min(4, len(core))), core)]
+        if len(upper) >= 4:
+            requirements.append(Requirement("Electives", rng.randint(2, 3), rng.sample(upper, min(12, len(upper)))))
+        requirements.append(Requirement("Gen ed", 1, rng.sample(catalog, 8)))
+        audits.append({"completed": rng.sample(intro, min(len(intro), rng.randint(0, 4))), "requirements": requirements})
+    return audits
+
+def greedy_plan(graph, credits, audit: dict, max_credits: float, max_terms: int, rng) -> dict:
+    """generatePlan (frontend/src/lib/planSolver.js) repeated term by term."""
+    done = set(audit["completed"])
+    left = {r.category: r.needed for r in audit["requirements"]}
+    terms = []
+    while any(left.values()) and len(terms) < max_terms:
+        term, load = [], 0.0
+        for req in audit["requirements"]:
+            ok = [c for c in req.courses if c not in done and c not in term and c in graph.ids
+                  and all(graph.codes[p] in done for p in graph.members(graph.requires[graph.ids[c]]))]
+            rng.shuffle(ok)
+            for c in ok[:left[req.category]]:
+                cr = credits[graph.ids[c]]
+                if load + cr > max_credits:
+                    break
+                term.append(c)
+                load += cr
+                left[req.category] -= 1
+        if not term:
+            break
+        terms.append(term)
+        done.update(term)
+    needed = sum(r.needed for r in audit["requirements"])
+    return {"complete": not any(left.values()), "filled": 1 - sum(left.values()) / needed, "terms": len(terms),
+            "credits": float(sum(credits[graph.ids[c]] for t in terms for c in t))}
+
+def summarize(rows: list, times: list) -> dict:
+    complete = [r for r in rows if r["complete"]]
+    lat = percentiles(times)
+    return {
+        "complete": round(len(complete) / len(rows), 4),
+        "slots_filled": round(float(np.mean([r["filled"] for r in rows])), 4),
+        "terms_mean": round(float(np.mean([r["terms"] for r in complete])), 3) if complete else None,
+        "credits_mean": round(float(np.mean([r["credits"] for r in complete])), 2) if complete else None,
+        "optimal": round(float(np.mean([r.get("optimal", False) for r in rows])), 4),
+        "p50_ms": lat["p50"],
+        "p99_ms": lat["p99"],
+    }
+
+def main(index_dir: Path, n: int, budgets: list, max_credits: float, max_terms: int, seed: int, out: Path = None):
+    chunks = load_chunk_table(index_dir)
+    t0 = time.perf_counter()
+    graph = PrereqGraph(chunks)
+    planner = PlanOptimizer(graph, FilterIndex(chunks, graph).credits_max)
+    setup_ms = (time.perf_counter() - t0) * 1000
+    audits = make_audits(graph, n, seed)
+
+    rng = random.Random(seed)
+    rows, times = [], []
+    for a in audits:
+        t = time.perf_counter()
+        rows.append(greedy_plan(graph, planner.credits, a, max_credits, max_terms, rng))
+        times.append(time.perf_counter() - t)
+    report = {"greedy": summarize(rows, times)}
+    for budget in budgets:
+        rows, times = [], []
+        for a in audits:
+            t = time.perf_counter()
+            r = planner.solve(a["completed"], a["requirements"], max_credits=max_credits, max_terms=max_terms,
+                              time_budget_ms=budget)
+            times.append(time.perf_counter() - t)
+            filled = sum(q["planned"] for q in r["requirements"]) / sum(q["needed"] for q in r["requirements"])
+            rows.append({"complete": r["complete"], "filled": filled, "terms": len(r["terms"]),
+                         "credits": r["total_credits"], "optimal": r["optimal"]})
+        report[f"search@{budget:g}ms"] = summarize(rows, times)
+
+    print(f"\n[planner] {n} synthetic audits, cap {max_credits:g} credits/term, up to {max_terms} terms; "
+          f"graph + planner built in {setup_ms:.0f} ms")
+    print(f"{'planner':>16} {'complete':>8} {'slots':>6} {'terms':>6} {'credits':>7} {'optimal':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for name, r in report.items():
+        terms = f"{r['terms_mean']:.2f}" if r["terms_mean"] is not None else "-"
+        credits = f"{r['credits_mean']:.1f}" if r["credits_mean"] is not None else "-"
+        print(f"{name:>16} {r['complete']:>8.1%} {r['slots_filled']:>6.1%} {terms:>6} {credits:>7} {r['optimal']:>7.1%} "
+              f"{r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f}")
+
+    if out:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps({"audits": n, "max_credits": max_credits, "max_terms": max_terms, "seed": seed,
+                                   "setup_ms": round(setup_ms, 1), "planners": report}, indent=2, sort_keys=True))
+        print(f"[planner] report written to {out}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=str(BENCH_DIR.parent / "data" / "processed" / "index"))
+    ap.add_argument("--audits", type=int, default=200, help="synthetic audits to plan")
+    ap.add_argument("--budgets", type=float, nargs="+", default=[20, 100, 500], help="search time budgets (ms)")
+    ap.add_argument("--max-credits", type=float, default=15)
+    ap.add_argument("--max-terms", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="optional JSON report path")
+    args = ap.parse_args()
+    main(Path(args.index_dir), args.audits, args.budgets, args.max_credits, args.max_terms, args.seed,
+         Path(args.out) if args.out else None)
@@ -0,0 +1,115 @@
+# rag/bench/bench_vectors.py
+"""
+Compact vector storage (build_index.py --vectors / --project-dim) vs. the IndexFlatIP baseline.
+
+Rebuilds the index from the full-precision vectors of --index-dir (its
+vectors.f32.npy, or the vectors stored in a flat faiss.index) once per variant:
+storage[:dim], e.g. "int8:128" = int8 codes after projecting to 128 dimensions.
+Queries are the golden queries (encoded and expanded the way the API does) plus
+--chunk-queries chunk vectors. For each variant, searched two ways:
+  first pass   the compact index alone
+  re-ranked    RerankIndex: the first pass's top rerank_factor x k, re-scored at
+               full precision from the memory-mapped side file (what the API serves)
+it reports bytes per vector searched first (and the corpus total), top-k chunk
+agreement and top course agreement with IndexFlatIP, and single-query p50/p99.
+
+    python bench_vectors.py --variants float16 int8 int8:192 int8:128 --rerank-factor 4 --out reports/vectors.json
+"""
+import argparse, json, sys, tempfile, time
+from pathlib import Path
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+from ann_index import RERANK_NAME, RerankIndex, build_index, bytes_per_vector, first_pass, read_index, search_latencies, write_index  # noqa: E402
+from bench_encoders import course_overlap, overlap  # noqa: E402
+from course_table import CourseTable  # noqa: E402
+from encoders import load_encoder  # noqa: E402
+from metadata_store import load_chunk_table  # noqa: E402
+from query_expansion import expand_query  # noqa: E402
+
+def full_vectors(index_dir: Path, cfg: dict) -> np.ndarray:
+    side = index_dir / RERANK_NAME
+    if side.exists():
+        return np.load(side, mmap_mode="r")
+    index = read_index(index_dir / "faiss.index", cfg, mmap=False)
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        sys.exit(f"[vectors] {index_dir} keeps no full-precision vectors; rebuild it with --index-type flat")
+
+def measure(index, queries: np.ndarray, ref: tuple, table: CourseTable, k: int, top_courses: int) -> dict:
+    search = index.search(queries, max(k, top_courses * 5))
+    _, times = search_latencies(index, queries, k)
+    ms = np.asarray(times) * 1000
+    return {
+        "topk_agreement": round(overlap(ref[1][:, :k], search[1][:, :k]), 4),
+        "course_agreement": round(course_overlap(table, ref, search, top_courses), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+def main(index_dir: Path, golden: Path, variants: list, rerank_factor: int, chunk_queries: int, k: int,
+         top_courses: int, out: Path = None):
+    cfg = json.loads((index_dir / "config.json").read_text())
+    embs = full_vectors(index_dir, cfg)
+    table = CourseTable(load_chunk_table(index_dir))
+    model = load_encoder(cfg, index_dir)
+    texts = [expand_query(q["query"]) for q in json.loads(golden.read_text())["queries"]]
+    rng = np.random.default_rng(0)
+    sample = np.sort(rng.choice(len(embs), size=min(chunk_queries, len(embs)), replace=False))
+    queries = np.vstack([np.asarray(model.encode(texts, normalize_embeddings=True), dtype="float32"),
+                         np.asarray(embs[sample], dtype="float32")])
+
+    flat, _ = build_index(embs, "flat")
+    ref = flat.search(queries, max(k, top_courses * 5))
+    rows = {"float32 (IndexFlatIP)": {"bytes_per_vector": bytes_per_vector(flat), "build_s": 0.0,
+                                      **measure(flat, queries, ref, table, k, top_courses)}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for variant in variants:
+            storage, _, dim = variant.partition(":")
+            t0 = time.perf_counter()
+            index, index_cfg = build_index(embs, "flat", storage=storage, project_dim=int(dim or 0),
+                                           rerank_factor=rerank_factor)
+            build_s = time.perf_counter() - t0
+            # Serve it the way the API does: written out, then read back with the side file memory-mapped
+            write_index(index, Path(tmp) / "faiss.index")
+            index = read_index(Path(tmp) / "faiss.index", {"index": index_cfg})
+            common = {"bytes_per_vector": bytes_per_vector(index), "build_s": round(build_s, 2),
+                      "energy_kept": index_cfg["build"].get("energy_kept")}
+            rows[f"{variant} first pass"] = {**common, **measure(first_pass(index), queries, ref, table, k, top_courses)}
+            rows[f"{variant} re-ranked x{rerank_factor}"] = {**common, **measure(index, queries, ref, table, k, top_courses)}
+            del index
+
+    n = len(embs)
+    print(f"\n[vectors] {n:,} vectors x {embs.shape[1]} dims; {len(texts)} golden + {len(sample)} chunk queries; "
+          f"k={k}, top_courses={top_courses}")
+    print(f"{'variant':>26} {'bytes/vec':>9} {'resident MiB':>12} {'top-k agree':>11} {'course agree':>12} "
+          f"{'p50 ms':>7} {'p99 ms':>7}")
+    for name, r in rows.items():
+        r["resident_mib"] = round(r["bytes_per_vector"] * n / 2**20, 2) if r["bytes_per_vector"] else None
+        print(f"{name:>26} {r['bytes_per_vector']:>9} {r['resident_mib']:>12.2f} {r['topk_agreement']:>11.3f} "
+              f"{r['course_agreement']:>12.3f} {r['p50_ms']:>7.3f} {r['p99_ms']:>7.3f}")
+
+    if out:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps({"vectors": n, "dim": int(embs.shape[1]), "k": k, "top_courses": top_courses,
+                                   "rerank_factor": rerank_factor, "queries": len(queries), "variants": rows},
+                                  indent=2, sort_keys=True))
+        print(f"[vectors] report written to {out}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=str(BENCH_DIR.parent / "data" / "processed" / "index"))
+    ap.add_argument("--golden", default=str(BENCH_DIR / "golden" / "golden_queries_v1.json"))
+    ap.add_argument("--variants", nargs="+", default=["float16", "int8", "int8:192", "int8:128", "int8:64"],
+                    help="storage[:projected dims]")
+    ap.add_argument("--rerank-factor", type=int, default=4, help="candidates re-scored per result")
+    ap.add_argument("--chunk-queries", type=int, default=500, help="chunk vectors sampled as extra queries")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--top-courses", type=int, default=8)
+    ap.add_argument("--out", help="optional JSON report path")
+    args = ap.parse_args()
+    main(Path(args.index_dir), Path(args.golden), args.variants, args.rerank_factor, args.chunk_queries, args.k,
+         args.top_courses, Path(args.out) if args.out else None)
@@ -0,0 +1,136 @@
+# rag/bench/load_test.py
+"""
+Multi-worker load test for the gunicorn deployment.
+
+For each worker count, starts `gunicorn -c gunicorn.conf.py app:app` from
+rag/web, waits for the index to load, then drives POST /query from concurrent
+client threads for a fixed duration (unique queries, so caches don't help).
+Reports throughput and latency, plus memory per process from
+/proc/<pid>/smaps_rollup: RSS, PSS (shared pages split between sharers) and
+private memory, which is what each extra worker really costs.
+
+    python load_test.py --workers 1 2 4 --concurrency 32 --duration 20
+"""
+import argparse, http.client, json, os, signal, subprocess, sys, threading, time
+from pathlib import Path
+
+import numpy as np
+
+WEB_DIR = Path(__file__).resolve().parents[1] / "web"
+QUERIES = ["machine learning", "no prerequisites", "CS 211", "data visualization",
+           "statistics", "databases", "cybersecurity", "econometrics", "cognitive science"]
+
+def children(pid: int) -> list:
+    out = []
+    for p in Path("/proc").iterdir():
+        if p.name.isdigit():
+            try:
+                if int((p / "stat").read_text().rsplit(")", 1)[1].split()[1]) == pid:
+                    out.append(int(p.name))
+            except (OSError, IndexError, ValueError):
+                pass
+    return out
+
+def memory(pid: int) -> dict:
+    vals = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, val = line.split(":", 1)
+        vals[key] = int(val.split()[0]) / 1024.0  # MiB
+    return {"rss": vals.get("Rss", 0), "pss": vals.get("Pss", 0),
+            "private": vals.get("Private_Clean", 0) + vals.get("Private_Dirty", 0)}
+
+def post(port: int, path: str, body: dict, timeout: float = 60):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    resp.read()
+    conn.close()
+    return resp.status
+
+def wait_ready(port: int, proc, timeout: float = 600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("[load] server exited during start-up")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            if json.loads(conn.getresponse().read()).get("index_loaded"):
+                return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    raise SystemExit("[load] timed out waiting for the index to load")
+
+def drive(port: int, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop = time.time() + duration
+    counter = iter(range(10**9))
+
+    def client():
+        while time.time() < stop:
+            with lock:
+                n = next(counter)
+            q = f"{QUERIES[n % len(QUERIES)]} {n}"
+            t0 = time.perf_counter()
+            try:
+                ok = post(port, "/query", {"query": q, "top_courses": 8}) == 200
+            except OSError:
+                ok = False
+            dt = time.perf_counter() - t0
+            with lock:
+                if ok:
+                    latencies.append(dt)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    lat = np.asarray(latencies) * 1000
+    return {"requests": len(latencies), "errors": errors[0], "rps": len(latencies) / duration,
+            "p50_ms": float(np.percentile(lat, 50)) if len(lat) else 0.0,
+            "p99_ms": float(np.percentile(lat, 99)) if len(lat) else 0.0}
+
+def run(n_workers: int, port: int, concurrency: int, duration: float) -> dict:
+    env = {**os.environ, "GUNICORN_WORKERS": str(n_workers), "PORT": str(port),
+           "GUNICORN_PRELOAD": "true", "EMBEDDING_CACHE_SIZE": "0", "RESULTS_CACHE_SIZE": "0"}
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+                            cwd=WEB_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, proc)
+        drive(port, concurrency, min(3.0, duration))  # warm-up
+        load = drive(port, concurrency, duration)
+        workers = children(proc.pid)
+        mem = [memory(pid) for pid in workers]
+        master = memory(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+    return {"workers": n_workers, **load, "master": master,
+            "worker_rss": float(np.mean([m["rss"] for m in mem])),
+            "worker_pss": float(np.mean([m["pss"] for m in mem])),
+            "worker_private": float(np.mean([m["private"] for m in mem]))}
+
+def main(worker_counts: list, port: int, concurrency: int, duration: float):
+    rows = [run(n, port, concurrency, duration) for n in worker_counts]
+    base = rows[0]["rps"] or 1.0
+    print(f"\n[load] concurrency={concurrency}, {duration:.0f}s per run, caches off")
+    print(f"{'workers':>7} {'req/s':>8} {'scale':>6} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6} "
+          f"{'RSS/worker':>11} {'PSS/worker':>11} {'private/worker':>15}")
+    for r in rows:
+        print(f"{r['workers']:>7} {r['rps']:>8.1f} {r['rps'] / base:>5.2f}x {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['errors']:>6} {r['worker_rss']:>9.1f}Mi {r['worker_pss']:>9.1f}Mi {r['worker_private']:>13.1f}Mi")
+    print("\nprivate/worker is the memory each additional worker adds; the rest is shared with the master.")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=20)
+    args = ap.parse_args()
+    main(args.workers, args.port, args.concurrency, args.duration)
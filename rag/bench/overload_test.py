@@ -0,0 +1,112 @@
+# rag/bench/overload_test.py
+"""
+Tail latency under overload: the gunicorn/Flask server vs. the ASGI server.
+
+Starts each server from rag/web in turn and sends POST /query at a fixed
+arrival rate (open loop: requests keep arriving on schedule however slowly the
+server answers, like a registration-day burst). Pick a rate above what the
+machine can serve. Reports how many requests succeeded, were shed (503) or
+timed out (504 / client timeout), and latency percentiles of the successful
+ones. Unbounded queueing shows up as a huge p99; admission control shows up as
+fast 503s and a p99 close to the unloaded latency.
+
+    python overload_test.py --rate 200 --duration 20
+    python overload_test.py --servers asgi --rate 400 --max-pending 32
+"""
+import argparse, http.client, json, os, signal, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from load_test import QUERIES, WEB_DIR, wait_ready
+
+SERVERS = {
+    "flask": lambda port: [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+    "asgi": lambda port: [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--log-level", "warning"],
+}
+
+def send(port: int, query: str, timeout: float):
+    """(status, seconds); status 0 = client timeout / connection error."""
+    t0 = time.perf_counter()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        conn.request("POST", "/query", json.dumps({"query": query, "top_courses": 8}),
+                     {"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        resp.read()
+        conn.close()
+        status = resp.status
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - t0
+
+def drive(port: int, rate: float, duration: float, timeout: float) -> list:
+    n = int(rate * duration)
+    out = []
+    lock = threading.Lock()
+
+    def one(i):
+        r = send(port, f"{QUERIES[i % len(QUERIES)]} {i}", timeout)
+        with lock:
+            out.append(r)
+
+    with ThreadPoolExecutor(max_workers=min(1024, max(64, int(rate * timeout)))) as pool:
+        t0 = time.perf_counter()
+        for i in range(n):
+            delay = t0 + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, i)
+    return out
+
+def summarize(name: str, results: list, duration: float) -> dict:
+    status = np.array([s for s, _ in results])
+    secs = np.array([t for _, t in results]) * 1000
+    ok = secs[status == 200]
+    pct = lambda a, q: float(np.percentile(a, q)) if len(a) else float("nan")
+    return {"server": name, "sent": len(results), "ok": int((status == 200).sum()),
+            "shed": int((status == 503).sum()), "timeout": int(((status == 504) | (status == 0)).sum()),
+            "other": int((~np.isin(status, [0, 200, 503, 504])).sum()),
+            "ok_rps": len(ok) / duration, "p50_ms": pct(ok, 50), "p95_ms": pct(ok, 95), "p99_ms": pct(ok, 99),
+            "shed_p99_ms": pct(secs[status == 503], 99)}
+
+def run(name: str, port: int, rate: float, duration: float, timeout: float, env_extra: dict) -> dict:
+    env = {**os.environ, "PORT": str(port), "EMBEDDING_CACHE_SIZE": "0", "RESULTS_CACHE_SIZE": "0",
+           "GUNICORN_PRELOAD": "true" if name == "flask" else "false", **env_extra}
+    proc = subprocess.Popen(SERVERS[name](port), cwd=WEB_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, proc)
+        drive(port, min(rate, 20), 2, timeout)  # warm-up, under capacity
+        return summarize(name, drive(port, rate, duration, timeout), duration)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+def main(servers: list, port: int, rate: float, duration: float, timeout: float, env_extra: dict):
+    rows = [run(name, port, rate, duration, timeout, env_extra) for name in servers]
+    print(f"\n[overload] {rate:.0f} req/s offered for {duration:.0f}s, client timeout {timeout:.0f}s, caches off")
+    print(f"{'server':>6} {'sent':>6} {'ok':>6} {'503':>6} {'timeout':>7} {'ok req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'503 p99 ms':>10}")
+    for r in rows:
+        print(f"{r['server']:>6} {r['sent']:>6} {r['ok']:>6} {r['shed']:>6} {r['timeout']:>7} {r['ok_rps']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['shed_p99_ms']:>10.1f}")
+    if any(r["other"] for r in rows):
+        print("(some responses had other status codes)")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=["flask", "asgi"])
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--rate", type=float, default=200, help="offered load, requests per second")
+    ap.add_argument("--duration", type=float, default=20)
+    ap.add_argument("--timeout", type=float, default=30, help="client-side timeout per request (s)")
+    ap.add_argument("--max-pending", type=int, help="MAX_PENDING for the ASGI server")
+    ap.add_argument("--request-timeout-ms", type=float, help="REQUEST_TIMEOUT_MS for the ASGI server")
+    args = ap.parse_args()
+    env_extra = {}
+    if args.max_pending:
+        env_extra["MAX_PENDING"] = str(args.max_pending)
+    if args.request_timeout_ms:
+        env_extra["REQUEST_TIMEOUT_MS"] = str(args.request_timeout_ms)
+    main(args.servers, args.port, args.rate, args.duration, args.timeout, env_extra)
@@ -0,0 +1,200 @@
+# rag/bench/run_benchmarks.py
+"""
+Offline retrieval benchmark: replays a versioned golden query set against an
+index directory and reports quality and per-stage latency.
+
+Stages timed separately for every query: lexical (code lookup / BM25 fusion
+with --retrieval hybrid), expand (QueryExpander.prepare),
+encode (model.encode, plus the topic-vector blend in --expansion vector mode),
+search (index.search) and group (CourseTable.group).
+The report is JSON (stable key order) so runs can be diffed; budgets from
+budgets.json are checked and the process exits 1 if any is exceeded.
+
+    python run_benchmarks.py --out reports/baseline.json
+    python run_benchmarks.py --compare reports/baseline.json --out reports/new.json
+"""
+import argparse, json, os, platform, resource, sys, time
+from pathlib import Path
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+from course_table import CourseTable  # noqa: E402
+from lexical_index import DEFAULT_LEXICAL_WEIGHT, RETRIEVAL_MODES, HybridRetriever, load_lexical_index  # noqa: E402
+from query import load_index  # noqa: E402
+from query_expansion import DEFAULT_QUERY_WEIGHT, EXPANSION_MODES, QueryExpander  # noqa: E402
+
+STAGES = ("lexical", "expand", "encode", "search", "group", "total")
+
+def percentiles(samples_s: list) -> dict:
+    ms = np.asarray(samples_s) * 1000
+    return {
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+    }
+
+def run_query(query: str, top_courses: int, index, model, table: CourseTable, expander: QueryExpander = None,
+              hybrid: HybridRetriever = None) -> tuple:
+    expander = expander or QueryExpander()
+    k = max(50, top_courses * 5)
+    t = dict.fromkeys(STAGES, 0.0)
+    t0 = time.perf_counter()
+    hit = hybrid.code_lookup(query, k) if hybrid is not None else None
+    t1 = time.perf_counter()
+    t["lexical"] = t1 - t0
+    if hit is not None:
+        scores, idxs = hit
+    else:
+        texts, matched = expander.prepare([query])
+        t2 = time.perf_counter()
+        q_emb = model.encode(texts, normalize_embeddings=True).astype("float32")
+        if matched is not None:
+            q_emb = expander.combine(q_emb, matched, expander.group_vectors(model))
+        t3 = time.perf_counter()
+        scores, idxs = index.search(q_emb, k)
+        scores, idxs = scores[0], idxs[0]
+        t4 = time.perf_counter()
+        if hybrid is not None:
+            scores, idxs = hybrid.fuse(query, scores, idxs, k)
+        t["expand"], t["encode"], t["search"] = t2 - t1, t3 - t2, t4 - t3
+        t["lexical"] += time.perf_counter() - t4
+    t5 = time.perf_counter()
+    results = table.group(scores, idxs, top_courses)
+    t["group"] = time.perf_counter() - t5
+    t["total"] = time.perf_counter() - t0
+    return results, t
+
+def score_query(codes: list, expected: list) -> dict:
+    expected_set = set(expected)
+    rank = next((i for i, c in enumerate(codes, start=1) if c in expected_set), None)
+    return {
+        "recall": len(expected_set & set(codes)) / len(expected_set),
+        "rr": 1.0 / rank if rank else 0.0,
+        "rank": rank,
+    }
+
+def lookup(report: dict, dotted: str):
+    val = report
+    for part in dotted.split("."):
+        val = val[part]
+    return val
+
+def check_budgets(report: dict, budgets: dict) -> list:
+    violations = []
+    for chk in budgets.get("checks", []):
+        val = lookup(report, chk["metric"])
+        if "min" in chk and val < chk["min"]:
+            violations.append(f"{chk['metric']} = {val} < min {chk['min']}")
+        if "max" in chk and val > chk["max"]:
+            violations.append(f"{chk['metric']} = {val} > max {chk['max']}")
+    return violations
+
+def compare(report: dict, baseline: dict):
+    print(f"\n[bench] vs {baseline.get('run', {}).get('timestamp', 'baseline')}:")
+    rows = [("quality.recall_at_k", False), ("quality.mrr", False)] + \
+           [(f"latency_ms.{s}.{p}", True) for s in STAGES for p in ("p50", "p99")] + \
+           [("memory.peak_rss_mib", True)]
+    for metric, lower_is_better in rows:
+        try:
+            old, new = lookup(baseline, metric), lookup(report, metric)
+        except KeyError:
+            continue
+        delta = new - old
+        worse = delta > 0 if lower_is_better else delta < 0
+        flag = "  (worse)" if worse and abs(delta) > 1e-9 else ""
+        print(f"  {metric:<26} {old:>10.3f} -> {new:>10.3f}  ({delta:+.3f}){flag}")
+
+def main(index_dir: str, golden: str, budgets: str, top_courses: int, repeat: int, out: str, baseline: str,
+         expansion: str = "concat", expansion_weight: float = DEFAULT_QUERY_WEIGHT,
+         retrieval: str = "hybrid", lexical_weight: float = DEFAULT_LEXICAL_WEIGHT):
+    golden_path = Path(golden)
+    suite = json.loads(golden_path.read_text())
+    index, df, model, cfg = load_index(Path(index_dir).resolve())
+    table = CourseTable(df)
+    expander = QueryExpander(mode=expansion, query_weight=expansion_weight)
+    hybrid = HybridRetriever(load_lexical_index(Path(index_dir).resolve(), df), lexical_weight) if retrieval == "hybrid" else None
+
+    # Warm-up so one-time model/thread-pool start-up (and topic vectors) isn't billed to the first query
+    run_query(suite["queries"][0]["query"], top_courses, index, model, table, expander, hybrid)
+
+    timings = {s: [] for s in STAGES}
+    per_query = []
+    for q in suite["queries"]:
+        for _ in range(repeat):
+            results, t = run_query(q["query"], top_courses, index, model, table, expander, hybrid)
+            for s in STAGES:
+                timings[s].append(t[s])
+        codes = [r["course_code"] for r in results]
+        per_query.append({"id": q["id"], "query": q["query"], **score_query(codes, q["expected"]), "top": codes})
+
+    report = {
+        "run": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "suite": {"golden": golden_path.name, "version": suite.get("version"),
+                  "queries": len(per_query), "top_courses": top_courses, "repeat": repeat,
+                  "expansion": expansion, "expansion_weight": expansion_weight if expansion == "vector" else None,
+                  "retrieval": retrieval, "lexical_weight": lexical_weight if retrieval == "hybrid" else None},
+        "index": {"dir": str(Path(index_dir).resolve()), "model": cfg.get("model"),
+                  "type": (cfg.get("index") or {}).get("type", "flat"), "chunks": len(df)},
+        "quality": {
+            "recall_at_k": round(float(np.mean([p["recall"] for p in per_query])), 4),
+            "mrr": round(float(np.mean([p["rr"] for p in per_query])), 4),
+            "hit_rate": round(float(np.mean([p["rank"] is not None for p in per_query])), 4),
+            "per_query": per_query,
+        },
+        "latency_ms": {s: percentiles(timings[s]) for s in STAGES},
+        # ru_maxrss is KiB on Linux; covers model + index + table for this process
+        "memory": {"peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)},
+    }
+    violations = check_budgets(report, json.loads(Path(budgets).read_text())) if budgets else []
+    report["budgets"] = {"file": Path(budgets).name if budgets else None,
+                         "passed": not violations, "violations": violations}
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if out:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        Path(out).write_text(text + "\n")
+        print(f"[bench] report written to {out}")
+    else:
+        print(text)
+
+    q = report["quality"]
+    print(f"[bench] recall@{top_courses}={q['recall_at_k']:.3f}  MRR={q['mrr']:.3f}  hit rate={q['hit_rate']:.3f}")
+    for s in STAGES:
+        l = report["latency_ms"][s]
+        print(f"  {s:<7} p50 {l['p50']:8.3f} ms   p95 {l['p95']:8.3f} ms   p99 {l['p99']:8.3f} ms")
+    print(f"  peak RSS {report['memory']['peak_rss_mib']:.1f} MiB")
+    if baseline:
+        compare(report, json.loads(Path(baseline).read_text()))
+    if violations:
+        print("[bench] BUDGET EXCEEDED:")
+        for v in violations:
+            print("  -", v)
+        sys.exit(1)
+    print("[bench] all budgets met")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=str(BENCH_DIR.parent / "data" / "processed" / "index"))
+    ap.add_argument("--golden", default=str(BENCH_DIR / "golden" / "golden_queries_v1.json"))
+    ap.add_argument("--budgets", default=str(BENCH_DIR / "budgets.json"), help="budget checks ('' to skip)")
+    ap.add_argument("--top-courses", type=int, default=8, help="k for recall@k / MRR")
+    ap.add_argument("--repeat", type=int, default=5, help="timed runs per query")
+    ap.add_argument("--out", help="write the JSON report here (default: stdout)")
+    ap.add_argument("--compare", help="previous report to diff against")
+    ap.add_argument("--expansion", choices=EXPANSION_MODES, default="concat", help="query expansion mode")
+    ap.add_argument("--expansion-weight", type=float, default=DEFAULT_QUERY_WEIGHT,
+                    help="raw query weight for --expansion vector")
+    ap.add_argument("--retrieval", choices=RETRIEVAL_MODES, default="hybrid",
+                    help="dense, or hybrid (code lookups + BM25 fusion, as served by the API)")
+    ap.add_argument("--lexical-weight", type=float, default=DEFAULT_LEXICAL_WEIGHT, help="BM25 share for --retrieval hybrid")
+    args = ap.parse_args()
+    main(args.index_dir, args.golden, args.budgets, args.top_courses, args.repeat, args.out, args.compare,
+         args.expansion, args.expansion_weight, args.retrieval, args.lexical_weight)
@@ -0,0 +1,293 @@
+# rag/src/ann_index.py
+"""
+FAISS index construction for the course index.
+
+Supported --index-type values (all inner product on normalized vectors = cosine):
+  flat      IndexFlatIP       exact brute force (default)
+  hnsw      IndexHNSWFlat     graph search;  build: M, efConstruction  search: efSearch
+  ivf_flat  IndexIVFFlat      inverted lists; build: nlist             search: nprobe
+  ivf_pq    IndexIVFPQ        IVF + product quantization; build: nlist, pq_m, pq_nbits
+                                                                       search: nprobe
+
+The chosen type and its parameters are stored under "index" in config.json;
+the loaders call apply_search_params() so search-time knobs come from config.
+
+Vector storage for flat indexes (--vectors, --project-dim):
+  float32   IndexFlatIP, 4 bytes per dimension (default)
+  float16   IndexScalarQuantizer QT_fp16, 2 bytes per dimension
+  int8      IndexScalarQuantizer QT_8bit, 1 byte per dimension (per-dimension
+            ranges trained on the corpus)
+  either may first project to --project-dim dimensions: the top eigenvectors
+  of the vectors' uncentered second-moment matrix (PCA without the mean, so
+  inner products are kept rather than distances)
+The compact index only gives candidates. RerankIndex takes rerank_factor x k of
+them and re-scores those at full precision from vectors.f32.npy, which is
+memory-mapped, so only the candidates' rows are ever read.
+"""
+import hashlib
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+VECTOR_STORAGE = ("float32", "float16", "int8")
+SQ_TYPES = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+RERANK_NAME = "vectors.f32.npy"
+TRAIN_SAMPLE = 100_000  # vectors used to fit int8 ranges
+BLOCK_ROWS = 65536      # rows per block when streaming vectors (they may be memory-mapped)
+
+DEFAULTS = {
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64,
+    "nlist": 0,       # 0 = choose from corpus size
+    "nprobe": 16,
+    "pq_m": 48,       # sub-quantizers; must divide dim (384 / 48 = 8 dims each)
+    "pq_nbits": 8,
+    "storage": "float32",
+    "project_dim": 0,   # 0 = keep all dimensions
+    "rerank_factor": 4,  # candidates re-scored per result when vectors are compact
+}
+
+
+def auto_nlist(n: int) -> int:
+    # ~4*sqrt(n) lists, but keep >= 39 training points per centroid
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+
+class RerankIndex:
+    """A compact first-pass index whose candidates are re-scored against full-precision vectors.
+
+    Offers the parts of the FAISS index API the callers use (search with
+    optional params, ntotal, d, reconstruct_n). `vectors` is usually a
+    read-only memmap of vectors.f32.npy.
+    """
+
+    def __init__(self, base, vectors: np.ndarray, factor: int = DEFAULTS["rerank_factor"]):
+        self.base = base
+        self.vectors = vectors
+        self.factor = max(1, int(factor))
+        self.ntotal = base.ntotal
+        self.d = vectors.shape[1]
+
+    def search(self, q: np.ndarray, k: int, params=None):
+        q = np.ascontiguousarray(q, dtype=np.float32)
+        _, cand = self.base.search(q, min(self.ntotal, k * self.factor), params=params)
+        scores = np.full((len(q), k), np.finfo(np.float32).min, dtype=np.float32)
+        idxs = np.full((len(q), k), -1, dtype=np.int64)
+        for i, row in enumerate(cand):
+            rows = np.sort(row[row >= 0])  # ascending: page-friendly reads from the memmap
+            exact = np.asarray(self.vectors[rows], dtype=np.float32) @ q[i]
+            top = np.argsort(-exact, kind="stable")[:k]
+            scores[i, :len(top)], idxs[i, :len(top)] = exact[top], rows[top]
+        return scores, idxs
+
+    def reconstruct_n(self, start: int, n: int) -> np.ndarray:
+        return np.asarray(self.vectors[start:start + n], dtype=np.float32)
+
+
+def first_pass(index):
+    """The FAISS index that is searched first (the compact one behind a RerankIndex)."""
+    return index.base if isinstance(index, RerankIndex) else index
+
+
+def bytes_per_vector(index) -> int:
+    """Resident bytes per vector of the first-pass index (None when FAISS can't tell)."""
+    try:
+        return int(first_pass(index).sa_code_size())
+    except RuntimeError:
+        return None
+
+
+def _projection(embs: np.ndarray, out_dim: int) -> tuple:
+    """(LinearTransform onto the top `out_dim` eigenvectors of X^T X, share of the energy kept)."""
+    dim = embs.shape[1]
+    gram = np.zeros((dim, dim), dtype=np.float64)
+    for start in range(0, len(embs), BLOCK_ROWS):
+        block = np.asarray(embs[start:start + BLOCK_ROWS], dtype=np.float64)
+        gram += block.T @ block
+    vals, vecs = np.linalg.eigh(gram)  # ascending
+    top = vecs[:, ::-1][:, :out_dim].T
+    lt = faiss.LinearTransform(dim, out_dim, False)
+    faiss.copy_array_to_vector(np.ascontiguousarray(top, dtype=np.float32).ravel(), lt.A)
+    lt.is_trained = True
+    return lt, float(vals[::-1][:out_dim].sum() / vals.sum())
+
+
+def _compact_flat(embs: np.ndarray, storage: str, project_dim: int) -> tuple:
+    """Scalar-quantized flat index (optionally behind a projection) -> (index, build config)."""
+    n, dim = embs.shape
+    out_dim = project_dim or dim
+    if not 0 < out_dim <= dim:
+        raise ValueError(f"project_dim={project_dim} must be between 1 and dim={dim}")
+    index = faiss.IndexScalarQuantizer(out_dim, SQ_TYPES[storage], faiss.METRIC_INNER_PRODUCT)
+    build = {"storage": storage, "dim": out_dim}
+    if out_dim < dim:
+        lt, energy = _projection(embs, out_dim)
+        build["energy_kept"] = round(energy, 4)
+        index = faiss.IndexPreTransform(lt, index)
+    sample = np.sort(np.random.default_rng(0).choice(n, size=min(n, TRAIN_SAMPLE), replace=False))
+    index.train(np.asarray(embs[sample], dtype=np.float32))
+    return index, build
+
+
+def build_index(embs: np.ndarray, index_type: str = "flat", **params):
+    """Build and fill a FAISS index. Returns (index, index_config for config.json).
+
+    With compact storage the index is a RerankIndex over `embs`; write_index
+    saves both of its parts.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}' (expected one of {', '.join(INDEX_TYPES)})")
+    p = {**DEFAULTS, **{k: v for k, v in params.items() if v is not None}}
+    if p["storage"] not in VECTOR_STORAGE:
+        raise ValueError(f"Unknown vector storage '{p['storage']}' (expected one of {', '.join(VECTOR_STORAGE)})")
+    compact = p["storage"] != "float32" or bool(p["project_dim"])
+    if compact and index_type != "flat":
+        raise ValueError("Compact vector storage (--vectors / --project-dim) needs --index-type flat")
+    n, dim = embs.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if index_type == "flat" and compact:
+        if p["storage"] == "float32":
+            raise ValueError("--project-dim needs --vectors float16 or int8")
+        index, build = _compact_flat(embs, p["storage"], p["project_dim"])
+        search = {}
+    elif index_type == "flat":
+        index = faiss.IndexFlatIP(dim)
+        build, search = {}, {}
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, p["hnsw_m"], metric)
+        index.hnsw.efConstruction = p["ef_construction"]
+        build, search = {"M": p["hnsw_m"], "efConstruction": p["ef_construction"]}, {"efSearch": p["ef_search"]}
+    else:
+        nlist = p["nlist"] or auto_nlist(n)
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+            build = {"nlist": nlist}
+        else:
+            if dim % p["pq_m"]:
+                raise ValueError(f"pq_m={p['pq_m']} must divide dim={dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, p["pq_m"], p["pq_nbits"], metric)
+            build = {"nlist": nlist, "pq_m": p["pq_m"], "pq_nbits": p["pq_nbits"]}
+        index.train(embs)
+        search = {"nprobe": min(p["nprobe"], nlist)}
+
+    index.add(embs)
+    apply_search_params(index, {"index": {"search": search}})
+    cfg = {"type": index_type, "build": build, "search": search}
+    if compact:
+        cfg["rerank"] = {"file": RERANK_NAME, "factor": p["rerank_factor"]}
+        index = RerankIndex(index, embs, p["rerank_factor"])
+    return index, cfg
+
+
+def write_index(index, path) -> list:
+    """faiss.write_index, plus the full-precision side file of a RerankIndex. Returns the paths written."""
+    path = Path(path)
+    faiss.write_index(first_pass(index), str(path))
+    if not isinstance(index, RerankIndex):
+        (path.parent / RERANK_NAME).unlink(missing_ok=True)  # left over from a compact build
+        return [path]
+    side = path.parent / RERANK_NAME
+    out = np.lib.format.open_memmap(side, mode="w+", dtype="float32", shape=index.vectors.shape)
+    for start in range(0, len(out), BLOCK_ROWS):
+        out[start:start + BLOCK_ROWS] = index.vectors[start:start + BLOCK_ROWS]
+    out.flush()
+    del out
+    return [path, side]
+
+
+def read_index(path, cfg: dict = None, mmap: bool = True):
+    """faiss.read_index, memory-mapping the vectors when the FAISS build supports it.
+
+    Mapped indexes are read-only and backed by the page cache, so forked
+    gunicorn workers share one copy instead of each holding its own. Indexes
+    built with compact vectors come back as a RerankIndex over the
+    memory-mapped vectors.f32.npy next to `path`.
+    """
+    index_cfg = (cfg or {}).get("index") or {}
+    index = None
+    if mmap:
+        flag_name = "IO_FLAG_MMAP" if index_cfg.get("type", "flat").startswith("ivf") else "IO_FLAG_MMAP_IFC"
+        flag = getattr(faiss, flag_name, None)
+        if flag is not None:
+            try:
+                index = faiss.read_index(str(path), flag)
+            except RuntimeError as e:
+                print(f"[index] mmap load failed ({e}); reading {path} into memory")
+    if index is None:
+        index = faiss.read_index(str(path))
+    rerank = index_cfg.get("rerank")
+    if rerank:
+        vectors = np.load(Path(path).parent / rerank["file"], mmap_mode="r" if mmap else None)
+        index = RerankIndex(index, vectors, rerank["factor"])
+    return index
+
+
+def content_version(paths, length: int = 12) -> str:
+    """Short sha256 over the given artifact files; tags an index build in config.json."""
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:length]
+
+
+def apply_search_params(index, cfg: dict):
+    """Set search-time parameters (efSearch / nprobe) from config.json's "index" block."""
+    search = (cfg.get("index") or {}).get("search") or {}
+    ps = faiss.ParameterSpace()
+    for name, value in search.items():
+        ps.set_index_parameter(first_pass(index), name, value)
+
+
+def search_latencies(index, queries: np.ndarray, k: int):
+    """Search one query at a time (like the API does); returns (idxs, per-query seconds)."""
+    out = np.empty((len(queries), k), dtype=np.int64)
+    times = np.empty(len(queries))
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        _, idx = index.search(queries[i:i + 1], k)
+        times[i] = time.perf_counter() - t0
+        out[i] = idx[0]
+    return out, times
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t[t >= 0]) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return hits / max(1, int((truth >= 0).sum()))
+
+
+class ExactSearch:
+    """Brute-force inner-product search straight over `embs` (e.g. a memory-mapped vectors.npy).
+
+    Gives the same results as an IndexFlatIP holding the vectors without copying them into one.
+    """
+
+    def __init__(self, embs: np.ndarray):
+        self.embs = embs
+
+    def search(self, queries: np.ndarray, k: int):
+        return faiss.knn(np.ascontiguousarray(queries, dtype="float32"), self.embs, k, metric=faiss.METRIC_INNER_PRODUCT)
+
+
+def report(index, embs: np.ndarray, k: int = 10, n_queries: int = 500, seed: int = 0) -> dict:
+    """recall@k vs exact search, plus p50/p99 single-query latency for both."""
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(embs[np.sort(rng.choice(len(embs), size=min(n_queries, len(embs)), replace=False))])
+    truth, t_flat = search_latencies(ExactSearch(embs), sample, k)
+    found, t_idx = search_latencies(index, sample, k)
+    ms = lambda t, q: float(np.percentile(t, q) * 1000)
+    return {
+        "k": k,
+        "queries": len(sample),
+        "bytes_per_vector": bytes_per_vector(index),
+        "recall_at_k": recall_at_k(truth, found),
+        "p50_ms": ms(t_idx, 50), "p99_ms": ms(t_idx, 99),
+        "flat_p50_ms": ms(t_flat, 50), "flat_p99_ms": ms(t_flat, 99),
+    }
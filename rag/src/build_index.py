@@ -1,58 +1,137 @@
 # rag/src/build_index.py
-import argparse, json
+import argparse, json, shutil, time
 from pathlib import Path
 
-import faiss
-import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer
+from ann_index import INDEX_TYPES, DEFAULTS, VECTOR_STORAGE, build_index, bytes_per_vector, content_version, report, write_index
+from embed_pipeline import DEFAULT_BATCH_ROWS, embed_csv
+from encoders import ENCODER_BACKENDS, QUANTIZE_TARGETS, check_backend, export_encoder
+from lexical_index import write_lexical_index
+from metadata_store import ChunkTableWriter, load_chunk_table
+from shards import MANIFEST_NAME, register_shard
+from similar_courses import DEFAULT_NEIGHBORS, SIMILAR_NAME, write_similarity_index
 
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 TEXT_COL = "text"
 ID_COL = "id"
+DEFAULT_MANIFEST = Path(__file__).resolve().parents[1] / "data" / "processed" / MANIFEST_NAME  # app.py's SHARD_MANIFEST
 
-def load_chunks(csv_path: Path) -> pd.DataFrame:
-    if not csv_path.exists():
-        raise FileNotFoundError(f"Missing file: {csv_path}")
-    df = pd.read_csv(csv_path)
-    if TEXT_COL not in df.columns or ID_COL not in df.columns:
-        raise ValueError(f"Expected columns '{ID_COL}' and '{TEXT_COL}' in {csv_path}")
-    print(f"[build] loaded {len(df):,} chunks from {csv_path}")
-    return df
-
-def main(data_dir: str, out_dir: str):
+def main(data_dir: str, out_dir: str, cache_dir: str = None, index_type: str = "flat",
+         index_params: dict = None, eval_queries: int = 500, encoder: str = "torch", quantize_for: str = "avx2",
+         similar_k: int = DEFAULT_NEIGHBORS, work_dir: str = None, batch_rows: int = DEFAULT_BATCH_ROWS,
+         workers: int = 0, shard: str = None, manifest: str = DEFAULT_MANIFEST, no_cache: bool = False):
+    t0 = time.perf_counter()
+    check_backend(encoder)  # fail before embedding, not after, when the ONNX extra is missing
     data_dir = Path(data_dir).resolve()
     out_dir  = Path(out_dir).resolve()
     out_dir.mkdir(parents=True, exist_ok=True)
+    # Per out_dir by default: the cache is pruned to the chunks of the last build, so
+    # catalogs (shards) sharing one cache would evict each other's vectors
+    if no_cache:
+        cache_dir = None
+    else:
+        cache_dir = Path(cache_dir).resolve() if cache_dir else out_dir.parent / "embedding_cache" / out_dir.name
+    # Shards + checkpoint manifest; removed once the build succeeds
+    work_dir = Path(work_dir).resolve() if work_dir else out_dir.parent / "build_shards" / out_dir.name
 
     chunks_csv = data_dir / "rag_chunks.csv"
-    df = load_chunks(chunks_csv)
-
-    print(f"[build] embedding with {MODEL_NAME} …")
-    model = SentenceTransformer(MODEL_NAME)
-    texts = df[TEXT_COL].astype(str).tolist()
-    embs = model.encode(texts, batch_size=64, show_progress_bar=True, normalize_embeddings=True)
-    embs = np.asarray(embs, dtype="float32")
-    print(f"[build] embeddings shape: {embs.shape}")
+    print(f"[build] embedding {chunks_csv} with {MODEL_NAME} …")
+    # Rows go straight to chunks.csv + chunks.cols/ batch by batch; the table is never held whole
+    table_writer = ChunkTableWriter(out_dir)
+    embs, stats = embed_csv(chunks_csv, MODEL_NAME, work_dir, cache_dir, batch_rows, workers, TEXT_COL, ID_COL,
+                            on_batch=table_writer.append)
+    print(f"[build] embeddings shape: {embs.shape} (memory-mapped from {work_dir})")
 
     dim = embs.shape[1]
-    index = faiss.IndexFlatIP(dim)  # cosine via inner product on normalized vectors
-    index.add(embs)
+    # cosine via inner product on normalized vectors
+    print(f"[build] building {index_type} index …")
+    index, index_cfg = build_index(embs, index_type, **(index_params or {}))
+    print(f"[build] index params: build={index_cfg['build']} search={index_cfg['search']}")
+    if "rerank" in index_cfg:
+        print(f"[build] compact vectors: {bytes_per_vector(index)} bytes/vector searched first (float32: {4 * dim}), "
+              f"top {index_cfg['rerank']['factor']}x k re-scored from {index_cfg['rerank']['file']}")
+    if eval_queries:
+        r = report(index, embs, k=10, n_queries=eval_queries)
+        print(f"[build] recall@{r['k']} vs flat: {r['recall_at_k']:.3f} over {r['queries']} queries")
+        print(f"[build] search latency p50/p99: {r['p50_ms']:.3f}/{r['p99_ms']:.3f} ms "
+              f"(flat: {r['flat_p50_ms']:.3f}/{r['flat_p99_ms']:.3f} ms)")
 
     # Save artifacts
-    faiss.write_index(index, str(out_dir / "faiss.index"))
-    df.to_csv(out_dir / "chunks.csv", index=False)  # <- CSV for simplicity
+    index_paths = write_index(index, out_dir / "faiss.index")  # + vectors.f32.npy for compact storage
+    # CSV kept as a fallback / for the frontend; mmap-able columns for fast loader startup
+    csv_path, store_dir = table_writer.close()
+    chunks = load_chunk_table(out_dir, "columnar")  # memory-mapped: later steps read only the columns they use
+    lexical_path = write_lexical_index(chunks, out_dir)  # course-code table + BM25 postings for hybrid retrieval
+    similar_path = None
+    if similar_k:
+        t1 = time.perf_counter()
+        similar_path = write_similarity_index(chunks, embs, out_dir, similar_k)  # top-N similar courses per course
+        print(f"[build] similar courses: top {similar_k} per course in {time.perf_counter() - t1:.1f}s")
+    else:
+        (out_dir / SIMILAR_NAME).unlink(missing_ok=True)  # an earlier build's graph would describe other vectors
+    # Query-time encoder (ONNX variants are exported next to the index)
+    encoder_cfg = export_encoder(MODEL_NAME, encoder, out_dir / "encoder", quantize_for)
+    # Content hash of the artifacts; the API reports it so clients can tell which build answered
+    version = content_version([out_dir / "faiss.index", csv_path])
     (out_dir / "config.json").write_text(json.dumps(
-        {"model": MODEL_NAME, "dim": dim, "normalize": True}, indent=2
+        {"model": MODEL_NAME, "dim": dim, "normalize": True, "index": index_cfg, "encoder": encoder_cfg,
+         "version": version, "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}, indent=2
     ))
     print("[build] saved:")
-    print("  -", out_dir / "faiss.index")
-    print("  -", out_dir / "chunks.csv")
-    print("  -", out_dir / "config.json")
+    for path in index_paths:
+        print("  -", path)
+    print("  -", csv_path)
+    print("  -", store_dir)
+    print("  -", lexical_path)
+    if similar_path:
+        print("  -", similar_path)
+    if "path" in encoder_cfg:
+        print("  -", out_dir / encoder_cfg["path"], f"({encoder} encoder)")
+    print("  -", out_dir / "config.json", f"(version {version})")
+    if shard:
+        # Served next to the other catalogs in the manifest (see shards.py)
+        print("  -", register_shard(manifest, shard, out_dir), f"(shard '{shard}')")
+    del index, embs, chunks  # index and embs map vectors.npy in the work dir
+    shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"[build] done in {time.perf_counter() - t0:.1f}s "
+          f"({stats['resumed']:,} resumed, {stats['hits']:,} reused, {stats['encoded']:,} encoded)")
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--data-dir", default=str(Path(__file__).resolve().parents[1] / "data" / "processed" / "rag_export"))
     ap.add_argument("--out-dir",  default=str(Path(__file__).resolve().parents[1] / "data" / "processed" / "index"))
+    ap.add_argument("--cache-dir", help="persistent embedding cache, keyed by chunk text hash + model name "
+                                        "(default: embedding_cache/<out-dir name> next to --out-dir)")
+    ap.add_argument("--no-cache", action="store_true", help="re-encode every chunk and don't touch the cache")
+    ap.add_argument("--work-dir", help="vector shards + checkpoint manifest for resuming an interrupted build "
+                                       "(default: build_shards/<out-dir name> next to --out-dir)")
+    ap.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS, help="CSV rows read and embedded per shard")
+    ap.add_argument("--workers", type=int, default=0, help="encoder processes (0 = one per available core, up to 4)")
+    ap.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="FAISS index structure")
+    ap.add_argument("--hnsw-m", type=int, default=DEFAULTS["hnsw_m"], help="hnsw: graph neighbours per node")
+    ap.add_argument("--ef-construction", type=int, default=DEFAULTS["ef_construction"], help="hnsw: build beam width")
+    ap.add_argument("--ef-search", type=int, default=DEFAULTS["ef_search"], help="hnsw: search beam width (stored in config)")
+    ap.add_argument("--nlist", type=int, default=DEFAULTS["nlist"], help="ivf_*: number of lists (0 = auto)")
+    ap.add_argument("--nprobe", type=int, default=DEFAULTS["nprobe"], help="ivf_*: lists probed per search (stored in config)")
+    ap.add_argument("--pq-m", type=int, default=DEFAULTS["pq_m"], help="ivf_pq: sub-quantizers (must divide dim)")
+    ap.add_argument("--pq-nbits", type=int, default=DEFAULTS["pq_nbits"], help="ivf_pq: bits per sub-quantizer code")
+    ap.add_argument("--vectors", choices=VECTOR_STORAGE, default=DEFAULTS["storage"],
+                    help="flat: vector storage searched first (float16/int8 re-rank from a float32 side file)")
+    ap.add_argument("--project-dim", type=int, default=DEFAULTS["project_dim"],
+                    help="flat + float16/int8: project vectors to this many dimensions first (0 = keep all)")
+    ap.add_argument("--rerank-factor", type=int, default=DEFAULTS["rerank_factor"],
+                    help="float16/int8: candidates re-scored at full precision per result")
+    ap.add_argument("--eval-queries", type=int, default=500, help="sampled queries for the recall/latency report (0 = skip)")
+    ap.add_argument("--encoder", choices=ENCODER_BACKENDS, default="torch",
+                    help="query encoder backend written to config (chunks are always embedded with torch)")
+    ap.add_argument("--similar-k", type=int, default=DEFAULT_NEIGHBORS,
+                    help="similar courses precomputed per course for /similar (0 = skip)")
+    ap.add_argument("--shard", help="register the built index under this name in the shard manifest")
+    ap.add_argument("--manifest", default=str(DEFAULT_MANIFEST), help="shard manifest updated by --shard")
+    ap.add_argument("--quantize-for", choices=QUANTIZE_TARGETS, default="avx2", help="onnx_int8: target CPU instruction set")
     args = ap.parse_args()
-    main(args.data_dir, args.out_dir)
\ No newline at end of file
+    index_params = {k: getattr(args, k) for k in ("hnsw_m", "ef_construction", "ef_search", "nlist", "nprobe", "pq_m", "pq_nbits",
+                                                  "project_dim", "rerank_factor")}
+    index_params["storage"] = args.vectors
+    main(args.data_dir, args.out_dir, args.cache_dir,
+         args.index_type, index_params, args.eval_queries, args.encoder, args.quantize_for, args.similar_k,
+         args.work_dir, args.batch_rows, args.workers, args.shard, args.manifest, args.no_cache)
\ No newline at end of file
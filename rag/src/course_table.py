@@ -0,0 +1,89 @@
+# rag/src/course_table.py
+"""
+Precomputed course grouping for retrieval results.
+
+At load time the chunk table is reduced to:
+  - parent_ids: int32 array aligned with the FAISS index (row -> course id)
+  - summaries:  one ready-to-serialize dict per course (code, name, subject)
+so collapsing a row of FAISS hits into distinct courses is a few NumPy ops
+over `idxs`/`scores`, with no DataFrame copies on the request path.
+"""
+import numpy as np
+import pandas as pd
+
+PARENT_COL = "metadata.parent_id"
+
+
+def _clean(val) -> str:
+    return str(val) if pd.notna(val) else ""
+
+
+def _column_getter(chunks, col):
+    """positions -> list of values, for a DataFrame or a metadata_store.ChunkStore."""
+    if hasattr(chunks, "column_values"):
+        return lambda positions: chunks.column_values(col, positions)
+    values = chunks[col].to_numpy()
+    return lambda positions: values[np.asarray(positions, dtype=np.int64)].tolist()
+
+
+def best_per_parent(parents: np.ndarray, scores: np.ndarray, limit: int) -> np.ndarray:
+    """Positions (into `parents`/`scores`) of the best-scoring hit per parent, best first."""
+    order = np.argsort(-scores, kind="stable")
+    _, first = np.unique(parents[order], return_index=True)
+    return order[np.sort(first)[:limit]]
+
+
+class CourseTable:
+    def __init__(self, chunks):
+        cols = list(chunks.columns)
+        parent_col = PARENT_COL if PARENT_COL in cols else "id"
+        codes, self.parent_keys = pd.factorize(pd.Series(chunks[parent_col]).astype(str))
+        self.parent_ids = codes.astype(np.int32)
+
+        # One representative chunk per course; course-level metadata is the same on every chunk
+        first_rows = np.unique(self.parent_ids, return_index=True)[1]
+        get = {c: _column_getter(chunks, c) for c in
+               ("metadata.course_code", "metadata.class_name", "metadata.subject", "metadata.subject_code")
+               if c in cols}
+        vals = {c: g(first_rows) for c, g in get.items()}
+        blank = [""] * len(first_rows)
+        self.summaries = [
+            {
+                "course_code": _clean(code),
+                "class_name": _clean(name),
+                "subject": _clean(subj) or _clean(subj2),
+            }
+            for code, name, subj, subj2 in zip(
+                vals.get("metadata.course_code", blank),
+                vals.get("metadata.class_name", blank),
+                vals.get("metadata.subject", blank),
+                vals.get("metadata.subject_code", blank),
+            )
+        ]
+        self._text = _column_getter(chunks, "text") if "text" in cols else (lambda positions: blank[:len(positions)])
+
+    def __len__(self):
+        return len(self.summaries)
+
+    def group(self, scores, idxs, top_courses: int) -> list:
+        """Collapse one row of FAISS hits into at most `top_courses` course dicts."""
+        idxs = np.asarray(idxs, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float32)
+        keep = idxs >= 0
+        idxs, scores = idxs[keep], scores[keep]
+        if not len(idxs):
+            return []
+
+        sel = best_per_parent(self.parent_ids[idxs], scores, top_courses)
+        return self.records(idxs[sel], scores[sel])
+
+    def records(self, rows, scores) -> list:
+        """Course dicts for chunk rows that are already one per course, in the given order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return []
+        texts = self._text(rows)
+        return [
+            {**self.summaries[p], "description": _clean(t), "score": float(s)}
+            for p, t, s in zip(self.parent_ids[rows].tolist(), texts, np.asarray(scores, dtype=np.float32).tolist())
+        ]
@@ -0,0 +1,309 @@
+# rag/src/embed_pipeline.py
+"""
+Streaming, resumable chunk embedding for build_index.py.
+
+The chunk CSV is read in fixed-size row batches; each batch becomes one shard:
+  1. vectors already in the embedding cache are copied from it
+  2. the other texts are encoded by a pool of worker processes, one model per
+     worker, with the cores split between them
+  3. the shard's vectors are written to <work_dir>/shards/ as soon as they are
+     ready, and <work_dir>/manifest.json records the shard with a digest of its texts
+An interrupted build resumes from the manifest: a shard whose texts, model and
+batch size are unchanged is not encoded again. At most two batches per worker
+are in flight, so encoding memory depends on --batch-rows, not on the catalog.
+The shards are then streamed into one memory-mapped (n, dim) vectors.npy for
+FAISS and the other build steps. Rows are not kept either: each batch is handed
+to `on_batch` (build_index.py streams it into chunks.csv and chunks.cols/) and
+dropped.
+
+The embedding cache (text hash -> vector) is a directory of two .npy files,
+sorted keys and their vectors, both memory-mapped; lookups are a searchsorted
+per batch. Caches in the older single-.npz format are read and migrated.
+"""
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import re
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = "manifest.json"
+VECTORS_NAME = "vectors.npy"
+FORMAT_VERSION = 1
+DEFAULT_BATCH_ROWS = 2048
+ENCODE_BATCH_SIZE = 64   # sentences per model.encode forward pass
+DEFAULT_MAX_WORKERS = 4  # each worker holds its own torch runtime + model
+POOL_MIN_TEXTS = 256     # smaller batches (incremental rebuilds) are encoded in-process
+COPY_BLOCK = 65536       # rows per block when gathering vectors between files
+KEY_DTYPE = "S40"        # sha1 hex digest
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _write_npy(path: Path, arr: np.ndarray):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    tmp.replace(path)  # a crash never leaves a half-written file under the real name
+
+
+def _write_json(path: Path, obj: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(obj, indent=2, sort_keys=True))
+    tmp.replace(path)
+
+
+# ----------------------------
+# Embedding cache (text hash + model name -> vector)
+# ----------------------------
+class EmbeddingCache:
+    def __init__(self, cache_dir: Path, model_name: str):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+        self.path = Path(cache_dir) / slug
+        self.legacy_path = Path(cache_dir) / f"{slug}.npz"
+        self.keys = np.empty(0, dtype=KEY_DTYPE)
+        self.vecs = None
+        if (self.path / "keys.npy").exists() and (self.path / "vecs.npy").exists():
+            keys = np.load(self.path / "keys.npy", mmap_mode="r")
+            vecs = np.load(self.path / "vecs.npy", mmap_mode="r")
+            if len(keys) == len(vecs):
+                self.keys, self.vecs = keys, vecs
+        elif self.legacy_path.exists():
+            with np.load(self.legacy_path) as z:
+                keys, vecs = z["keys"].astype(KEY_DTYPE), z["vecs"]
+            order = np.argsort(keys, kind="stable")
+            self.keys, self.vecs = keys[order], vecs[order]
+        if len(self.keys):
+            print(f"[build] embedding cache: {len(self.keys):,} vectors in {self.path}")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, keys: np.ndarray) -> tuple:
+        """(found mask, cache rows) for an array of text hashes."""
+        if not len(self.keys):
+            return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return self.keys[rows] == keys, rows
+
+    def save(self, keys: np.ndarray, vectors: np.ndarray) -> tuple:
+        """Rewrite the cache with exactly `keys` (one per row of `vectors`) -> (vectors kept, stale dropped)."""
+        live, first = np.unique(keys, return_index=True)  # sorted, one row per distinct text
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        out = np.lib.format.open_memmap(tmp / "vecs.npy", mode="w+", dtype="float32",
+                                        shape=(len(live), vectors.shape[1]))
+        for start in range(0, len(live), COPY_BLOCK):
+            out[start:start + COPY_BLOCK] = vectors[first[start:start + COPY_BLOCK]]
+        out.flush()
+        del out
+        np.save(tmp / "keys.npy", live)
+        dropped = len(self.keys) - int(np.isin(self.keys, live).sum()) if len(self.keys) else 0
+        # Swap directories so readers see the old cache or the new one, never a mix
+        old = self.path.with_name(self.path.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        if self.path.exists():
+            self.path.replace(old)
+        tmp.replace(self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        if self.legacy_path.exists():
+            self.legacy_path.unlink()  # migrated
+        return len(live), dropped
+
+
+# ----------------------------
+# Encoder processes
+# ----------------------------
+_model = None
+
+
+def _init_encoder(model_name: str, threads: int = 0):
+    global _model
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    from encoders import load_encoder
+    _model = load_encoder({"model": model_name})  # chunks always use the full-precision reference
+
+
+def _encode(texts: list) -> np.ndarray:
+    return np.asarray(_model.encode(texts, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False,
+                                    normalize_embeddings=True), dtype="float32")
+
+
+class _Encoders:
+    """Encodes in a process pool, started for the first batch big enough to be worth it.
+
+    Until then (and always when workers == 1) texts are encoded in this process;
+    the model is only loaded when something actually needs encoding.
+    """
+
+    def __init__(self, model_name: str, workers: int):
+        self.model_name = model_name
+        self.workers = workers
+        self.pool = None
+
+    def submit(self, texts: list):
+        if self.pool is None and self.workers > 1 and len(texts) >= POOL_MIN_TEXTS:
+            threads = max(1, available_cores() // self.workers)
+            print(f"[build] encoding with {self.workers} worker processes x {threads} threads")
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=mp.get_context("spawn"),
+                                            initializer=_init_encoder, initargs=(self.model_name, threads))
+        if self.pool is not None:
+            return self.pool.submit(_encode, texts)
+        if _model is None:
+            _init_encoder(self.model_name)
+        fut = Future()
+        fut.set_result(_encode(texts))
+        return fut
+
+    def close(self, cancel: bool = False):
+        if self.pool is not None:
+            self.pool.shutdown(wait=not cancel, cancel_futures=cancel)
+
+
+# ----------------------------
+# Shards + manifest
+# ----------------------------
+def _load_manifest(work_dir: Path, model_name: str, batch_rows: int) -> dict:
+    path = work_dir / MANIFEST_NAME
+    if path.exists():
+        m = json.loads(path.read_text())
+        if m.get("format") == FORMAT_VERSION and m.get("model") == model_name and m.get("batch_rows") == batch_rows:
+            return m
+        print(f"[build] {path} is from a different model or batch size; starting over")
+    shutil.rmtree(work_dir / "shards", ignore_errors=True)
+    return {"format": FORMAT_VERSION, "model": model_name, "batch_rows": batch_rows, "dim": None, "shards": {}}
+
+
+def _shard_ok(shard_dir: Path, entry: dict, digest: str, rows: int) -> bool:
+    if not entry or entry["digest"] != digest or entry["rows"] != rows:
+        return False
+    path = shard_dir / entry["file"]
+    return path.exists() and np.load(path, mmap_mode="r").shape[0] == rows
+
+
+def _concat_shards(shard_dir: Path, manifest: dict, n_shards: int, out_path: Path) -> np.ndarray:
+    entries = [manifest["shards"][str(i)] for i in range(n_shards)]
+    total = sum(e["rows"] for e in entries)
+    out = np.lib.format.open_memmap(out_path, mode="w+", dtype="float32", shape=(total, manifest["dim"]))
+    start = 0
+    for e in entries:
+        out[start:start + e["rows"]] = np.load(shard_dir / e["file"], mmap_mode="r")
+        start += e["rows"]
+    out.flush()
+    del out
+    return np.load(out_path, mmap_mode="r")
+
+
+def embed_csv(csv_path: Path, model_name: str, work_dir: Path, cache_dir: Path = None,
+              batch_rows: int = DEFAULT_BATCH_ROWS, workers: int = 0, text_col: str = "text", id_col: str = "id",
+              on_batch=None):
+    """Embed every row of `csv_path` -> (memory-mapped (n, dim) float32 vectors, stats).
+
+    `on_batch(df)` is called with every CSV batch in row order, resumed ones included.
+    """
+    if not csv_path.exists():
+        raise FileNotFoundError(f"Missing file: {csv_path}")
+    work_dir = Path(work_dir)
+    shard_dir = work_dir / "shards"
+    work_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _load_manifest(work_dir, model_name, batch_rows)
+    shard_dir.mkdir(exist_ok=True)
+    cache = EmbeddingCache(cache_dir, model_name) if cache_dir else None
+    workers = workers or min(available_cores(), DEFAULT_MAX_WORKERS)
+    encoders = _Encoders(model_name, workers)
+    stats = {"chunks": 0, "hits": 0, "encoded": 0, "resumed": 0}
+    keys = []
+    pending = {}  # future -> (shard id, text hashes, cache-found mask, cache rows, missing rows, inverse)
+
+    def finish(i, batch_keys, found, rows, missing, inverse, new):
+        n = len(batch_keys)
+        dim = new.shape[1] if new is not None and len(new) else cache.vecs.shape[1]
+        vecs = np.empty((n, dim), dtype="float32")
+        if found.any():
+            vecs[found] = cache.vecs[rows[found]]
+        if len(missing):
+            vecs[missing] = new[inverse]
+        name = f"{i:05d}.npy"
+        _write_npy(shard_dir / name, vecs)
+        manifest["dim"] = dim
+        manifest["shards"][str(i)] = {"rows": n, "digest": hashlib.sha1(batch_keys.tobytes()).hexdigest(), "file": name}
+        _write_json(work_dir / MANIFEST_NAME, manifest)
+
+    def drain(block_until: int):
+        while len(pending) > block_until:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for fut in done:
+                finish(*pending.pop(fut), fut.result())
+
+    t0 = time.perf_counter()
+    try:
+        for i, batch in enumerate(pd.read_csv(csv_path, chunksize=batch_rows)):
+            if text_col not in batch.columns or id_col not in batch.columns:
+                raise ValueError(f"Expected columns '{id_col}' and '{text_col}' in {csv_path}")
+            texts = batch[text_col].astype(str).tolist()
+            batch_keys = np.array([text_hash(t) for t in texts], dtype=KEY_DTYPE)
+            keys.append(batch_keys)
+            if on_batch is not None:
+                on_batch(batch)
+            stats["chunks"] += len(texts)
+            digest = hashlib.sha1(batch_keys.tobytes()).hexdigest()
+            if _shard_ok(shard_dir, manifest["shards"].get(str(i)), digest, len(texts)):
+                stats["resumed"] += len(texts)
+                continue
+
+            if cache is not None:
+                found, rows = cache.lookup(batch_keys)
+            else:
+                found, rows = np.zeros(len(texts), dtype=bool), np.zeros(len(texts), dtype=np.int64)
+            stats["hits"] += int(found.sum())
+            missing = np.flatnonzero(~found)
+            if not len(missing):
+                finish(i, batch_keys, found, rows, missing, None, None)
+                continue
+            _, first, inverse = np.unique(batch_keys[missing], return_index=True, return_inverse=True)
+            stats["encoded"] += len(first)
+            fut = encoders.submit([texts[j] for j in missing[first].tolist()])
+            pending[fut] = (i, batch_keys, found, rows, missing, inverse.ravel())
+            drain(2 * workers - 1)  # bounded: at most two batches per worker in flight
+        drain(0)
+    except BaseException:
+        encoders.close(cancel=True)
+        raise
+    encoders.close()
+    if not keys:
+        raise ValueError(f"No chunks in {csv_path}")
+
+    n_shards = len(keys)
+    for sid in [s for s in manifest["shards"] if int(s) >= n_shards]:  # the CSV got shorter
+        (shard_dir / manifest["shards"].pop(sid)["file"]).unlink(missing_ok=True)
+    _write_json(work_dir / MANIFEST_NAME, manifest)
+    looked_up = stats["hits"] + stats["encoded"]  # resumed shards never reach the cache
+    print(f"[build] {stats['chunks']:,} chunks in {n_shards:,} shards of {batch_rows:,} rows "
+          f"({stats['resumed']:,} resumed from {work_dir}); "
+          f"cache hits {stats['hits']:,} ({stats['hits'] / looked_up if looked_up else 0:.1%} hit rate), "
+          f"encoded {stats['encoded']:,} new/changed chunks in {time.perf_counter() - t0:.1f}s")
+
+    vectors = _concat_shards(shard_dir, manifest, n_shards, work_dir / VECTORS_NAME)
+    all_keys = np.concatenate(keys)
+    if cache is not None:
+        kept, dropped = cache.save(all_keys, vectors)
+        print(f"[build] embedding cache saved ({kept:,} vectors, {dropped:,} stale dropped)")
+    return vectors, stats
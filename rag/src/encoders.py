@@ -0,0 +1,97 @@
+# rag/src/encoders.py
+"""
+Sentence encoder backends for query (and chunk) embedding.
+
+Every backend returns a SentenceTransformer, so callers keep using
+model.encode(texts, normalize_embeddings=True, ...) unchanged:
+  torch       full-precision PyTorch (reference; default)
+  torch_int8  PyTorch with nn.Linear layers dynamically quantized to int8
+  onnx        ONNX Runtime export of the same weights
+  onnx_int8   ONNX Runtime, int8 dynamically quantized export
+
+The query encoder is chosen by the "encoder" block in config.json, e.g.
+  {"backend": "onnx_int8", "path": "encoder", "file_name": "onnx/model_int8_avx2.onnx"}
+where "path" is relative to the index directory. ONNX backends need
+`pip install "sentence-transformers[onnx]"` and are exported locally with
+export_encoder() (build_index.py --encoder does this). Chunk embeddings are
+always computed with the torch reference; only the per-query encoder changes,
+so check bench/bench_encoders.py for drift before switching.
+"""
+from importlib.util import find_spec
+from pathlib import Path
+
+from sentence_transformers import SentenceTransformer
+
+ENCODER_BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+QUANTIZE_TARGETS = ("avx2", "avx512", "avx512_vnni", "arm64")
+ONNX_MODULES = ("onnxruntime", "optimum")  # what the sentence-transformers[onnx] extra installs
+
+
+def check_backend(backend: str) -> None:
+    """Raise ImportError naming the missing extra if `backend` can't run here."""
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}' (expected one of {', '.join(ENCODER_BACKENDS)})")
+    missing = [m for m in ONNX_MODULES if find_spec(m) is None] if backend.startswith("onnx") else []
+    if missing:
+        raise ImportError(f"The '{backend}' encoder needs {', '.join(missing)}: "
+                          f'pip install "sentence-transformers[onnx]"')
+
+
+def encoder_config(cfg: dict) -> dict:
+    enc = dict(cfg.get("encoder") or {})
+    enc.setdefault("backend", "torch")
+    if enc["backend"] not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{enc['backend']}' (expected one of {', '.join(ENCODER_BACKENDS)})")
+    return enc
+
+
+def encoder_key(cfg: dict) -> tuple:
+    """Identifies the loaded weights: equal keys mean one loaded encoder can be reused."""
+    enc = encoder_config(cfg)
+    return (cfg["model"], enc["backend"], enc.get("path"), enc.get("file_name"))
+
+
+def is_uncased(model) -> bool:
+    """True when the model's tokenizer lowercases its input, so case can't change an embedding."""
+    return bool(getattr(getattr(model, "tokenizer", None), "do_lower_case", False))
+
+
+def load_encoder(cfg: dict, index_dir: Path = None) -> SentenceTransformer:
+    """Load the encoder described by config.json's "model" + "encoder" fields."""
+    enc = encoder_config(cfg)
+    backend = enc["backend"]
+
+    if backend in ("torch", "torch_int8"):
+        model = SentenceTransformer(cfg["model"], device="cpu" if backend == "torch_int8" else None)
+        if backend == "torch_int8":
+            import torch
+            torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    check_backend(backend)
+    source = cfg["model"]
+    if enc.get("path") and index_dir is not None and (Path(index_dir) / enc["path"]).exists():
+        source = str(Path(index_dir) / enc["path"])
+    model_kwargs = {"file_name": enc["file_name"]} if enc.get("file_name") else None
+    return SentenceTransformer(source, backend="onnx", model_kwargs=model_kwargs)
+
+
+def export_encoder(model_name: str, backend: str, out_dir: Path, quantize_for: str = "avx2") -> dict:
+    """Export an ONNX encoder into out_dir; returns its config.json "encoder" block (path = out_dir.name).
+
+    torch backends need nothing on disk and just return {"backend": ...}.
+    """
+    check_backend(backend)
+    if backend in ("torch", "torch_int8"):
+        return {"backend": backend}
+
+    out_dir = Path(out_dir)
+    model = SentenceTransformer(model_name, backend="onnx")  # converts on the fly if the hub has no ONNX file
+    model.save(str(out_dir))
+    enc = {"backend": backend, "path": out_dir.name}
+    if backend == "onnx_int8":
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        export_dynamic_quantized_onnx_model(model, quantize_for, str(out_dir), file_suffix=f"int8_{quantize_for}")
+        enc["file_name"] = f"onnx/model_int8_{quantize_for}.onnx"
+    print(f"[encoder] exported {backend} encoder to {out_dir}")
+    return enc
@@ -0,0 +1,170 @@
+# rag/src/filters.py
+"""
+Metadata filters pushed down into FAISS.
+
+At load time FilterIndex turns the chunk table into per-subject bitmaps, a
+no-prerequisite bitmap and credit arrays. A request's filters become one packed
+bitmap wrapped in a faiss.IDSelectorBitmap, passed to index.search through
+SearchParameters, so FAISS only ever scores matching chunks.
+
+Filters (all optional, combined with AND):
+  subject      subject code or list of codes ("CS", ["CS", "MATH"])
+  credits_min  course credit range must reach at least this many credits
+  credits_max  ... and start at or below this many (ranges like 1-4 overlap)
+  no_prereqs   only courses with empty metadata.prereq_codes
+  completed    list of completed course codes: only courses the student is
+               eligible for (all prerequisites completed, see prereq_graph.py)
+"""
+from collections import namedtuple
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from ann_index import first_pass
+from prereq_graph import PrereqGraph, parse_code
+
+Filters = namedtuple("Filters", ["subjects", "credits_min", "credits_max", "no_prereqs", "completed"])
+
+
+def parse_filters(raw) -> Filters:
+    """Validate a filters dict (from JSON or CLI args). Returns None when nothing is filtered."""
+    if raw is None:
+        return None
+    if not isinstance(raw, dict):
+        raise ValueError("'filters' must be an object")
+    unknown = set(raw) - {"subject", "credits_min", "credits_max", "no_prereqs", "completed"}
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+
+    subjects = raw.get("subject")
+    if isinstance(subjects, str):
+        subjects = [subjects]
+    if subjects is not None:
+        if not isinstance(subjects, list) or not all(isinstance(x, str) and x.strip() for x in subjects):
+            raise ValueError("'subject' must be a subject code or a list of codes")
+        subjects = tuple(sorted({x.strip().upper() for x in subjects}))
+
+    bounds = []
+    for key in ("credits_min", "credits_max"):
+        val = raw.get(key)
+        if val is not None and (isinstance(val, bool) or not isinstance(val, (int, float))):
+            raise ValueError(f"'{key}' must be a number")
+        bounds.append(float(val) if val is not None else None)
+    if None not in bounds and bounds[0] > bounds[1]:
+        raise ValueError("'credits_min' cannot exceed 'credits_max'")
+
+    no_prereqs = raw.get("no_prereqs", False)
+    if not isinstance(no_prereqs, bool):
+        raise ValueError("'no_prereqs' must be true or false")
+
+    completed = raw.get("completed")
+    if completed is not None:
+        if not isinstance(completed, list) or not all(isinstance(x, str) for x in completed):
+            raise ValueError("'completed' must be a list of course codes")
+        completed = tuple(sorted({parse_code(x) or x.strip().upper() for x in completed}))
+
+    f = Filters(subjects or None, bounds[0], bounds[1], no_prereqs, completed)
+    return f if f != Filters(None, None, None, False, None) else None
+
+
+def _empty_codes(val) -> bool:
+    if pd.isna(val):
+        return True
+    return str(val).strip() in ("", "[]")
+
+
+def _column(chunks, col, n, default):
+    if col in chunks.columns:
+        return pd.Series(chunks[col]).to_numpy()
+    return np.full(n, default, dtype=object)
+
+
+class FilterIndex:
+    def __init__(self, chunks, prereqs: PrereqGraph = None):
+        n = len(chunks)
+        self.size = n
+        self._chunks = chunks
+        self._prereqs = prereqs  # built on first use by a "completed" filter when not given
+        subjects = pd.Series(_column(chunks, "metadata.subject_code", n, "")).fillna("").astype(str).str.upper().to_numpy()
+        self.subject_bits = {
+            code: np.packbits(subjects == code, bitorder="little")
+            for code in np.unique(subjects) if code
+        }
+        self.no_prereq_bits = np.packbits(
+            np.fromiter((_empty_codes(v) for v in _column(chunks, "metadata.prereq_codes", n, "[]")), bool, n),
+            bitorder="little",
+        )
+        self.credits_min = pd.to_numeric(pd.Series(_column(chunks, "metadata.credits_min", n, np.nan)), errors="coerce").to_numpy()
+        self.credits_max = pd.to_numeric(pd.Series(_column(chunks, "metadata.credits_max", n, np.nan)), errors="coerce").to_numpy()
+        self.all_bits = np.packbits(np.ones(n, dtype=bool), bitorder="little")
+
+    def bitmap(self, f: Filters) -> np.ndarray:
+        """Packed (little-endian) bitmap of chunk rows matching `f`."""
+        bits = self.all_bits.copy()
+        if f.subjects:
+            subj = np.zeros_like(bits)
+            for code in f.subjects:
+                if code in self.subject_bits:
+                    subj |= self.subject_bits[code]
+            bits &= subj
+        if f.no_prereqs:
+            bits &= self.no_prereq_bits
+        if f.completed is not None:
+            if self._prereqs is None:
+                self._prereqs = PrereqGraph(self._chunks)
+            g = self._prereqs
+            bits &= np.packbits(g.row_mask(g.eligible(g.resolve(f.completed)[0])), bitorder="little")
+        if f.credits_min is not None or f.credits_max is not None:
+            ok = np.ones(self.size, dtype=bool)
+            with np.errstate(invalid="ignore"):
+                if f.credits_min is not None:
+                    ok &= self.credits_max >= f.credits_min
+                if f.credits_max is not None:
+                    ok &= self.credits_min <= f.credits_max
+            bits &= np.packbits(ok, bitorder="little")
+        return bits
+
+    def mask(self, f: Filters) -> np.ndarray:
+        """Boolean row mask for `f` (None when nothing is filtered)."""
+        if f is None:
+            return None
+        return np.unpackbits(self.bitmap(f), bitorder="little", count=self.size).astype(bool)
+
+    def count(self, bits: np.ndarray) -> int:
+        return int(np.unpackbits(bits, bitorder="little", count=self.size).sum())
+
+    def search_params(self, bits: np.ndarray, index, cfg: dict, k: int, matches: int = None):
+        """SearchParameters restricting `index.search` to the rows set in `bits`.
+
+        For ANN indexes the beam width / probe count is widened by the inverse
+        of the filter's selectivity so selective filters still fill all k slots.
+        Keep the returned object alive for the duration of the search; it holds
+        the bitmap FAISS reads from.
+        """
+        sel = faiss.IDSelectorBitmap(self.size, faiss.swig_ptr(bits))
+        search = (cfg.get("index") or {}).get("search") or {}
+        matches = self.count(bits) if matches is None else matches
+        widen = self.size / max(matches, 1)
+        base = faiss.downcast_index(first_pass(index))
+        if isinstance(base, faiss.IndexHNSW):
+            ef = max(int(search.get("efSearch", base.hnsw.efSearch)), k)
+            params = faiss.SearchParametersHNSW(sel=sel, efSearch=int(min(self.size, np.ceil(ef * widen))))
+        elif isinstance(base, faiss.IndexIVF):
+            nprobe = int(search.get("nprobe", base.nprobe))
+            params = faiss.SearchParametersIVF(sel=sel, nprobe=int(min(base.nlist, np.ceil(nprobe * widen))))
+        else:
+            params = faiss.SearchParameters(sel=sel)
+        params._keepalive = (sel, bits)
+        return params
+
+    def search(self, index, cfg: dict, q_embs: np.ndarray, k: int, filters: Filters):
+        """index.search over only the chunks matching `filters` (k is capped at the match count)."""
+        if filters is None:
+            return index.search(q_embs, k)
+        bits = self.bitmap(filters)
+        matches = self.count(bits)
+        if matches == 0:
+            return np.zeros((len(q_embs), 0), "float32"), np.zeros((len(q_embs), 0), "int64")
+        k = min(k, matches)
+        return index.search(q_embs, k, params=self.search_params(bits, index, cfg, k, matches))
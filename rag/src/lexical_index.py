@@ -0,0 +1,257 @@
+# rag/src/lexical_index.py
+"""
+Lexical side of retrieval: an exact course-code table and a BM25 inverted
+index over chunk text, built by build_index.py into <index>/lexical.npz.
+
+  codes     normalized "SUBJ 123" -> chunk rows (a dict over CSR arrays)
+  postings  term -> (chunk rows, precomputed BM25 weight per posting), so a
+            query scores every chunk with one vector add per query term
+
+HybridRetriever sits in front of the dense search:
+  - a query that is only course codes plus lookup words ("CS 211",
+    "ACTG 315 prerequisites") is answered from the code table, never
+    touching the encoder: the named courses first (score 1.0), then chunks
+    that mention them, ranked by BM25
+  - any other query runs the dense search and is fused with BM25 as
+    (1 - w) * cosine + w * bm25 / max(bm25) over the union of both hit lists
+"""
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+LEXICAL_NAME = "lexical.npz"
+FORMAT_VERSION = 1
+DEFAULT_LEXICAL_WEIGHT = 0.3
+RETRIEVAL_MODES = ("hybrid", "dense")
+BM25_K1 = 1.2
+BM25_B = 0.75
+LOOKUP_FILL_SCALE = 0.5  # BM25 fill after an exact code match ranks below the match itself
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+CODE_RE = re.compile(r"\b([a-z]{2,5})\s*-?\s*(\d{3}[a-z]?)\b", re.IGNORECASE)
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in into is it its of on or that the their this to was were which
+will with i me my we you your can what who how do does any all about
+""".split())
+# Words that don't turn a code lookup ("CS 211 prerequisites") into a topical search
+LOOKUP_WORDS = STOPWORDS | frozenset("""
+course courses class classes info information details description describe credit credits hours
+prereq prereqs prerequisite prerequisites coreq coreqs corequisite corequisites requirements required
+need needed take taking tell show
+""".split())
+
+
+def normalize_code(subject: str, number: str) -> str:
+    return f"{subject.upper()} {number.upper()}"
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased word tokens minus stopwords, plus one joined token per course code ("cs211")."""
+    low = str(text).lower()
+    tokens = [t for t in TOKEN_RE.findall(low) if t not in STOPWORDS]
+    tokens.extend(s + n for s, n in CODE_RE.findall(low))
+    return tokens
+
+
+def _csr(keys: list, values: list) -> tuple:
+    """Group `values` by `keys` -> (sorted unique keys, offsets, grouped values)."""
+    keys = np.asarray(keys, dtype=object)
+    order = np.argsort(keys, kind="stable")
+    uniq, starts = np.unique(keys[order], return_index=True)
+    offsets = np.append(starts, len(keys)).astype(np.int64)
+    return uniq.astype(str), offsets, order
+
+
+def build_lexical_arrays(chunks, k1: float = BM25_K1, b: float = BM25_B) -> dict:
+    """Code table + BM25 postings for a chunk table (DataFrame or ChunkStore)."""
+    n = len(chunks)
+    if "metadata.course_code" in chunks.columns:
+        raw_codes = pd.Series(chunks["metadata.course_code"]).fillna("").astype(str).tolist()
+    else:
+        raw_codes = [""] * n
+    code_keys, code_rows = [], []
+    for row, code in enumerate(raw_codes):
+        m = CODE_RE.fullmatch(code.strip())
+        if m:
+            code_keys.append(normalize_code(*m.groups()))
+            code_rows.append(row)
+    codes, code_offsets, order = _csr(code_keys, code_rows)
+    code_rows = np.asarray(code_rows, dtype=np.int32)[order]
+
+    # Postings as flat int buffers (term id, row, tf); a list of str per posting costs ~10x the memory
+    vocab = {}
+    post_terms, post_rows, post_tf = array("i"), array("i"), array("f")
+    doc_len = np.zeros(n, dtype=np.float32)
+    for row, text in enumerate(pd.Series(chunks["text"]).fillna("").astype(str).tolist()):
+        tokens = tokenize(text)
+        doc_len[row] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            post_terms.append(vocab.setdefault(term, len(vocab)))
+            post_rows.append(row)
+            post_tf.append(tf)
+    vocab = np.array(list(vocab), dtype=str)
+    rank = np.empty(len(vocab), dtype=np.int32)
+    rank[np.argsort(vocab, kind="stable")] = np.arange(len(vocab), dtype=np.int32)
+    keys = rank[np.asarray(post_terms, dtype=np.int32)]
+    order = np.argsort(keys, kind="stable")
+    term_ids, starts = np.unique(keys[order], return_index=True)
+    terms, term_offsets = np.sort(vocab)[term_ids], np.append(starts, len(keys)).astype(np.int64)
+    post_rows = np.asarray(post_rows, dtype=np.int32)[order]
+    tf = np.asarray(post_tf, dtype=np.float32)[order]
+
+    # BM25 impact per posting: idf(term) * saturated, length-normalized tf
+    df_ = np.diff(term_offsets).astype(np.float32)
+    idf = np.log1p((n - df_ + 0.5) / (df_ + 0.5))
+    avg_len = float(doc_len.mean()) if n else 0.0
+    norm = k1 * (1 - b + b * doc_len[post_rows] / max(avg_len, 1e-9))
+    weights = np.repeat(idf, np.diff(term_offsets)) * tf * (k1 + 1) / (tf + norm)
+    return {
+        "version": np.int64(FORMAT_VERSION), "rows": np.int64(n),
+        "codes": codes, "code_offsets": code_offsets, "code_rows": code_rows,
+        "terms": terms, "term_offsets": term_offsets,
+        "post_rows": post_rows, "post_weights": weights.astype(np.float32),
+    }
+
+
+def write_lexical_index(chunks, out_dir: Path) -> Path:
+    path = Path(out_dir) / LEXICAL_NAME
+    np.savez(path, **build_lexical_arrays(chunks))
+    return path
+
+
+def load_lexical_index(index_dir: Path, chunks):
+    """LexicalIndex from <index_dir>/lexical.npz, or built from `chunks` for older indexes."""
+    path = Path(index_dir) / LEXICAL_NAME
+    if path.exists():
+        with np.load(path) as z:
+            arrays = {k: z[k] for k in z.files}
+        if int(arrays["rows"]) == len(chunks):
+            return LexicalIndex(arrays)
+    return LexicalIndex(build_lexical_arrays(chunks))
+
+
+def fuse(dense_scores, dense_idxs, lex_scores, lex_idxs, weight: float) -> tuple:
+    """Union of a dense and a BM25 hit list scored (1 - weight) * cosine + weight * bm25 / max(bm25), best first.
+
+    Rows missing from the dense list get its lowest score (they ranked no higher than that).
+    """
+    dense_idxs = np.asarray(dense_idxs, dtype=np.int64)
+    dense_scores = np.asarray(dense_scores, dtype=np.float32)
+    keep = dense_idxs >= 0
+    d_idx, d_s = dense_idxs[keep], dense_scores[keep]
+    if not len(lex_idxs) or weight <= 0:
+        return d_s, d_idx
+    idxs = np.union1d(d_idx, lex_idxs)
+    dense = np.full(len(idxs), d_s.min() if len(d_s) else 0.0, dtype=np.float32)
+    dense[np.searchsorted(idxs, d_idx)] = d_s
+    lex = np.zeros(len(idxs), dtype=np.float32)
+    lex[np.searchsorted(idxs, lex_idxs)] = lex_scores / lex_scores.max()
+    fused = (1.0 - weight) * dense + weight * lex
+    order = np.argsort(-fused, kind="stable")
+    return fused[order], idxs[order]
+
+
+class LexicalIndex:
+    def __init__(self, arrays: dict):
+        self.size = int(arrays["rows"])
+        self.code_offsets = arrays["code_offsets"]
+        self.code_rows = arrays["code_rows"]
+        self.code_ids = {c: i for i, c in enumerate(arrays["codes"].tolist())}
+        self.term_offsets = arrays["term_offsets"]
+        self.post_rows = arrays["post_rows"]
+        self.post_weights = arrays["post_weights"]
+        self.term_ids = {t: i for i, t in enumerate(arrays["terms"].tolist())}
+
+    def __len__(self):
+        return len(self.code_ids)
+
+    def find_codes(self, query: str) -> list:
+        """Catalog course codes mentioned in `query`, normalized, in order of appearance."""
+        found = []
+        for subject, number in CODE_RE.findall(query):
+            code = normalize_code(subject, number)
+            if code in self.code_ids and code not in found:
+                found.append(code)
+        return found
+
+    def is_code_lookup(self, query: str, codes: list) -> bool:
+        """True when `query` is just course codes plus words like "prerequisites"."""
+        rest = CODE_RE.sub(" ", query.lower())
+        return bool(codes) and all(w in LOOKUP_WORDS for w in TOKEN_RE.findall(rest))
+
+    def rows_for(self, codes: list) -> np.ndarray:
+        ids = [self.code_ids[c] for c in codes if c in self.code_ids]
+        if not ids:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self.code_rows[self.code_offsets[i]:self.code_offsets[i + 1]] for i in ids]).astype(np.int64)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk row for `query` (float32, length = number of chunks)."""
+        out = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self.term_ids.get(term)
+            if i is not None:
+                s, e = self.term_offsets[i], self.term_offsets[i + 1]
+                out[self.post_rows[s:e]] += self.post_weights[s:e]  # rows are unique within a term
+        return out
+
+    def search(self, query: str, k: int, mask: np.ndarray = None) -> tuple:
+        """Top-k (scores, rows) by BM25, best first; only rows with a positive score (and set in `mask`)."""
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask] = 0.0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return scores[hits], hits.astype(np.int64)
+
+    def lookup(self, query: str, codes: list, k: int, mask: np.ndarray = None) -> tuple:
+        """(scores, rows) for a code lookup: the named courses at 1.0, then BM25 hits below them."""
+        rows = self.rows_for(codes)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        fill_s, fill_i = self.search(query, k, mask)
+        if len(fill_s):
+            fill_s = LOOKUP_FILL_SCALE * fill_s / fill_s.max()
+        return (np.concatenate([np.ones(len(rows), dtype=np.float32), fill_s]),
+                np.concatenate([rows, fill_i]))
+
+
+class HybridRetriever:
+    """Code lookups without the encoder; BM25 fused with dense hits for everything else.
+
+    `dense(queries, k)` must return 2-D (scores, idxs) for the given queries; it is
+    only called for queries that are not code lookups.
+    """
+
+    def __init__(self, lexical: LexicalIndex, weight: float = DEFAULT_LEXICAL_WEIGHT, mask: np.ndarray = None):
+        if not 0.0 <= weight <= 1.0:
+            raise ValueError("lexical weight must be between 0 and 1")
+        self.lexical = lexical
+        self.weight = float(weight)
+        self.mask = mask
+
+    def code_lookup(self, query: str, k: int):
+        """(scores, rows) when `query` is a code lookup, else None."""
+        codes = self.lexical.find_codes(query)
+        if codes and self.lexical.is_code_lookup(query, codes):
+            return self.lexical.lookup(query, codes, k, self.mask)
+        return None
+
+    def fuse(self, query: str, dense_scores, dense_idxs, k: int) -> tuple:
+        lex_s, lex_i = self.lexical.search(query, k, self.mask)
+        return fuse(dense_scores, dense_idxs, lex_s, lex_i, self.weight)
+
+    def retrieve_batch(self, queries: list, k: int, dense) -> list:
+        out = [self.code_lookup(q, k) for q in queries]
+        todo = [i for i, r in enumerate(out) if r is None]
+        if todo:
+            scores, idxs = dense([queries[i] for i in todo], k)
+            for j, i in enumerate(todo):
+                out[i] = self.fuse(queries[i], scores[j], idxs[j], k)
+        return out
@@ -0,0 +1,291 @@
+# rag/src/metadata_store.py
+"""
+Columnar, memory-mapped chunk metadata store.
+
+build_index.py writes the chunk table as one directory of NumPy artifacts:
+  - numeric columns  -> <col>.npy
+  - string columns   -> <col>.offsets.npy (int64, n+1) + <col>.blob (utf-8 bytes)
+                        [+ <col>.nulls.npy when the column has missing values]
+  - columns.json     -> row count + column order/kinds
+
+Loaders memory-map those files, so startup does no CSV parsing and forked
+gunicorn workers share the same page-cache pages instead of private copies.
+Rows are decoded on demand by position (`store.iloc[positions]`).
+"""
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORE_DIRNAME = "chunks.cols"
+CSV_NAME = "chunks.csv"
+FORMAT_VERSION = 1
+
+
+def _safe_name(col: str) -> str:
+    return col.replace("/", "_")
+
+
+def write_columnar(df: pd.DataFrame, out_dir: Path) -> Path:
+    """Write `df` as a columnar store under out_dir/chunks.cols and return its path.
+
+    The store is written into a fresh sibling directory and swapped in whole, so
+    no file from an earlier build (e.g. a stale <col>.nulls.npy) survives a rebuild.
+    """
+    writer = ColumnarWriter(out_dir)
+    writer.append(df)
+    return writer.close()
+
+
+def _swap_dir(new_dir: Path, store_dir: Path):
+    # A directory cannot be renamed over a non-empty one: move the old store aside
+    # first. Readers that already mapped its files keep them until they let go.
+    old_dir = store_dir.with_name(STORE_DIRNAME + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if store_dir.exists():
+        store_dir.rename(old_dir)
+    new_dir.rename(store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _append_raw(path: Path, arr: np.ndarray):
+    with open(path, "ab") as f:
+        f.write(np.ascontiguousarray(arr).tobytes())
+
+
+def _raw_to_npy(raw: Path, dtype, out: Path, lead=()):
+    """Turn a file of raw `dtype` values (after `lead`) into a .npy without loading it whole."""
+    n = raw.stat().st_size // np.dtype(dtype).itemsize if raw.exists() else 0
+    if len(lead) + n == 0:
+        np.save(out, np.zeros(0, dtype=dtype))
+    else:
+        arr = np.lib.format.open_memmap(out, mode="w+", dtype=dtype, shape=(len(lead) + n,))
+        arr[:len(lead)] = lead
+        if n:
+            arr[len(lead):] = np.memmap(raw, dtype=dtype, mode="r")
+        arr.flush()
+        del arr
+    raw.unlink(missing_ok=True)
+
+
+class ColumnarWriter:
+    """Builds a columnar store from DataFrame batches, so the whole table never sits in memory.
+
+    A column is numeric when every batch had it numeric; as soon as one batch
+    holds text, the batches before it are re-encoded as strings (the same values
+    pd.concat of the batches would hold). Nothing replaces out_dir/chunks.cols
+    until close().
+    """
+
+    def __init__(self, out_dir: Path):
+        self.store_dir = Path(out_dir) / STORE_DIRNAME
+        self.tmp_dir = self.store_dir.with_name(STORE_DIRNAME + ".tmp")
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        self.tmp_dir.mkdir(parents=True)
+        self.columns = None
+        self.rows = 0
+        self._numeric = {}  # column -> .npy part per batch, while every batch so far was numeric
+        self._string = {}   # column -> [blob bytes so far, any nulls so far]
+
+    def append(self, df: pd.DataFrame):
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self._numeric = {col: [] for col in self.columns}
+        elif list(df.columns) != self.columns:
+            raise ValueError("Every batch must have the same columns")
+        for col in self.columns:
+            s = df[col]
+            parts = self._numeric.get(col)
+            if parts is not None and (pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s)):
+                part = self.tmp_dir / f"{_safe_name(col)}.{len(parts)}.part.npy"
+                np.save(part, s.to_numpy())
+                parts.append(part)
+                continue
+            if parts is not None:  # first text batch: earlier numeric batches become strings too
+                for part in self._numeric.pop(col):
+                    self._append_strings(col, pd.Series(np.load(part)))
+                    part.unlink()
+            self._append_strings(col, s)
+        self.rows += len(df)
+
+    def _append_strings(self, col, s: pd.Series):
+        name = _safe_name(col)
+        state = self._string.setdefault(col, [0, False])
+        nulls = s.isna().to_numpy()
+        encoded = [b"" if n else str(v).encode("utf-8") for v, n in zip(s.tolist(), nulls)]
+        ends = state[0] + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        _append_raw(self.tmp_dir / f"{name}.blob", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        _append_raw(self.tmp_dir / f"{name}.offsets.part", ends)
+        _append_raw(self.tmp_dir / f"{name}.nulls.part", nulls)
+        if len(ends):
+            state[0] = int(ends[-1])
+        state[1] = state[1] or bool(nulls.any())
+
+    def close(self) -> Path:
+        """Finish every column, write columns.json and swap the store in; returns its path."""
+        columns = []
+        for col in self.columns or []:
+            name = _safe_name(col)
+            if col in self._numeric:
+                parts = [np.load(p, mmap_mode="r") for p in self._numeric[col]]
+                out = np.lib.format.open_memmap(self.tmp_dir / f"{name}.npy", mode="w+",
+                                                dtype=np.result_type(*parts), shape=(self.rows,))
+                start = 0
+                for part in parts:
+                    out[start:start + len(part)] = part
+                    start += len(part)
+                out.flush()
+                del out, parts
+                for p in self._numeric[col]:
+                    p.unlink()
+                columns.append({"name": col, "file": name, "kind": "numeric"})
+                continue
+            _, has_nulls = self._string[col]
+            (self.tmp_dir / f"{name}.blob").touch()
+            _raw_to_npy(self.tmp_dir / f"{name}.offsets.part", np.int64, self.tmp_dir / f"{name}.offsets.npy", lead=[0])
+            if has_nulls:
+                _raw_to_npy(self.tmp_dir / f"{name}.nulls.part", np.bool_, self.tmp_dir / f"{name}.nulls.npy")
+            else:
+                (self.tmp_dir / f"{name}.nulls.part").unlink(missing_ok=True)
+            columns.append({"name": col, "file": name, "kind": "string", "nulls": has_nulls})
+        (self.tmp_dir / "columns.json").write_text(json.dumps(
+            {"version": FORMAT_VERSION, "rows": self.rows, "columns": columns}, indent=2
+        ))
+        _swap_dir(self.tmp_dir, self.store_dir)
+        return self.store_dir
+
+
+class ChunkTableWriter:
+    """Writes chunks.csv and chunks.cols/ one batch at a time (build_index.py streams the CSV through this).
+
+    Both go to temporary names until close(), so an interrupted build leaves the
+    previous chunk table in place.
+    """
+
+    def __init__(self, out_dir: Path):
+        self.csv_path = Path(out_dir) / CSV_NAME
+        self._csv_tmp = self.csv_path.with_name(CSV_NAME + ".tmp")
+        self._columns = ColumnarWriter(out_dir)
+        self.rows = 0
+
+    def append(self, df: pd.DataFrame):
+        df.to_csv(self._csv_tmp, mode="a" if self.rows else "w", header=not self.rows, index=False)
+        self._columns.append(df)
+        self.rows += len(df)
+
+    def close(self) -> tuple:
+        """(chunks.csv path, chunks.cols path) once both are in place."""
+        self._csv_tmp.replace(self.csv_path)
+        return self.csv_path, self._columns.close()
+
+
+class _StringColumn:
+    def __init__(self, store_dir: Path, name: str, has_nulls: bool = None):
+        self.offsets = np.load(store_dir / f"{name}.offsets.npy", mmap_mode="r")
+        blob_path = store_dir / f"{name}.blob"
+        # np.memmap refuses zero-length files
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if blob_path.stat().st_size else np.zeros(0, np.uint8)
+        nulls_path = store_dir / f"{name}.nulls.npy"
+        if has_nulls is None:  # stores written before columns.json recorded it
+            has_nulls = nulls_path.exists()
+        self.nulls = np.load(nulls_path, mmap_mode="r") if has_nulls else None
+
+    def __getitem__(self, i: int):
+        if self.nulls is not None and self.nulls[i]:
+            return np.nan
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def take(self, positions) -> list:
+        return [self[int(i)] for i in positions]
+
+
+class _NumericColumn:
+    def __init__(self, store_dir: Path, name: str):
+        self.values = np.load(store_dir / f"{name}.npy", mmap_mode="r")
+
+    def __getitem__(self, i: int):
+        return self.values[i]
+
+    def take(self, positions) -> np.ndarray:
+        return np.asarray(self.values[np.asarray(positions, dtype=np.int64)])
+
+
+class _ILoc:
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, positions):
+        if isinstance(positions, (int, np.integer)):
+            return self._store.rows([positions]).iloc[0]
+        if isinstance(positions, slice):
+            positions = range(*positions.indices(len(self._store)))
+        return self._store.rows(positions)
+
+
+class ChunkStore:
+    """Read-only, memory-mapped chunk table with a small DataFrame-like surface.
+
+    Supports len(), .columns, store[col] (whole column as a Series) and
+    .iloc[positions] (a DataFrame of just those rows), which is all the
+    retrieval code needs from the chunk table.
+    """
+
+    def __init__(self, store_dir: Path):
+        self.path = Path(store_dir)
+        meta = json.loads((self.path / "columns.json").read_text())
+        self._rows = int(meta["rows"])
+        self.columns = [c["name"] for c in meta["columns"]]
+        self._cols = {}
+        for c in meta["columns"]:
+            if c["kind"] == "numeric":
+                self._cols[c["name"]] = _NumericColumn(self.path, c["file"])
+            else:
+                self._cols[c["name"]] = _StringColumn(self.path, c["file"], c.get("nulls"))
+        self.iloc = _ILoc(self)
+
+    def __len__(self):
+        return self._rows
+
+    def __contains__(self, col):
+        return col in self._cols
+
+    def __getitem__(self, col) -> pd.Series:
+        return pd.Series(self._cols[col].take(range(self._rows)), name=col)
+
+    def column_values(self, col, positions) -> list:
+        """Values of one column at the given row positions (no DataFrame built)."""
+        return self._cols[col].take(positions)
+
+    def rows(self, positions, columns=None) -> pd.DataFrame:
+        positions = [int(i) for i in positions]
+        cols = columns or self.columns
+        return pd.DataFrame(
+            {c: self._cols[c].take(positions) for c in cols},
+            index=pd.Index(positions),
+            columns=cols,
+        )
+
+    @property
+    def empty(self):
+        return self._rows == 0
+
+
+def load_chunk_table(index_dir: Path, fmt: str = "auto"):
+    """Chunk table for an index dir: the mmap'd columnar store if present, else chunks.csv.
+
+    fmt: "auto" (columnar, falling back to CSV), "columnar" or "csv".
+    """
+    index_dir = Path(index_dir)
+    store_dir = index_dir / STORE_DIRNAME
+    if fmt in ("auto", "columnar") and (store_dir / "columns.json").exists():
+        return ChunkStore(store_dir)
+    if fmt == "columnar":
+        raise FileNotFoundError(f"Missing columnar store in {index_dir}")
+    return pd.read_csv(index_dir / CSV_NAME)
+
+
+def has_chunk_table(index_dir: Path) -> bool:
+    index_dir = Path(index_dir)
+    return (index_dir / STORE_DIRNAME / "columns.json").exists() or (index_dir / CSV_NAME).exists()
@@ -0,0 +1,68 @@
+# rag/src/pagination.py
+"""
+Paging through one query's ranked hits, a few distinct courses at a time.
+
+The first search keeps its ranked chunk hits. Each later page takes the next
+courses from that list that haven't been listed yet. When the list runs out,
+`fetch` is called again with k four times larger (the same widening the
+filtered search uses). The callers here re-run FAISS on the stored query
+embedding, so the query is encoded once per pager. Courses already listed keep
+their position. Pages therefore never repeat or reorder a course, even when an
+ANN index returns a slightly different prefix for the larger k.
+"""
+import threading
+
+import numpy as np
+
+GROWTH = 4  # k multiplier each time the hit list runs out
+
+
+class HitPager:
+    """Distinct courses in rank order over a hit list that grows on demand.
+
+    `fetch(k)` returns 1-D (scores, idxs, more) for the top-k chunks; `more` is
+    False when a larger k could not find anything new. `limit` caps k (the
+    number of vectors in the index).
+    """
+
+    def __init__(self, parent_ids: np.ndarray, fetch, k: int, limit: int):
+        self.parent_ids = parent_ids
+        self.fetch = fetch
+        self.k = max(1, min(k, limit))
+        self.limit = limit
+        self.rows = []    # best-scoring chunk row of each course, in listing order
+        self.scores = []
+        self.searches = 0
+        self.more = True
+        self._seen = set()
+        self._lock = threading.Lock()  # pages of one cursor may be requested concurrently
+        self._scan(*fetch(self.k))
+
+    def _scan(self, scores, idxs, more: bool):
+        self.searches += 1
+        idxs = np.asarray(idxs, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float32)
+        keep = idxs >= 0
+        idxs, scores = idxs[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")
+        parents = self.parent_ids[idxs[order]]
+        _, first = np.unique(parents, return_index=True)
+        for j in np.sort(first).tolist():
+            p = int(parents[j])
+            if p not in self._seen:
+                self._seen.add(p)
+                self.rows.append(int(idxs[order[j]]))
+                self.scores.append(float(scores[order[j]]))
+        self.more = bool(more) and self.k < self.limit
+
+    def page(self, offset: int, n: int) -> tuple:
+        """(chunk rows, scores) of courses offset .. offset+n-1, widening the search when needed."""
+        with self._lock:
+            while len(self.rows) < offset + n and self.more:
+                self.k = min(self.k * GROWTH, self.limit)
+                self._scan(*self.fetch(self.k))
+            return self.rows[offset:offset + n], self.scores[offset:offset + n]
+
+    def has_more(self, offset: int) -> bool:
+        """Whether anything may come after the first `offset` courses (True can still end in an empty page)."""
+        return len(self.rows) > offset or self.more
@@ -0,0 +1,390 @@
+# rag/src/plan_optimizer.py
+"""
+Multi-semester plan search over the prerequisite graph (prereq_graph.py).
+
+Input: the courses already taken, the remaining requirements ("this category
+needs N courses from this list") and a per-term credit range. solve() runs a
+depth-first branch and bound over term-by-term schedules:
+  - each term takes a maximal set of courses that are eligible that term and
+    still useful. A course is useful if it would count toward an unmet
+    requirement, or if it is a prerequisite of such a course. Courses outside
+    every list are scheduled only when a requirement course needs them.
+  - a course counts toward one requirement. Counts come from a bipartite
+    matching, so a course listed under several requirements goes where it is
+    needed most.
+  - a lower bound on the terms still needed prunes branches that can't beat
+    the best plan so far. The bound is the longest unmet prerequisite chain
+    per requirement, or the cheapest remaining credits over max_credits.
+  - each state (the set of courses planned so far) is memoized with the
+    fewest terms it took to reach it. The same set reached through another
+    term order is only searched once.
+  - the search stops at the time budget and returns the best plan found.
+    `optimal` is true only when the search finished and never had to cut a
+    term's candidates down to BRANCH_LIMIT.
+Plans are ranked by requirement courses matched, then terms, then total credits.
+Prerequisite lists are all-required, the same as FilterIndex's "completed" filter.
+"""
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from prereq_graph import parse_code
+
+DEFAULT_MAX_TERMS = 8
+DEFAULT_TIME_BUDGET_MS = 500
+DEFAULT_CREDITS = 3.0  # same fallback as the frontend's catalog loader
+BRANCH_LIMIT = 24  # candidate courses considered per term, highest priority first
+
+# courses: raw course codes; credits: optional {normalized code: credits} overrides
+Requirement = namedtuple("Requirement", ["category", "needed", "courses"])
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def _bits(mask: int) -> list:
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+class PlanOptimizer:
+    def __init__(self, graph, row_credits):
+        """`row_credits`: credits per chunk row (FilterIndex.credits_max); NaN where unknown."""
+        self.graph = graph
+        rows = graph.first_row[:graph.catalog_size]
+        credits = np.asarray(row_credits, dtype=np.float64)[np.maximum(rows, 0)]
+        self.credits = np.where(np.isfinite(credits) & (credits > 0), credits, DEFAULT_CREDITS)
+        self.direct = {int(n): graph.members(graph.requires[n]).tolist() for n in graph.gated}
+
+    def solve(self, completed, requirements, in_progress=(), min_credits: float = 0.0, max_credits: float = 15.0,
+              max_terms: int = DEFAULT_MAX_TERMS, time_budget_ms: float = DEFAULT_TIME_BUDGET_MS,
+              credit_overrides: dict = None) -> dict:
+        """Best plan found within the budget (see module docstring); course codes are normalized."""
+        if max_credits <= 0 or min_credits > max_credits:
+            raise ValueError("credit range must satisfy 0 <= min_credits <= max_credits, max_credits > 0")
+        if max_terms < 1:
+            raise ValueError("max_terms must be at least 1")
+        return _Search(self, completed, in_progress, requirements, float(min_credits), float(max_credits),
+                       int(max_terms), time.perf_counter() + time_budget_ms / 1000, credit_overrides or {}).run()
+
+
+class _Search:
+    def __init__(self, planner, completed, in_progress, requirements, min_credits, max_credits, max_terms,
+                 deadline, credit_overrides):
+        g = planner.graph
+        self.t0 = time.perf_counter()
+        self.g, self.deadline = g, deadline
+        self.min_credits, self.max_credits, self.max_terms = min_credits, max_credits, max_terms
+        taken = {c for c in (parse_code(x) for x in (*completed, *in_progress)) if c}
+        taken_ids = {g.ids[c] for c in taken if c in g.ids}
+
+        # Requirement lists -> catalog nodes not taken yet
+        self.unknown, cat_nodes = [], []
+        for req in requirements:
+            nodes = {}
+            for raw in req.courses:
+                code = parse_code(raw)
+                node = g.ids.get(code)
+                if node is None or node >= g.catalog_size:
+                    self.unknown.append(code or str(raw))
+                elif code not in taken:
+                    nodes[node] = None
+            cat_nodes.append(list(nodes))
+        self.categories = [r.category for r in requirements]
+        self.need = [max(0, int(r.needed)) for r in requirements]
+
+        def credits_of(node):
+            code = g.codes[node]
+            return float(credit_overrides.get(code) or planner.credits[node])
+
+        # Universe: requirement courses plus every prerequisite they still need, in topological
+        # order. A node is unusable if any prerequisite chain hits a code outside the catalog,
+        # a cycle, or a course over the per-term credit cap.
+        pre, frontier = {}, [n for nodes in cat_nodes for n in nodes]
+        while frontier:
+            node = frontier.pop()
+            if node in pre:
+                continue
+            pre[node] = [p for p in planner.direct.get(node, ()) if p not in taken_ids]
+            frontier.extend(pre[node])
+        order, bad = self._topo(pre)
+        for node in order:
+            if (node >= g.catalog_size or credits_of(node) > max_credits
+                    or any(p in bad for p in pre[node])):
+                bad.add(node)
+        good = [n for n in order if n not in bad]
+        local = {n: i for i, n in enumerate(good)}
+        self.nodes = good
+        self.pre = [[local[p] for p in pre[n]] for n in good]
+        self.pre_mask = [sum(1 << p for p in ps) for ps in self.pre]
+        self.anc_mask = []
+        for ps in self.pre:
+            m = 0
+            for p in ps:
+                m |= (1 << p) | self.anc_mask[p]
+            self.anc_mask.append(m)
+        self.cred = [credits_of(n) for n in good]
+
+        # Requirement courses that can't be finished within max_terms are dropped up front
+        depth = self._depths(0, (1 << len(good)) - 1)
+        self.cats_of = [[] for _ in good]
+        self.unreachable = []
+        for c, nodes in enumerate(cat_nodes):
+            for n in nodes:
+                i = local.get(n)
+                if i is None or depth.get(i, max_terms + 1) > max_terms:
+                    self.unreachable.append(g.codes[n])
+                else:
+                    self.cats_of[i].append(c)
+        self.targets = [i for i, cs in enumerate(self.cats_of) if cs]
+        self.sig = {i: tuple(self.cats_of[i]) for i in self.targets}
+        self.sig_member = {cats: i for i, cats in self.sig.items()}
+        self.signatures = list(self.sig_member)
+        self.cat_members = [[i for i in self.targets if c in self.cats_of[i]] for c in range(len(self.need))]
+        self.goal = self._match(self.targets)[0]  # most requirement slots any plan can fill
+        self.all_satisfiable = self.goal == sum(self.need)
+
+        # Critical path first: longest chain of universe courses that build on each course
+        height = [0] * len(good)
+        for i in reversed(range(len(good))):
+            for p in self.pre[i]:
+                height[p] = max(height[p], height[i] + 1)
+        self.height = height
+
+        self.best = None  # (key, terms, assignment)
+        self.seen = {}
+        self.visited = 0
+        self.timed_out = self.truncated = False
+        self.leaf_reached = False  # the budget is only enforced after the first (greedy) plan is complete
+
+    @staticmethod
+    def _topo(pre: dict) -> tuple:
+        """Kahn's order over `pre` (node -> prerequisites); nodes on or behind a cycle come back as bad."""
+        waiting = {n: len(ps) for n, ps in pre.items()}
+        dependents = {n: [] for n in pre}
+        for n, ps in pre.items():
+            for p in ps:
+                dependents[p].append(n)
+        ready = sorted(n for n, w in waiting.items() if w == 0)
+        order = []
+        while ready:
+            n = ready.pop()
+            order.append(n)
+            for d in dependents[n]:
+                waiting[d] -= 1
+                if waiting[d] == 0:
+                    ready.append(d)
+        return order, set(pre) - set(order)
+
+    def _depths(self, planned: int, relevant: int) -> dict:
+        """Terms until each relevant unplanned course can be finished (1 = this term)."""
+        depth = {}
+        for i in _bits(relevant & ~planned):  # ascending = topological
+            depth[i] = 1 + max((depth[p] for p in self.pre[i] if not planned >> p & 1), default=0)
+        return depth
+
+    # --- requirement matching (Kuhn's algorithm with per-category capacity) ---
+
+    def _augment(self, x, assign, load, seen) -> bool:
+        for c in self.cats_of[x]:
+            if c in seen:
+                continue
+            seen.add(c)
+            if len(load[c]) < self.need[c]:
+                load[c].append(x)
+                assign[x] = c
+                return True
+            for y in list(load[c]):
+                if self._augment(y, assign, load, seen):
+                    load[c].remove(y)
+                    load[c].append(x)
+                    assign[x] = c
+                    return True
+        return False
+
+    def _match(self, courses) -> tuple:
+        assign, load = {}, [[] for _ in self.need]
+        for x in courses:
+            self._augment(x, assign, load, set())
+        return len(assign), assign, load
+
+    def _useful(self, x, assign, load) -> bool:
+        """Would planning x fill one more requirement slot?"""
+        if any(len(load[c]) < self.need[c] for c in self.cats_of[x]):
+            return True
+        return self._augment(x, dict(assign), [list(l) for l in load], set())
+
+    # --- search ---
+
+    def _lower_bound(self, k: int, matched: int, useful: list, depth: dict, planned_targets: list) -> tuple:
+        """(terms, credits) at least needed to plan k more requirement courses."""
+        if k <= 0:
+            return 0, 0.0
+        depths = sorted(depth[i] for i in useful)
+        creds = sorted(self.cred[i] for i in useful)
+        credits = sum(creds[:k])
+        terms = max(depths[k - 1], math.ceil(credits / self.max_credits - 1e-9))
+        if k == self.goal - matched and self.all_satisfiable:
+            # Every requirement has to be met in full: per category, the r-th shallowest course left
+            for c, members in enumerate(self.cat_members):
+                have = sum(1 for i in planned_targets if c in self.cats_of[i])
+                r = self.need[c] - have
+                if r > 0:
+                    left = sorted(depth[i] for i in members if i in depth)
+                    terms = max(terms, left[r - 1] if len(left) >= r else self.max_terms + 1)
+        return terms, credits
+
+    def _term_options(self, eligible: list, support: int, assign: dict, load: list):
+        """Maximal course sets that fit the credit cap, highest-priority courses first.
+
+        `support` marks courses that some useful course still needs. A requirement
+        course is left out once the courses already in the set fill its slots,
+        unless it is also needed as a prerequisite. Interchangeable courses (same
+        requirements and credits, nothing builds on them) are only taken in a fixed
+        order. That way, picking 2 of 20 equivalent electives is one branch, not 190.
+        """
+        eligible.sort(key=lambda i: (not self.cats_of[i], -self.height[i], self.cred[i], i))
+        group = {i: i if support >> i & 1 else (tuple(self.cats_of[i]), self.cred[i]) for i in eligible}
+        taken, kept = {}, []
+        for i in eligible:
+            n = taken.get(group[i], 0)
+            if (n + 1) * self.cred[i] <= self.max_credits + 1e-9:  # the rest of a group can't fit anyway
+                taken[group[i]] = n + 1
+                kept.append(i)
+        if len(kept) > BRANCH_LIMIT:
+            kept, self.truncated = kept[:BRANCH_LIMIT], True
+        eligible = kept
+        chosen = []
+
+        def rec(pos, left, min_skipped, assign, load, closed):
+            if pos == len(eligible):
+                credits = self.max_credits - left
+                if chosen and left < min_skipped and (credits >= self.min_credits - 1e-9 or min_skipped == math.inf):
+                    yield list(chosen), credits
+                return
+            i = eligible[pos]
+            if group[i] in closed:
+                yield from rec(pos + 1, left, min(min_skipped, self.cred[i]), assign, load, closed)
+                return
+            assign2, load2 = assign, load
+            if self.cats_of[i]:
+                assign2, load2 = dict(assign), [list(l) for l in load]
+                if not self._augment(i, assign2, load2, set()):
+                    assign2, load2 = assign, load
+                    if not support >> i & 1:  # fills nothing now and nothing needs it
+                        yield from rec(pos + 1, left, min_skipped, assign, load, closed)
+                        return
+            if self.cred[i] <= left + 1e-9:
+                chosen.append(i)
+                yield from rec(pos + 1, left - self.cred[i], min_skipped, assign2, load2, closed)
+                chosen.pop()
+            yield from rec(pos + 1, left, min(min_skipped, self.cred[i]), assign, load, closed | {group[i]})
+
+        yield from rec(0, self.max_credits, math.inf, assign, load, frozenset())
+
+    def _record(self, matched: int, terms: list, assign: dict):
+        """Keep this partial plan if it's the best so far, minus courses no matched course needs.
+
+        Dropping courses (and the terms left empty) keeps the order of the rest, so
+        every remaining course still comes after its prerequisites.
+        """
+        keep = 0
+        for i in assign:
+            keep |= (1 << i) | self.anc_mask[i]
+        trimmed = [t for t in ([i for i in term if keep >> i & 1] for term in terms) if t]
+        key = (-matched, len(trimmed), sum(self.cred[i] for t in trimmed for i in t))
+        if self.best is None or key < self.best[0]:
+            self.best = (key, trimmed, dict(assign))
+
+    def _visit(self, planned: int, terms: list, credits: float):
+        self.visited += 1
+        if self.leaf_reached and time.perf_counter() > self.deadline:
+            raise _OutOfTime
+        planned_targets = [i for term in terms for i in term if self.cats_of[i]]
+        matched, assign, load = self._match(planned_targets)
+        self._record(matched, terms, assign)
+        if matched == self.goal or len(terms) == self.max_terms:
+            self.leaf_reached = True
+            return
+        if self.seen.get(planned, self.max_terms + 1) <= len(terms):
+            return
+        self.seen[planned] = len(terms)
+
+        by_cats = {}  # usefulness only depends on which requirements a course counts toward
+        for cats in self.signatures:
+            by_cats[cats] = self._useful(self.sig_member[cats], assign, load)
+        useful = [i for i in self.targets if not planned >> i & 1 and by_cats[self.sig[i]]]
+        support = 0
+        for i in useful:
+            support |= self.anc_mask[i]
+        support &= ~planned
+        relevant = support
+        for i in useful:
+            relevant |= 1 << i
+        depth = self._depths(planned, relevant)
+        terms_left = self.max_terms - len(terms)
+        reachable = sum(1 for i in useful if depth[i] <= terms_left)
+        gain = min(self.goal - matched, reachable)
+        lb_terms, lb_credits = self._lower_bound(gain, matched, useful, depth, planned_targets)
+        if (-(matched + gain), len(terms) + lb_terms, credits + lb_credits) >= self.best[0]:
+            self.leaf_reached = True
+            return
+
+        eligible = [i for i in _bits(relevant) if not self.pre_mask[i] & ~planned]
+        for term, term_credits in self._term_options(eligible, support, assign, load):
+            mask = sum(1 << i for i in term)
+            terms.append(term)
+            self._visit(planned | mask, terms, credits + term_credits)
+            terms.pop()
+        self.leaf_reached = True
+
+    def run(self) -> dict:
+        try:
+            self._visit(0, [], 0.0)
+        except _OutOfTime:
+            self.timed_out = True
+        (neg_matched, _, total), terms, assign = self.best
+        codes = self.g.codes
+        planned = [i for t in terms for i in t]
+        plan = []
+        for term in terms:
+            plan.append([
+                {
+                    "code": codes[self.nodes[i]],
+                    "credits": self.cred[i],
+                    "category": self.categories[assign[i]] if i in assign else None,
+                    # prerequisite-only courses: the planned requirement courses that need them
+                    "required_for": [] if i in assign else [
+                        codes[self.nodes[j]] for j in planned if j in assign and self.anc_mask[j] >> i & 1
+                    ],
+                }
+                for i in sorted(term, key=lambda i: codes[self.nodes[i]])
+            ])
+        filled = [0] * len(self.need)
+        for c in assign.values():
+            filled[c] += 1
+        return {
+            "terms": plan,
+            "total_credits": total,
+            "requirements": [
+                {"category": cat, "needed": need, "planned": n}
+                for cat, need, n in zip(self.categories, self.need, filled)
+            ],
+            "complete": -neg_matched == sum(self.need),
+            "optimal": not (self.timed_out or self.truncated),
+            "unknown_codes": self.unknown,
+            "unreachable": sorted(set(self.unreachable)),
+            "stats": {
+                "states": len(self.seen),
+                "nodes": self.visited,
+                "elapsed_ms": round((time.perf_counter() - self.t0) * 1000, 2),
+                "timed_out": self.timed_out,
+            },
+        }
@@ -0,0 +1,189 @@
+# rag/src/prereq_graph.py
+"""
+Compiled course prerequisite graph.
+
+At load time `metadata.prereq_codes` / `metadata.coreq_codes` are turned into
+an integer-indexed graph over course codes (catalog courses first, then codes
+that are only ever referenced). Every relation is stored as a bitset row of
+uint64 words, one bit per course:
+  requires   every listed prerequisite
+  hard       prerequisites that are not also listed as corequisites, i.e. the
+             ones that can't be satisfied by "concurrent registration"
+  coreqs     corequisites
+  ancestors  transitive closure of requires | coreqs: everything that has to
+             be taken no later than the course
+
+So "which courses can I take now" is one AND-NOT plus one any() over a
+requirement matrix, and "what does X lead to" is one column test on
+`ancestors`. Prerequisite lists are treated as all-required, matching the
+frontend's checkPrerequisites; the catalog text's and/or structure isn't parsed.
+"""
+import ast
+
+import numpy as np
+import pandas as pd
+
+from lexical_index import CODE_RE, normalize_code
+
+
+def parse_code(raw) -> str:
+    """'cs211', 'CS-211', ' cs 211 ' -> 'CS 211'; None when it isn't a course code."""
+    m = CODE_RE.fullmatch(str(raw).strip())
+    return normalize_code(*m.groups()) if m else None
+
+
+def _code_list(val) -> list:
+    if val is None or (isinstance(val, float) and np.isnan(val)):
+        return []
+    text = str(val).strip()
+    if text in ("", "[]"):
+        return []
+    try:
+        items = ast.literal_eval(text) if text.startswith("[") else text.split(",")
+    except (ValueError, SyntaxError):
+        items = CODE_RE.findall(text)
+        items = [f"{s} {n}" for s, n in items]
+    return [c for c in (parse_code(x) for x in items) if c]
+
+
+def _column(chunks, col, n):
+    if col in chunks.columns:
+        return pd.Series(chunks[col]).tolist()
+    return [None] * n
+
+
+class PrereqGraph:
+    def __init__(self, chunks):
+        n_rows = len(chunks)
+        row_codes = [parse_code(c) if isinstance(c, str) else None
+                     for c in _column(chunks, "metadata.course_code", n_rows)]
+        prereqs = _column(chunks, "metadata.prereq_codes", n_rows)
+        coreqs = _column(chunks, "metadata.coreq_codes", n_rows)
+
+        # Course-level metadata repeats on every chunk of a course; take the union per code
+        codes = list(dict.fromkeys(c for c in row_codes if c))
+        self.catalog_size = len(codes)
+        self.ids = {c: i for i, c in enumerate(codes)}
+        req_edges, co_edges = {}, {}
+        for code, pre, co in zip(row_codes, prereqs, coreqs):
+            if not code:
+                continue
+            req_edges.setdefault(code, set()).update(_code_list(pre))
+            co_edges.setdefault(code, set()).update(_code_list(co))
+        for targets in (*req_edges.values(), *co_edges.values()):
+            for c in targets:
+                if c not in self.ids:  # referenced but not in this catalog
+                    self.ids[c] = len(codes)
+                    codes.append(c)
+        self.codes = codes
+        n = len(codes)
+        self.words = max(1, (n + 63) // 64)
+
+        self.row_node = np.array([self.ids[c] if c else -1 for c in row_codes], dtype=np.int32)
+        self.first_row = np.full(n, -1, dtype=np.int64)
+        rows = np.flatnonzero(self.row_node >= 0)
+        nodes, first = np.unique(self.row_node[rows], return_index=True)
+        self.first_row[nodes] = rows[first]
+
+        self.requires = np.zeros((n, self.words), dtype=np.uint64)
+        self.coreqs = np.zeros((n, self.words), dtype=np.uint64)
+        for edges, bits in ((req_edges, self.requires), (co_edges, self.coreqs)):
+            for code, targets in edges.items():
+                bits[self.ids[code]] = self.bitset(targets)
+        self.hard = self.requires & ~self.coreqs
+        # Only courses with requirements can be ineligible; keep just those rows for the hot path
+        self.gated = np.flatnonzero(self.requires.any(axis=1))
+        self._gated_requires, self._gated_hard = self.requires[self.gated], self.hard[self.gated]
+        deps = [[] for _ in range(n)]
+        for edges in (req_edges, co_edges):
+            for code, targets in edges.items():
+                deps[self.ids[code]].extend(self.ids[c] for c in targets)
+        self.edges = sum(len(d) for d in deps)
+        self.ancestors, self.cyclic = self._closure(self.requires | self.coreqs, [np.unique(d) for d in deps])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def bitset(self, codes) -> np.ndarray:
+        """Bitset row with the bit of every known code in `codes` set."""
+        bits = np.zeros(self.words, dtype=np.uint64)
+        for c in codes:
+            i = self.ids.get(c)
+            if i is not None:
+                bits[i >> 6] |= np.uint64(1) << np.uint64(i & 63)
+        return bits
+
+    def members(self, bits: np.ndarray) -> np.ndarray:
+        """Node ids set in a bitset row."""
+        flags = np.unpackbits(bits.view(np.uint8), bitorder="little")[:len(self.codes)]
+        return np.flatnonzero(flags)
+
+    def _closure(self, direct: np.ndarray, deps: list) -> tuple:
+        """Transitive closure in topological order (prerequisites first); cycles are iterated to a fixpoint."""
+        n = len(self.codes)
+        waiting = np.array([len(d) for d in deps])
+        dependents = [[] for _ in range(n)]
+        for i, d in enumerate(deps):
+            for p in d:
+                dependents[p].append(i)
+        closure = direct.copy()
+        ready = [i for i in range(n) if waiting[i] == 0]
+        done = np.zeros(n, dtype=bool)
+        while ready:
+            i = ready.pop()
+            done[i] = True
+            if len(deps[i]):
+                closure[i] |= np.bitwise_or.reduce(closure[deps[i]], axis=0)
+            for j in dependents[i]:
+                waiting[j] -= 1
+                if waiting[j] == 0:
+                    ready.append(j)
+        cyclic = np.flatnonzero(~done)
+        changed = len(cyclic) > 0
+        while changed:
+            changed = False
+            for i in cyclic:
+                new = closure[i] | np.bitwise_or.reduce(closure[deps[i]], axis=0)
+                if not np.array_equal(new, closure[i]):
+                    closure[i], changed = new, True
+        return closure, cyclic
+
+    def resolve(self, raw_codes) -> tuple:
+        """(node-id bitset of the known codes, normalized codes that aren't in the graph)."""
+        known, unknown = [], []
+        for raw in raw_codes or ():
+            code = parse_code(raw)
+            (known if code in self.ids else unknown).append(code or str(raw))
+        return self.bitset(known), unknown
+
+    def eligible(self, completed_bits: np.ndarray, concurrent: bool = False) -> np.ndarray:
+        """Bool per node: catalog course, not completed, every prerequisite completed.
+
+        With `concurrent`, prerequisites that are also corequisites may instead be
+        taken in the same term (see pending_coreqs).
+        """
+        missing = ((self._gated_hard if concurrent else self._gated_requires) & ~completed_bits).any(axis=1)
+        ok = ~np.unpackbits(completed_bits.view(np.uint8), bitorder="little")[:len(self.codes)].astype(bool)
+        ok[self.gated[missing]] = False
+        ok[self.catalog_size:] = False
+        return ok
+
+    def unlocks(self, completed_bits: np.ndarray, course: int, concurrent: bool = False) -> np.ndarray:
+        """Bool per node: eligible once `course` is also completed, but not before."""
+        after = completed_bits | self.bitset([self.codes[course]])
+        return self.eligible(after, concurrent) & ~self.eligible(completed_bits, concurrent)
+
+    def leads_to(self, course: int) -> np.ndarray:
+        """Bool per node: catalog courses that (transitively) require `course`."""
+        hit = (self.ancestors[:, course >> 6] >> np.uint64(course & 63)) & np.uint64(1)
+        out = hit.astype(bool)
+        out[self.catalog_size:] = False
+        return out
+
+    def pending_coreqs(self, node: int, completed_bits: np.ndarray) -> list:
+        """Corequisites of `node` not yet completed (to be taken in the same term)."""
+        return [self.codes[i] for i in self.members(self.coreqs[node] & ~completed_bits)]
+
+    def row_mask(self, node_mask: np.ndarray) -> np.ndarray:
+        """Node-level bool mask -> chunk-row mask (rows without a course code never match)."""
+        return np.where(self.row_node >= 0, node_mask[np.maximum(self.row_node, 0)], False)
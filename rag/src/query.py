@@ -1,89 +1,71 @@
 print("[query] v2 interactive with freeform re-query")
-import argparse, json, textwrap, re
+import argparse, json, textwrap
 from pathlib import Path
 
-import faiss
 import numpy as np
 import pandas as pd
 from sentence_transformers import SentenceTransformer
 
-# ----------------------------
-# Query expansion (lightweight)
-# ----------------------------
-TOPIC_SYNONYMS = {
-    r"\bnlp\b": [
-        "natural language processing", "computational linguistics",
-        "text mining", "language modeling", "transformers", "sequence models"
-    ],
-    r"\bml\b|\bmachine learning\b": [
-        "supervised learning", "unsupervised learning", "classification",
-        "regression", "neural networks", "support vector machines", "clustering"
-    ],
-    r"\bai\b": [
-        "artificial intelligence", "knowledge representation", "search algorithms",
-        "planning", "intelligent agents"
-    ],
-    r"\bdata viz\b|\bvisuali[sz]ation\b|\btableau\b": [
-        "data visualization", "tableau", "plotting", "dashboards", "visual analytics"
-    ],
-    r"\bstats?\b|\bstatistics\b": [
-        "statistical inference", "probability", "hypothesis testing",
-        "regression analysis", "experimental design"
-    ],
-    r"\boptimization\b|\boperations research\b|\bor\b": [
-        "linear programming", "integer programming", "stochastic optimization",
-        "operations research"
-    ],
-    r"\bcomputational biology\b|\bbioinformatics\b": [
-        "genomics", "sequence analysis", "biostatistics", "systems biology"
-    ],
-    r"\bsecurity\b|\bcybersecurity\b": [
-        "cryptography", "network security", "secure systems", "access control"
-    ],
-    r"\bdatabases?\b": [
-        "relational databases", "sql", "transaction processing", "query optimization"
-    ],
-    r"\beconomics?\b|\becon\b": [
-        "microeconomics", "macroeconomics", "econometrics"
-    ],
-    r"\bpsychology\b|\bcognitive\b": [
-        "cognitive science", "perception", "human factors", "behavioral science"
-    ],
-}
-
-def expand_query(q: str) -> str:
-    """Add synonyms/related phrases to the query while keeping the original text."""
-    q_low = q.lower()
-    expansions = []
-    for pattern, syns in TOPIC_SYNONYMS.items():
-        if re.search(pattern, q_low):
-            expansions.extend(syns)
-    if expansions:
-        return q + " | " + " ; ".join(dict.fromkeys(expansions))
-    return q
+from ann_index import apply_search_params, read_index
+from course_table import best_per_parent
+from encoders import encoder_config, load_encoder
+from filters import FilterIndex, parse_filters
+from lexical_index import DEFAULT_LEXICAL_WEIGHT, RETRIEVAL_MODES, HybridRetriever, load_lexical_index
+from metadata_store import has_chunk_table, load_chunk_table
+from pagination import HitPager
+from query_expansion import DEFAULT_QUERY_WEIGHT, EXPANSION_MODES, QueryExpander, TOPIC_SYNONYMS, expand_query  # noqa: F401
+
+DEFAULT_EXPANDER = QueryExpander()  # concat mode, the original behaviour
 
 # ----------------------------
 # Index loading / retrieval
 # ----------------------------
 def load_index(index_dir: Path):
     idx_path = index_dir / "faiss.index"
-    tbl_path = index_dir / "chunks.csv"   # stored by build_index.py
     cfg_path = index_dir / "config.json"
-    if not idx_path.exists() or not tbl_path.exists() or not cfg_path.exists():
+    if not idx_path.exists() or not has_chunk_table(index_dir) or not cfg_path.exists():
         raise FileNotFoundError(f"Missing index files in {index_dir}")
-    index = faiss.read_index(str(idx_path))
-    df = pd.read_csv(tbl_path)
     cfg = json.loads(cfg_path.read_text())
-    model = SentenceTransformer(cfg["model"])
-    print(f"[query] loaded index/table from {index_dir} ({len(df):,} chunks)")
+    index = read_index(idx_path, cfg)     # memory-mapped when supported
+    df = load_chunk_table(index_dir)  # mmap'd chunks.cols if present, else chunks.csv
+    apply_search_params(index, cfg)  # efSearch / nprobe for ANN index types
+    model = load_encoder(cfg, index_dir)  # backend from config.json's "encoder" block
+    print(f"[query] loaded index/table from {index_dir} ({len(df):,} chunks, {encoder_config(cfg)['backend']} encoder)")
     return index, df, model, cfg
 
-def retrieve_chunks(query: str, k: int, index, df: pd.DataFrame, model: SentenceTransformer):
-    # Expand query to be friendlier for broad interests (across all majors)
-    q_expanded = expand_query(query)
-    q_emb = model.encode([q_expanded], normalize_embeddings=True).astype("float32")
-    scores, idxs = index.search(q_emb, k)
-    idxs = idxs[0].tolist(); scores = scores[0].tolist()
+def make_searcher(index, cfg: dict, df, filters=None):
+    """index.search, or an equivalent that applies metadata filters inside FAISS."""
+    if filters is None:
+        return index.search
+    fi = FilterIndex(df)
+    return lambda q_embs, k: fi.search(index, cfg, q_embs, k, filters)
+
+def _hit_rows(queries: list, k: int, search, model, expander: QueryExpander = None, hybrid: HybridRetriever = None):
+    """(scores, idxs) per query: one encode + one search, or hybrid retrieval when given."""
+    def dense(qs, k):
+        # Expand query to be friendlier for broad interests (across all majors)
+        return search((expander or DEFAULT_EXPANDER).encode(model, qs), k)
+    if hybrid is not None:
+        return hybrid.retrieve_batch(queries, k, dense)  # code lookups skip the encoder
+    scores, idxs = dense(queries, k)
+    return list(zip(scores, idxs))
+
+def retrieve_chunks_batch(queries: list, k: int, search, df: pd.DataFrame, model: SentenceTransformer,
+                          expander: QueryExpander = None, hybrid: HybridRetriever = None):
+    """Like retrieve_chunks for many queries: one encode call and one search call."""
+    out = []
+    for row_scores, row_idxs in _hit_rows(queries, k, search, model, expander, hybrid):
+        keep = row_idxs >= 0
+        res = df.iloc[row_idxs[keep]].copy()
+        res.insert(0, "score", row_scores[keep].tolist())
+        out.append(res)
+    return out
+
+def retrieve_chunks(query: str, k: int, search, df: pd.DataFrame, model: SentenceTransformer,
+                    expander: QueryExpander = None, hybrid: HybridRetriever = None):
+    scores, idxs = _hit_rows([query], k, search, model, expander, hybrid)[0]
+    keep = idxs >= 0  # ANN indexes pad with -1 when fewer than k hits are found
+    idxs = idxs[keep].tolist(); scores = scores[keep].tolist()
     res = df.iloc[idxs].copy()
     res.insert(0, "score", scores)  # kept internally; we won't print it
     return res
@@ -98,17 +80,13 @@ def _safe_series(df: pd.DataFrame, col: str, default: str = "") -> pd.Series:
 
 def group_by_course(chunks_df: pd.DataFrame, top_courses: int):
     """Collapse many chunks into distinct courses via parent_id; preview = best chunk."""
-    if "metadata.parent_id" not in chunks_df.columns:
-        chunks_df = chunks_df.copy()
-        chunks_df["metadata.parent_id"] = chunks_df["id"]
-
-    best = (
-        chunks_df
-        .sort_values("score", ascending=False)
-        .drop_duplicates(subset=["metadata.parent_id"], keep="first")
-        .copy()
-    )
-    top = best.head(top_courses).copy()
+    parent_col = "metadata.parent_id" if "metadata.parent_id" in chunks_df.columns else "id"
+    parents = pd.factorize(chunks_df[parent_col].astype(str))[0]
+    # NumPy dedup/top-N over the hit arrays; only the selected rows are copied
+    sel = best_per_parent(parents, chunks_df["score"].to_numpy(), top_courses)
+    top = chunks_df.iloc[sel].copy()
+    if "metadata.parent_id" not in top.columns:
+        top["metadata.parent_id"] = top["id"]
 
     code_s  = _safe_series(top, "metadata.course_code")
     name_s  = _safe_series(top, "metadata.class_name")
@@ -126,125 +104,112 @@ def group_by_course(chunks_df: pd.DataFrame, top_courses: int):
     top["snippet"]     = top["text"].astype(str).apply(lambda x: short_snippet(x, 260))
     return top
 
-def print_menu(query: str, courses_df: pd.DataFrame):
-    print(f"\nYou asked: {query}\n")
-    if courses_df.empty:
-        print("I couldn’t find matches. Try something simpler, like: “electives with no prerequisites” or “natural language processing”.")
-        return
-    print("You can choose from:")
-    for i, (_, r) in enumerate(courses_df.iterrows(), start=1):
-        code  = r.get("course_code", "") or ""
-        name  = r.get("class_name", "") or ""
-        subj  = r.get("subject", "") or ""
-        head  = f"{code} — {name}" if (code or name) else "(Untitled course)"
-        print(f"{i:>2}. {head}  [{subj}]")
-        print("    " + textwrap.fill(r.get("snippet",""), subsequent_indent="    "))
-    print("\nTip: in interactive mode you can type:  more N  |  list  |  help  |  or just ask a new question.\n")
-
-def print_course_details(chunks_df: pd.DataFrame, parent_id: str):
-    rows = chunks_df[chunks_df.get("metadata.parent_id", chunks_df["id"]) == parent_id] \
-                .sort_values("score", ascending=False)
-    if rows.empty:
-        print("No details for that selection.")
-        return
-    top = rows.iloc[0]
-    code  = top.get("metadata.course_code", "")
-    name  = top.get("metadata.class_name", "")
-    subj  = top.get("metadata.subject", "") or top.get("metadata.subject_code","")
-    url   = top.get("metadata.source_url", "")
-    print(f"\n{code} — {name} [{subj}]")
-    if url: print(f"Source: {url}")
-    text = str(top.get("text","")).strip()
-    print("\n" + textwrap.fill(text, width=100))
-
-def interactive_loop(query: str, chunks_df: pd.DataFrame, menu_df: pd.DataFrame, index, df, model, k, top_courses):
-    # mapping for the initial menu
-    idx_to_parent = {i: r["metadata.parent_id"] for i, (_, r) in enumerate(menu_df.iterrows(), start=1)}
-    print_menu(query, menu_df)
-    print("Interactive mode. Commands:\n"
-          "  more N  → show full details for option N\n"
-          "  list    → reprint the current menu\n"
-          "  help    → show this help\n"
-          "  quit    → exit\n"
-          "Or type any new question to search again.\n")
-
-    # Keep current state so `list` works after a requery
-    current_query = query
-    current_chunks = chunks_df
-    current_menu = menu_df
-    current_map = idx_to_parent
-
-    while True:
-        try:
-            raw = input("> ").strip()
-        except (EOFError, KeyboardInterrupt):
-            print("\nBye.")
-            return
-
-        if not raw:
-            continue
-
-        cmd_lower = raw.lower().strip()
-        if cmd_lower in ("q", "quit", "exit"):
-            print("Bye.")
-            return
-        if cmd_lower in ("h", "help"):
-            print("Commands:\n"
-                  "  more N  → show full details for option N\n"
-                  "  list    → reprint the current menu\n"
-                  "  help    → show this help\n"
-                  "  quit    → exit\n"
-                  "Or type any new question to search again.")
-            continue
-        if cmd_lower in ("l", "list"):
-            print_menu(current_query, current_menu)
-            continue
-
-        parts = raw.split()
-        if len(parts) == 2 and parts[0].lower() == "more" and parts[1].isdigit():
-            num = int(parts[1])
-            if num not in current_map:
-                print("Pick a valid number from the menu.")
-                continue
-            parent_id = current_map[num]
-            print_course_details(current_chunks, parent_id)
-            continue
-
-        # ---------------
-        # New free-form query
-        # ---------------
-        new_query = raw
-        print("Got it — you’re asking something new. Let’s look that up…")
-        chunk_k = max(k, top_courses * 5)
-        new_chunks = retrieve_chunks(new_query, chunk_k, index, df, model)
-        new_menu = group_by_course(new_chunks, top_courses=top_courses)
-        current_query = new_query
-        current_chunks = new_chunks
-        current_menu = new_menu
-        current_map = {i: r["metadata.parent_id"] for i, (_, r) in enumerate(new_menu.iterrows(), start=1)}
-        print_menu(new_query, new_menu)
+def courses_to_records(courses_df: pd.DataFrame) -> list:
+    """Grouped courses -> JSON-friendly dicts (same shape as the web API results)."""
+    return [
+        {
+            "course_code": r.get("course_code", "") or "",
+            "class_name": r.get("class_name", "") or "",
+            "subject": r.get("subject", "") or "",
+            "description": r.get("snippet", "") or "",
+            "score": float(r["score"]),
+        }
+        for _, r in courses_df.iterrows()
+    ]
+
+def retrieve_courses_batch(queries: list, k: int, top_courses: int, search, df: pd.DataFrame, model: SentenceTransformer,
+                           expander: QueryExpander = None, hybrid: HybridRetriever = None) -> list:
+    """(chunks, courses) per query; k widens (x4) for the queries whose slots all fill but too few courses surface."""
+    out = [None] * len(queries)
+    pending = list(range(len(queries)))
+    while pending:
+        batch = retrieve_chunks_batch([queries[i] for i in pending], k, search, df, model, expander, hybrid)
+        short = []
+        for i, chunks in zip(pending, batch):
+            out[i] = (chunks, group_by_course(chunks, top_courses=top_courses))
+            if len(out[i][1]) < top_courses and len(chunks) == k:  # filters hid most hits: search deeper
+                short.append(i)
+        pending, k = short, k * 4
+    return out
+
+def retrieve_courses(query: str, k: int, top_courses: int, search, df: pd.DataFrame, model: SentenceTransformer,
+                     expander: QueryExpander = None, hybrid: HybridRetriever = None):
+    """Retrieve chunks and group them, widening k while every slot fills but too few courses surface."""
+    return retrieve_courses_batch([query], k, top_courses, search, df, model, expander, hybrid)[0]
+
+# ----------------------------
+# Batch mode
+# ----------------------------
+def run_queries_file(queries_file: str, output: str, search, df, model, k: int, top_courses: int,
+                     expander: QueryExpander = None, hybrid: HybridRetriever = None):
+    """Answer one query per line of `queries_file`, writing one JSON object per line."""
+    in_path = Path(queries_file)
+    queries = [ln.strip() for ln in in_path.read_text().splitlines() if ln.strip()]
+    out_path = Path(output) if output else in_path.with_suffix(".results.jsonl")
+    chunk_k = max(k, top_courses * 5)
+    batches = retrieve_courses_batch(queries, chunk_k, top_courses, search, df, model, expander, hybrid)
+    with out_path.open("w") as f:
+        for q, (_, courses) in zip(queries, batches):
+            results = courses_to_records(courses)
+            f.write(json.dumps({"query": q, "results": results, "count": len(results)}) + "\n")
+    print(f"[query] wrote {len(queries):,} results to {out_path}")
 
 # ----------------------------
 # Main
 # ----------------------------
-def main(index_dir: str, k: int, query: str, top_courses: int, interactive: bool):
-    index, df, model, cfg = load_index(Path(index_dir).resolve())
+def main(index_dir: str, k: int, query: str, top_courses: int, interactive: bool,
+         queries_file: str = None, output: str = None, filters: dict = None,
+         expansion: str = "concat", expansion_weight: float = DEFAULT_QUERY_WEIGHT,
+         retrieval: str = "hybrid", lexical_weight: float = DEFAULT_LEXICAL_WEIGHT):
+    index_dir = Path(index_dir).resolve()
+    index, df, model, cfg = load_index(index_dir)
+    filters = parse_filters(filters)
+    search = make_searcher(index, cfg, df, filters)
+    expander = QueryExpander(mode=expansion, query_weight=expansion_weight)
+    hybrid = None
+    if retrieval == "hybrid":
+        mask = FilterIndex(df).mask(filters) if filters is not None else None
+        hybrid = HybridRetriever(load_lexical_index(index_dir, df), lexical_weight, mask)
+    if queries_file:
+        run_queries_file(queries_file, output, search, df, model, k, top_courses, expander, hybrid)
+        return
     # Pull more chunks than courses so multiple classes can surface
     chunk_k = max(k, top_courses * 5)
-    chunks = retrieve_chunks(query, chunk_k, index, df, model)
-    courses = group_by_course(chunks, top_courses=top_courses)
     if interactive:
         print("[query] interactive: freeform follow-ups enabled")
-        interactive_loop(query, chunks, courses, index, df, model, k, top_courses)
+        pager = make_pager(query, chunk_k, search, df, model, expander, hybrid)
+        interactive_loop(query, pager, search, df, model, k, top_courses, expander, hybrid)
     else:
+        chunks, courses = retrieve_courses(query, chunk_k, top_courses, search, df, model, expander, hybrid)
         print_menu(query, courses)
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--index-dir", default=str(Path(__file__).resolve().parents[1] / "data" / "processed" / "index"))
-    ap.add_argument("--query", required=True)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--query")
+    src.add_argument("--queries-file", help="batch mode: one query per line, results written as JSONL")
+    ap.add_argument("--output", help="JSONL output path for --queries-file (default: <queries-file>.results.jsonl)")
     ap.add_argument("-k", type=int, default=50, help="top chunks to retrieve (used internally)")
     ap.add_argument("--top-courses", type=int, default=8, help="show this many distinct courses")
     ap.add_argument("--interactive", action="store_true", help="enable simple REPL to drill into options")
+    ap.add_argument("--subject", action="append", help="only this subject code (repeatable), e.g. --subject CS")
+    ap.add_argument("--credits-min", type=float, help="only courses offering at least this many credits")
+    ap.add_argument("--credits-max", type=float, help="only courses offering at most this many credits")
+    ap.add_argument("--no-prereqs", action="store_true", help="only courses without listed prerequisites")
+    ap.add_argument("--completed", action="append",
+                    help="a completed course (repeatable): only show courses whose prerequisites are met")
+    ap.add_argument("--expansion", choices=EXPANSION_MODES, default="concat",
+                    help="concat: append synonyms to the query text; vector: blend precomputed topic vectors; none")
+    ap.add_argument("--expansion-weight", type=float, default=DEFAULT_QUERY_WEIGHT,
+                    help="weight of the raw query embedding in --expansion vector mode")
+    ap.add_argument("--retrieval", choices=RETRIEVAL_MODES, default="hybrid",
+                    help="hybrid: exact course-code lookups + BM25 fused with dense search; dense: embeddings only")
+    ap.add_argument("--lexical-weight", type=float, default=DEFAULT_LEXICAL_WEIGHT,
+                    help="BM25 share of the fused score in --retrieval hybrid")
     args = ap.parse_args()
-    main(args.index_dir, args.k, args.query, args.top_courses, args.interactive)
\ No newline at end of file
+    filters = {"subject": args.subject, "credits_min": args.credits_min,
+               "credits_max": args.credits_max, "no_prereqs": args.no_prereqs, "completed": args.completed}
+    main(args.index_dir, args.k, args.query, args.top_courses, args.interactive,
+         args.queries_file, args.output, {k: v for k, v in filters.items() if v is not None},
+         args.expansion, args.expansion_weight, args.retrieval, args.lexical_weight)
\ No newline at end of file
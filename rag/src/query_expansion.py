@@ -0,0 +1,142 @@
+# rag/src/query_expansion.py
+"""
+Topic-synonym query expansion (shared by query.py, app.py and the benchmarks).
+
+Modes:
+  concat  append the matched synonym phrases to the query text and encode the
+          long string (the original behaviour)
+  vector  encode only what the user typed and mix in a precomputed vector per
+          matched synonym group:  normalize(w * e(query) + (1 - w) * topic)
+          where topic is the normalized sum of the matched groups' vectors and
+          each group vector is the mean embedding of its phrases, computed once
+          per loaded model
+  none    no expansion
+
+Each pattern is compiled once and searched on its own, so every topic whose
+pattern occurs is found, even where matches overlap or start at the same offset.
+"""
+import re
+
+import numpy as np
+
+# ----------------------------
+# Query expansion (lightweight)
+# ----------------------------
+TOPIC_SYNONYMS = {
+    r"\bnlp\b": [
+        "natural language processing", "computational linguistics",
+        "text mining", "language modeling", "transformers", "sequence models"
+    ],
+    r"\bml\b|\bmachine learning\b": [
+        "supervised learning", "unsupervised learning", "classification",
+        "regression", "neural networks", "support vector machines", "clustering"
+    ],
+    r"\bai\b": [
+        "artificial intelligence", "knowledge representation", "search algorithms",
+        "planning", "intelligent agents"
+    ],
+    r"\bdata viz\b|\bvisuali[sz]ation\b|\btableau\b": [
+        "data visualization", "tableau", "plotting", "dashboards", "visual analytics"
+    ],
+    r"\bstats?\b|\bstatistics\b": [
+        "statistical inference", "probability", "hypothesis testing",
+        "regression analysis", "experimental design"
+    ],
+    r"\boptimization\b|\boperations research\b|\bor\b": [
+        "linear programming", "integer programming", "stochastic optimization",
+        "operations research"
+    ],
+    r"\bcomputational biology\b|\bbioinformatics\b": [
+        "genomics", "sequence analysis", "biostatistics", "systems biology"
+    ],
+    r"\bsecurity\b|\bcybersecurity\b": [
+        "cryptography", "network security", "secure systems", "access control"
+    ],
+    r"\bdatabases?\b": [
+        "relational databases", "sql", "transaction processing", "query optimization"
+    ],
+    r"\beconomics?\b|\becon\b": [
+        "microeconomics", "macroeconomics", "econometrics"
+    ],
+    r"\bpsychology\b|\bcognitive\b": [
+        "cognitive science", "perception", "human factors", "behavioral science"
+    ],
+}
+
+EXPANSION_MODES = ("concat", "vector", "none")
+DEFAULT_QUERY_WEIGHT = 0.7
+
+
+class QueryExpander:
+    def __init__(self, synonyms: dict = None, mode: str = "concat", query_weight: float = DEFAULT_QUERY_WEIGHT):
+        if mode not in EXPANSION_MODES:
+            raise ValueError(f"Unknown expansion mode '{mode}' (expected one of {', '.join(EXPANSION_MODES)})")
+        if not 0.0 <= query_weight <= 1.0:
+            raise ValueError("query_weight must be between 0 and 1")
+        self.mode = mode
+        self.query_weight = float(query_weight)
+        self.groups = list((synonyms or TOPIC_SYNONYMS).values())
+        self._patterns = [re.compile(p) for p in (synonyms or TOPIC_SYNONYMS)]
+        self._vecs = (None, None)  # (model, group vectors) for the last model seen
+
+    def matched_groups(self, q: str) -> list:
+        """Indices of the synonym groups whose pattern occurs in q, in dictionary order."""
+        q = q.lower()
+        return [i for i, p in enumerate(self._patterns) if p.search(q)]
+
+    def expand(self, q: str) -> str:
+        """Add synonyms/related phrases to the query while keeping the original text."""
+        groups = self.matched_groups(q)
+        if groups:
+            return q + " | " + " ; ".join(dict.fromkeys(s for g in groups for s in self.groups[g]))
+        return q
+
+    def group_vectors(self, model) -> np.ndarray:
+        """(n_groups, dim) normalized mean phrase embedding per group; encoded once per model."""
+        cached_model, vecs = self._vecs
+        if cached_model is model:
+            return vecs
+        phrases = [s for syns in self.groups for s in syns]
+        embs = np.asarray(model.encode(phrases, batch_size=64, normalize_embeddings=True), dtype="float32")
+        owner = np.repeat(np.arange(len(self.groups)), [len(syns) for syns in self.groups])
+        vecs = np.zeros((len(self.groups), embs.shape[1]), dtype="float32")
+        np.add.at(vecs, owner, embs)
+        vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        self._vecs = (model, vecs)
+        return vecs
+
+    def combine(self, q_embs: np.ndarray, groups: list, group_vecs: np.ndarray) -> np.ndarray:
+        """Blend each raw-query embedding with the topic vector of its matched groups."""
+        out = np.array(q_embs, dtype="float32", copy=True)
+        w = self.query_weight
+        for i, g in enumerate(groups):
+            if g:
+                topic = group_vecs[g].sum(axis=0)
+                topic /= max(float(np.linalg.norm(topic)), 1e-12)
+                out[i] = w * out[i] + (1.0 - w) * topic
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+    def prepare(self, queries: list) -> tuple:
+        """(texts to encode, matched groups per query or None) for this expander's mode."""
+        if self.mode == "concat":
+            return [self.expand(q) for q in queries], None
+        if self.mode == "none":
+            return list(queries), None
+        return list(queries), [self.matched_groups(q) for q in queries]
+
+    def encode(self, model, queries: list, batch_size: int = 64) -> np.ndarray:
+        """Normalized float32 query embeddings under this expander's mode."""
+        texts, matched = self.prepare(queries)
+        embs = np.asarray(model.encode(texts, batch_size=batch_size, normalize_embeddings=True), dtype="float32")
+        if matched is None:
+            return embs
+        return self.combine(embs, matched, self.group_vectors(model))
+
+
+_default = QueryExpander()
+
+
+def expand_query(q: str) -> str:
+    """Add synonyms/related phrases to the query while keeping the original text."""
+    return _default.expand(q)
@@ -0,0 +1,189 @@
+# rag/src/shards.py
+"""
+Several course catalogs (institutions, terms) served by one API as named index shards.
+
+Each shard is an ordinary index directory written by build_index.py. A manifest
+names them:
+
+  {
+    "default": "umd-fall-2025",
+    "shards": {
+      "umd-fall-2025":    {"path": "shards/umd-fall-2025", "institution": "UMD", "term": "Fall 2025"},
+      "umd-spring-2026":  {"path": "shards/umd-spring-2026", "institution": "UMD", "term": "Spring 2026"}
+    }
+  }
+
+Relative paths are resolved against the manifest's directory. Keys other than
+"path" are descriptive and passed through to /shards as-is.
+
+  ShardSet      loaded shards, at most `max_resident` of them: a shard is loaded
+                the first time a request names it and the least recently used
+                one is dropped when the limit is reached
+  merge_hits    per-shard top-k hit lists -> one top-k list by score, so a query
+                over several shards ranks chunks exactly as one index holding
+                all of them would (each shard's top-k contains its share of the
+                global top-k)
+  group_hits    merged hits -> best chunk per course, a course being identified
+                by (shard, parent id)
+"""
+import json
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from course_table import best_per_parent
+
+MANIFEST_NAME = "shards.json"
+ALL_SHARDS = "*"
+
+Shard = namedtuple("Shard", ["name", "path", "info"])
+
+
+class ShardUnavailable(RuntimeError):
+    """A shard named by a request could not be loaded."""
+
+
+class ShardManifest:
+    def __init__(self, shards: dict, default: str):
+        self.shards = shards
+        self.default = default
+
+    def __len__(self):
+        return len(self.shards)
+
+    def path(self, name: str) -> Path:
+        return self.shards[name].path
+
+    def select(self, raw, single: bool = False) -> tuple:
+        """Validate a request's "shards" (a name, a list of names or "*") -> names; None means the default shard."""
+        if raw is None:
+            return None
+        names = list(self.shards) if raw == ALL_SHARDS else [raw] if isinstance(raw, str) else raw
+        if not isinstance(names, list) or not names or not all(isinstance(x, str) for x in names):
+            raise ValueError("'shards' must be a shard name, a list of names or \"*\"")
+        unknown = [x for x in names if x not in self.shards]
+        if unknown:
+            raise ValueError(f"Unknown shard(s): {', '.join(unknown)}")
+        names = tuple(dict.fromkeys(names))
+        if single and len(names) > 1:
+            raise ValueError("This endpoint reads one catalog; name a single shard")
+        return names
+
+
+def load_manifest(path: Path) -> ShardManifest:
+    """Parse a shard manifest. Raises ValueError when it is malformed."""
+    path = Path(path)
+    raw = json.loads(path.read_text())
+    entries = raw.get("shards") if isinstance(raw, dict) else None
+    if not isinstance(entries, dict) or not entries:
+        raise ValueError(f"{path}: 'shards' must map shard names to {{\"path\": ...}} objects")
+    shards = {}
+    for name, entry in entries.items():
+        if not isinstance(entry, dict) or not isinstance(entry.get("path"), str):
+            raise ValueError(f"{path}: shard '{name}' needs a 'path'")
+        info = {k: v for k, v in entry.items() if k != "path"}
+        shards[name] = Shard(name, (path.parent / entry["path"]).resolve(), info)
+    default = raw.get("default", next(iter(shards)))
+    if default not in shards:
+        raise ValueError(f"{path}: default shard '{default}' is not listed in 'shards'")
+    return ShardManifest(shards, default)
+
+
+def register_shard(manifest_path: Path, name: str, index_dir: Path) -> Path:
+    """Add or update a shard entry (build_index.py --shard); the first shard registered becomes the default."""
+    manifest_path = Path(manifest_path)
+    raw = json.loads(manifest_path.read_text()) if manifest_path.exists() else {"default": name, "shards": {}}
+    raw.setdefault("default", name)
+    try:
+        rel = Path(index_dir).resolve().relative_to(manifest_path.parent.resolve())
+    except ValueError:
+        rel = Path(index_dir).resolve()
+    raw["shards"][name] = {**raw["shards"].get(name, {}), "path": rel.as_posix()}
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(raw, indent=2))
+    tmp.replace(manifest_path)
+    return manifest_path
+
+
+class ShardSet:
+    """Lazily loaded shards, least recently used dropped beyond `max_resident`.
+
+    `load(name)` builds a shard's in-memory state. Requests already holding a
+    dropped shard finish on it; its memory is freed when they let go.
+    """
+
+    def __init__(self, load, max_resident: int):
+        self.load = load
+        self.max_resident = max(1, int(max_resident))
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}  # name -> lock, so concurrent requests load a shard once
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, name: str):
+        with self._lock:
+            if name in self._resident:
+                self._resident.move_to_end(name)
+                return self._resident[name]
+            loading = self._loading.setdefault(name, threading.Lock())
+        with loading:
+            with self._lock:
+                if name in self._resident:
+                    self._resident.move_to_end(name)
+                    return self._resident[name]
+            try:
+                value = self.load(name)  # outside the set lock: other shards stay readable
+            except Exception as e:
+                raise ShardUnavailable(f"Shard '{name}' could not be loaded: {e}") from e
+            with self._lock:
+                self._resident[name] = value
+                self.loads += 1
+                while len(self._resident) > self.max_resident:
+                    self._resident.popitem(last=False)
+                    self.evictions += 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._resident.clear()
+
+    def resident(self) -> list:
+        with self._lock:
+            return list(self._resident)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"resident": list(self._resident), "max_resident": self.max_resident,
+                    "loads": self.loads, "evictions": self.evictions}
+
+
+def merge_hits(hits: list, k: int) -> tuple:
+    """[(scores, idxs) per shard] -> top-k (scores, shard numbers, rows) across all of them, best first."""
+    scores, shard_nos, rows = [], [], []
+    for i, (s, idx) in enumerate(hits):
+        idx = np.asarray(idx, dtype=np.int64)
+        keep = idx >= 0
+        scores.append(np.asarray(s, dtype=np.float32)[keep])
+        rows.append(idx[keep])
+        shard_nos.append(np.full(keep.sum(), i, dtype=np.int64))
+    scores, shard_nos, rows = np.concatenate(scores), np.concatenate(shard_nos), np.concatenate(rows)
+    order = np.argsort(-scores, kind="stable")[:k]
+    return scores[order], shard_nos[order], rows[order]
+
+
+def group_hits(course_tables: list, scores, shard_nos, rows, top_courses: int) -> list:
+    """Merged hits -> [(shard number, course dict)] for at most `top_courses` distinct courses, best first."""
+    if not len(rows):
+        return []
+    offsets = np.cumsum([0] + [len(t) for t in course_tables])
+    parents = np.empty(len(rows), dtype=np.int64)
+    for i, t in enumerate(course_tables):
+        mine = shard_nos == i
+        parents[mine] = offsets[i] + t.parent_ids[rows[mine]]
+    sel = best_per_parent(parents, scores, top_courses)
+    return [(int(s), course_tables[s].records([r], [score])[0])
+            for s, r, score in zip(shard_nos[sel].tolist(), rows[sel].tolist(), scores[sel].tolist())]
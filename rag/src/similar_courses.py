@@ -0,0 +1,134 @@
+# rag/src/similar_courses.py
+"""
+Precomputed "similar courses" graph, built by build_index.py into <index>/similar.npz.
+
+  course vector  mean of a course's chunk embeddings (grouped by
+                 metadata.parent_id, like CourseTable), re-normalized
+  neighbours     top-N other courses by cosine, from an exact all-pairs search
+                 run as one matrix product per block of courses
+
+The artifact holds neighbour course rows (int32, n_courses x N), their scores
+(float16) and a digest of the parent keys, so rows are only used against the
+CourseTable they were built for. Answering "courses like X" is a dict lookup plus one row slice;
+neither the model nor FAISS is touched at request time.
+"""
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from course_table import PARENT_COL
+from prereq_graph import parse_code
+
+SIMILAR_NAME = "similar.npz"
+FORMAT_VERSION = 1
+DEFAULT_NEIGHBORS = 20
+BLOCK_SIZE = 1024  # courses per block of the all-pairs search
+BLOCK_ELEMENTS = 1 << 23  # ...fewer on big catalogs, so a block's scores stay ~32 MB
+
+
+def parents_digest(keys) -> str:
+    return hashlib.sha1("\n".join(map(str, keys)).encode("utf-8")).hexdigest()
+
+
+def _mean_vectors(course_ids: np.ndarray, n_courses: int, embs: np.ndarray) -> np.ndarray:
+    vecs = np.zeros((n_courses, embs.shape[1]), dtype=np.float32)
+    for start in range(0, len(embs), BLOCK_ELEMENTS // embs.shape[1]):  # embs may be a memmap
+        stop = start + BLOCK_ELEMENTS // embs.shape[1]
+        np.add.at(vecs, course_ids[start:stop], np.asarray(embs[start:stop], dtype=np.float32))
+    vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+    return vecs
+
+
+def course_vectors(chunks, embs: np.ndarray) -> tuple:
+    """(parent keys in CourseTable order, (n_courses, dim) normalized mean chunk vector per course)."""
+    parent_col = PARENT_COL if PARENT_COL in chunks.columns else "id"
+    ids, keys = pd.factorize(pd.Series(chunks[parent_col]).astype(str))
+    return np.asarray(keys, dtype=str), _mean_vectors(ids, len(keys), embs)
+
+
+def nearest_courses(vecs: np.ndarray, k: int, block_size: int = BLOCK_SIZE) -> tuple:
+    """Exact top-k neighbours (excluding itself) of every row -> (rows int32, scores float32), best first."""
+    n = len(vecs)
+    k = max(0, min(k, n - 1))
+    rows = np.zeros((n, k), dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if not k:
+        return rows, scores
+    block_size = max(1, min(block_size, BLOCK_ELEMENTS // n))
+    for start in range(0, n, block_size):
+        neg = vecs[start:start + block_size] @ vecs.T
+        np.negative(neg, out=neg)  # ascending order = most similar first
+        block = np.arange(len(neg))
+        neg[block, start + block] = np.inf  # never your own neighbour
+        top = np.argpartition(neg, k - 1, axis=1)[:, :k]
+        top_s = -np.take_along_axis(neg, top, axis=1)
+        order = np.argsort(-top_s, axis=1, kind="stable")
+        rows[start:start + len(neg)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(neg)] = np.take_along_axis(top_s, order, axis=1)
+    return rows, scores
+
+
+def build_similarity_arrays(chunks, embs: np.ndarray, n_neighbors: int = DEFAULT_NEIGHBORS) -> dict:
+    keys, vecs = course_vectors(chunks, embs)
+    rows, scores = nearest_courses(vecs, n_neighbors)
+    return {
+        "version": np.int64(FORMAT_VERSION),
+        "parents": np.array(parents_digest(keys)),
+        "neighbors": rows,
+        "scores": scores.astype(np.float16),
+    }
+
+
+def write_similarity_index(chunks, embs: np.ndarray, out_dir: Path, n_neighbors: int = DEFAULT_NEIGHBORS) -> Path:
+    path = Path(out_dir) / SIMILAR_NAME
+    np.savez(path, **build_similarity_arrays(chunks, embs, n_neighbors))
+    return path
+
+
+def load_similar_courses(index_dir: Path, course_table, index=None):
+    """SimilarCourses from <index_dir>/similar.npz, or None when it's missing or from another build.
+
+    Without the file, the graph is built in memory from the vectors stored in
+    `index` when the index type can hand them back (flat, HNSW).
+    """
+    path = Path(index_dir) / SIMILAR_NAME
+    if path.exists():
+        with np.load(path) as z:
+            arrays = {k: z[k] for k in z.files}
+        if str(arrays["parents"]) == parents_digest(course_table.parent_keys):
+            return SimilarCourses(arrays, course_table)
+        return None
+    if index is None:
+        return None
+    try:
+        embs = index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:  # IVF / PQ indexes don't keep the raw vectors
+        return None
+    vecs = _mean_vectors(course_table.parent_ids, len(course_table), embs)
+    rows, scores = nearest_courses(vecs, DEFAULT_NEIGHBORS)
+    return SimilarCourses({"neighbors": rows, "scores": scores.astype(np.float16)}, course_table)
+
+
+class SimilarCourses:
+    def __init__(self, arrays: dict, course_table):
+        self.neighbors = arrays["neighbors"]
+        self.scores = arrays["scores"].astype(np.float32)
+        self.k = self.neighbors.shape[1]
+        self.course_ids = {}
+        for i, s in enumerate(course_table.summaries):
+            code = parse_code(s["course_code"]) if s["course_code"] else None
+            if code:
+                self.course_ids.setdefault(code, i)
+
+    def __len__(self):
+        return len(self.neighbors)
+
+    def lookup(self, code: str, k: int = None) -> tuple:
+        """(course row, neighbour rows, scores) for a normalized course code; None if unknown."""
+        i = self.course_ids.get(code)
+        if i is None:
+            return None
+        k = self.k if k is None else k
+        return i, self.neighbors[i, :k], self.scores[i, :k]
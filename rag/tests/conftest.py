@@ -0,0 +1,129 @@
+# rag/tests/conftest.py
+"""
+Shared fixtures for the rag/src and rag/web unit tests.
+
+The modules under test import each other by bare name (that is how the API,
+build_index.py and the bench scripts load them), so src/, web/ and bench/ go
+on sys.path here. `chunks` is a tiny chunk table in the build_index.py layout and
+`encoder` a deterministic, model-free stand-in for the query encoder.
+"""
+import json
+import sys
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+RAG_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAG_DIR / "bench"))
+sys.path.insert(0, str(RAG_DIR / "web"))
+sys.path.insert(0, str(RAG_DIR / "src"))
+
+DIM = 64
+
+# code, name, subject, credits (min, max), prerequisites, corequisites, chunks
+CATALOG = [
+    ("CS 101", "Introduction to Programming", "Computer Science", (3, 3), [], [], 2),
+    ("CS 201", "Data Structures", "Computer Science", (3, 3), ["CS 101"], [], 1),
+    ("CS 301", "Algorithms", "Computer Science", (4, 4), ["CS 201", "MATH 180"], [], 2),
+    ("MATH 180", "Calculus I", "Mathematics", (4, 5), [], [], 1),
+    ("MATH 181", "Calculus II", "Mathematics", (4, 4), ["MATH 180", "PHYS 141"], ["PHYS 141"], 1),
+    ("PHYS 141", "General Physics I", "Physics", (1, 4), [], [], 1),
+]
+
+
+def make_chunks(catalog=CATALOG) -> pd.DataFrame:
+    rows = []
+    for code, name, subject, (cmin, cmax), prereqs, coreqs, n in catalog:
+        parent = code.lower().replace(" ", "-")
+        for i in range(n):
+            rows.append({
+                "id": f"{parent}::chunk-{i + 1}",
+                "text": f"Course: {code} — {name} Subject: {subject} part {i + 1}",
+                "metadata.course_code": code,
+                "metadata.class_name": name,
+                "metadata.subject": subject,
+                "metadata.subject_code": code.split()[0],
+                "metadata.credits_raw": str(cmin) if cmin == cmax else f"{cmin}-{cmax}",
+                "metadata.credits_min": float(cmin),
+                "metadata.credits_max": float(cmax),
+                "metadata.prereq_codes": str(prereqs),
+                "metadata.coreq_codes": str(coreqs),
+                "metadata.parent_id": parent,
+                "metadata.chunk_index": i,
+                "metadata.chunk_count": n,
+            })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def chunks() -> pd.DataFrame:
+    return make_chunks()
+
+
+class HashEncoder:
+    """Stand-in for a SentenceTransformer: a normalized bag of hashed words.
+
+    Texts that share words get similar vectors, which is all retrieval tests need.
+    """
+
+    def __init__(self, dim: int = DIM):
+        self.dim = dim
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, batch_size=64, normalize_embeddings=True, **_):
+        self.calls += 1
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for i, t in enumerate(texts):
+            for w in str(t).lower().split():
+                out[i, zlib.crc32(w.encode()) % self.dim] += 1.0
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+
+@pytest.fixture
+def encoder() -> HashEncoder:
+    return HashEncoder()
+
+
+@pytest.fixture
+def vectors() -> np.ndarray:
+    """Unit-norm float32 vectors, one per chunk of `chunks`."""
+    rng = np.random.default_rng(0)
+    v = rng.standard_normal((len(make_chunks()), DIM)).astype("float32")
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def write_index_dir(path: Path, chunks: pd.DataFrame, encoder: HashEncoder, version: str = "v1", **index_params) -> Path:
+    """A small index directory as build_index.py lays it out (flat index, columnar store, config)."""
+    from ann_index import build_index, write_index
+    from metadata_store import write_columnar
+    path.mkdir(parents=True, exist_ok=True)
+    index, index_cfg = build_index(encoder.encode(chunks["text"].tolist()), "flat", **index_params)
+    write_index(index, path / "faiss.index")
+    chunks.to_csv(path / "chunks.csv", index=False)
+    write_columnar(chunks, path)
+    (path / "config.json").write_text(json.dumps(
+        {"model": "test/hash-encoder", "dim": encoder.dim, "normalize": True, "index": index_cfg, "version": version}))
+    return path
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path, encoder):
+    """app.py with `chunks` loaded from tmp_path/index, encoded by `encoder`; global state restored afterwards."""
+    import app
+    monkeypatch.setattr(app, "load_encoder", lambda cfg, index_dir=None: encoder)
+    monkeypatch.setattr(app, "DATA_DIR", tmp_path)
+    for name, value in (("bundle", None), ("index_loaded", False), ("load_error", None), ("manifest", None), ("shards", None)):
+        monkeypatch.setattr(app, name, value)
+    write_index_dir(tmp_path / "index", make_chunks(), encoder)
+    assert app.load_index()
+    yield app
+    for cache in (app.embedding_cache, app.results_cache, app.page_sessions):
+        cache.clear()
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import BoundedExecutor, DeadlineExceeded, Overloaded
+
+
+def _run_all(executor, items, deadline=None):
+    async def main():
+        return await asyncio.gather(*(executor.run(x, deadline) for x in items), return_exceptions=True)
+    return asyncio.run(main())
+
+
+def test_jobs_are_batched_and_answered_in_order():
+    sizes = []
+
+    def square(items):
+        sizes.append(len(items))
+        time.sleep(0.01)
+        return [x * x for x in items]
+
+    executor = BoundedExecutor(square, workers=1, max_pending=64, max_batch=8)
+    assert _run_all(executor, list(range(10))) == [x * x for x in range(10)]
+    assert max(sizes) > 1 and executor.stats()["completed"] == 10
+
+
+def test_failing_job_does_not_fail_its_batch():
+    def invert(items):
+        time.sleep(0.01)
+        return [1 / x for x in items]
+
+    executor = BoundedExecutor(invert, workers=1, max_pending=64, max_batch=8)
+    out = _run_all(executor, [1, 0, 2, 4, 5])
+    assert isinstance(out[1], ZeroDivisionError)
+    assert [out[i] for i in (0, 2, 3, 4)] == [1.0, 0.5, 0.25, 0.2]
+
+
+def test_admission_is_refused_beyond_max_pending():
+    release = threading.Event()
+
+    def blocked(items):
+        release.wait(5)
+        return items
+
+    executor = BoundedExecutor(blocked, workers=1, max_pending=2, max_batch=1)
+
+    async def main():
+        first = [asyncio.ensure_future(executor.run(i)) for i in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(Overloaded) as exc:
+            await executor.run(99)
+        assert 1 <= exc.value.retry_after <= 30
+        release.set()
+        return await asyncio.gather(*first)
+
+    assert asyncio.run(main()) == [0, 1]
+    assert executor.stats()["rejected"] == 1
+
+
+def test_queued_job_past_its_deadline_never_runs():
+    ran, release = [], threading.Event()
+
+    def slow(items):
+        ran.extend(items)
+        release.wait(5)
+        return items
+
+    executor = BoundedExecutor(slow, workers=1, max_pending=8, max_batch=1)
+
+    async def main():
+        busy = asyncio.ensure_future(executor.run("busy"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(DeadlineExceeded):
+            await executor.run("late", deadline=time.monotonic() + 0.05)
+        release.set()
+        return await busy
+
+    assert asyncio.run(main()) == "busy"
+    assert ran == ["busy"] and executor.stats()["expired"] == 1
+
+
+def test_asgi_validates_before_admission(api):
+    from starlette.testclient import TestClient
+    import asgi
+
+    client = TestClient(asgi.app)  # no lifespan: the api fixture already loaded the index
+    admitted = asgi.executor.stats()["admitted"]
+    for body in ({"query": "ml", "top_courses": "abc"}, {"query": "ml", "top_courses": -1}, {"query": ""}):
+        assert client.post("/query", json=body).status_code == 400
+    assert asgi.executor.stats()["admitted"] == admitted
+    r = client.post("/query", json={"query": "calculus", "top_courses": 2})
+    assert r.status_code == 200 and r.json()["count"] == 2
@@ -0,0 +1,68 @@
+import faiss
+import numpy as np
+import pytest
+
+from ann_index import (
+    INDEX_TYPES, ExactSearch, apply_search_params, auto_nlist, build_index, read_index, recall_at_k, report, write_index,
+)
+
+
+@pytest.fixture(scope="module")
+def embs():
+    rng = np.random.default_rng(1)
+    x = rng.standard_normal((2000, 32)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_every_type_finds_exact_duplicates(embs, index_type):
+    index, cfg = build_index(embs, index_type, pq_m=8, nprobe=64)
+    assert cfg["type"] == index_type and index.ntotal == len(embs)
+    _, idxs = index.search(embs[:50], 5)
+    hit_rate = np.mean(idxs[:, 0] == np.arange(50))
+    assert hit_rate >= (1.0 if index_type == "flat" else 0.8)
+
+
+def test_config_records_build_and_search_params(embs):
+    _, cfg = build_index(embs, "hnsw", hnsw_m=16, ef_construction=80, ef_search=32)
+    assert cfg == {"type": "hnsw", "build": {"M": 16, "efConstruction": 80}, "search": {"efSearch": 32}}
+    _, cfg = build_index(embs, "ivf_flat", nlist=20, nprobe=50)
+    assert cfg["build"] == {"nlist": 20} and cfg["search"] == {"nprobe": 20}  # nprobe capped at nlist
+    assert build_index(embs, "ivf_flat")[1]["build"]["nlist"] == auto_nlist(len(embs))
+
+
+def test_invalid_parameters(embs):
+    with pytest.raises(ValueError, match="Unknown index type"):
+        build_index(embs, "annoy")
+    with pytest.raises(ValueError, match="pq_m"):
+        build_index(embs, "ivf_pq", pq_m=5)
+
+
+def test_write_read_round_trip_applies_search_params(tmp_path, embs):
+    index, index_cfg = build_index(embs, "ivf_flat", nlist=16, nprobe=4)
+    write_index(index, tmp_path / "faiss.index")
+    cfg = {"index": index_cfg}
+    loaded = read_index(tmp_path / "faiss.index", cfg)
+    apply_search_params(loaded, cfg)
+    assert faiss.extract_index_ivf(loaded).nprobe == 4
+    np.testing.assert_array_equal(loaded.search(embs[:10], 5)[1], index.search(embs[:10], 5)[1])
+
+
+def test_report_and_recall(embs):
+    r = report(build_index(embs, "flat")[0], embs, k=5, n_queries=20)
+    assert r["recall_at_k"] == 1.0 and r["queries"] == 20 and r["bytes_per_vector"] == 32 * 4
+    assert recall_at_k(np.array([[1, 2, -1]]), np.array([[2, 7, 1]])) == 1.0
+    assert recall_at_k(np.array([[1, 2]]), np.array([[3, 2]])) == 0.5
+
+
+
+def test_exact_search_reads_a_memmap_without_copying_it(tmp_path, embs):
+    np.save(tmp_path / "vectors.npy", embs)
+    mapped = np.load(tmp_path / "vectors.npy", mmap_mode="r")
+    flat, _ = build_index(embs, "flat")
+    s, i = ExactSearch(mapped).search(embs[:20], 5)
+    fs, fi = flat.search(embs[:20], 5)
+    np.testing.assert_array_equal(i, fi)
+    np.testing.assert_allclose(s, fs, rtol=1e-5)
+    r = report(build_index(embs, "hnsw", ef_search=8)[0], mapped, k=10, n_queries=50)
+    assert r["queries"] == 50 and 0.5 < r["recall_at_k"] <= 1.0 and r["flat_p50_ms"] > 0
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from coalescer import QueryCoalescer
+
+
+def _submit_together(coalescer, items):
+    """Submit `items` from concurrent threads -> {item: result or exception}."""
+    out, start = {}, threading.Barrier(len(items))
+
+    def call(item):
+        start.wait()
+        try:
+            out[item] = coalescer.submit(item, timeout=5)
+        except Exception as e:
+            out[item] = e
+
+    threads = [threading.Thread(target=call, args=(item,)) for item in items]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out
+
+
+def test_concurrent_items_share_a_batch():
+    sizes = []
+
+    def double(items):
+        sizes.append(len(items))
+        return [x * 2 for x in items]
+
+    coalescer = QueryCoalescer(double, window_ms=50, max_batch=8)
+    out = _submit_together(coalescer, [1, 2, 3, 4])
+    assert out == {1: 2, 2: 4, 3: 6, 4: 8}
+    assert max(sizes) > 1
+    assert coalescer.stats()["items"] == 4
+
+
+def test_failing_item_does_not_fail_its_batch():
+    def invert(items):
+        return [1 / x for x in items]  # 0 raises ZeroDivisionError for the whole batch
+
+    coalescer = QueryCoalescer(invert, window_ms=50, max_batch=8)
+    out = _submit_together(coalescer, [0, 1, 2, 4])
+    assert isinstance(out[0], ZeroDivisionError)
+    assert (out[1], out[2], out[4]) == (1.0, 0.5, 0.25)
+
+
+def test_wrong_result_count_is_an_error():
+    coalescer = QueryCoalescer(lambda items: [], window_ms=0)
+    with pytest.raises(RuntimeError):
+        coalescer.submit("q", timeout=5)
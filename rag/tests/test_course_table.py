@@ -0,0 +1,44 @@
+import numpy as np
+
+from course_table import CourseTable, best_per_parent
+from metadata_store import load_chunk_table, write_columnar
+
+
+def test_best_per_parent_keeps_the_top_hit_per_course():
+    parents = np.array([0, 0, 1, 2, 1])
+    scores = np.array([0.5, 0.9, 0.8, 0.1, 0.95])
+    assert best_per_parent(parents, scores, 10).tolist() == [4, 1, 3]
+    assert best_per_parent(parents, scores, 2).tolist() == [4, 1]
+
+
+def test_group_collapses_chunks_into_courses(chunks):
+    table = CourseTable(chunks)
+    assert len(table) == 6
+    # rows 0-1 are CS 101, rows 3-4 are CS 301; -1 is FAISS padding
+    out = table.group([0.9, 0.8, 0.7, 0.6, 0.5], [1, 0, 3, 4, -1], top_courses=5)
+    assert [r["course_code"] for r in out] == ["CS 101", "CS 301"]
+    assert out[0]["score"] == np.float32(0.9).item()
+    assert out[0]["description"] == chunks["text"][1]
+    assert out[1]["subject"] == "Computer Science" and out[1]["class_name"] == "Algorithms"
+
+
+def test_group_respects_top_courses_and_empty_hits(chunks):
+    table = CourseTable(chunks)
+    assert len(table.group([0.9, 0.8, 0.7], [0, 2, 5], top_courses=2)) == 2
+    assert table.group([0.1], [-1], top_courses=3) == []
+
+
+def test_columnar_store_groups_like_the_dataframe(tmp_path, chunks):
+    write_columnar(chunks, tmp_path)
+    scores, idxs = np.linspace(1, 0, len(chunks)), np.arange(len(chunks))[::-1]
+    assert CourseTable(load_chunk_table(tmp_path)).group(scores, idxs, 4) == CourseTable(chunks).group(scores, idxs, 4)
+
+
+def test_subject_falls_back_to_subject_code(chunks):
+    chunks["metadata.subject"] = None
+    assert CourseTable(chunks).summaries[0]["subject"] == "CS"
+
+
+def test_chunks_without_parent_ids_group_by_id(chunks):
+    table = CourseTable(chunks.drop(columns=["metadata.parent_id"]))
+    assert len(table) == len(chunks)
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import embed_pipeline
+from embed_pipeline import KEY_DTYPE, EmbeddingCache, embed_csv, text_hash
+
+MODEL = "test/hash-encoder"
+
+
+@pytest.fixture
+def model(monkeypatch, encoder):
+    """Encode in-process with the hashed stand-in instead of loading a SentenceTransformer."""
+    monkeypatch.setattr(embed_pipeline, "_model", encoder)
+    return encoder
+
+
+def _keys(texts):
+    return np.array([text_hash(t) for t in texts], dtype=KEY_DTYPE)
+
+
+def test_cache_save_and_lookup(tmp_path):
+    vecs = np.arange(6, dtype="float32").reshape(3, 2)
+    cache = EmbeddingCache(tmp_path, MODEL)
+    assert len(cache) == 0
+    cache.save(_keys(["a", "b", "a"]), vecs)
+
+    cache = EmbeddingCache(tmp_path, MODEL)
+    assert len(cache) == 2  # one row per distinct text
+    found, rows = cache.lookup(_keys(["b", "zz", "a"]))
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_array_equal(cache.vecs[rows[found]], vecs[[1, 0]])
+
+
+def test_cache_save_drops_stale_vectors(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL)
+    cache.save(_keys(["a", "b"]), np.ones((2, 2), "float32"))
+    kept, dropped = EmbeddingCache(tmp_path, MODEL).save(_keys(["b", "c"]), np.ones((2, 2), "float32"))
+    assert (kept, dropped) == (2, 1)
+
+
+def test_legacy_npz_cache_is_migrated(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL)
+    np.savez(cache.legacy_path, keys=_keys(["b", "a"]), vecs=np.array([[2, 2], [1, 1]], "float32"))
+    cache = EmbeddingCache(tmp_path, MODEL)
+    found, rows = cache.lookup(_keys(["a", "b"]))
+    assert found.all()
+    np.testing.assert_array_equal(cache.vecs[rows], [[1, 1], [2, 2]])
+    cache.save(_keys(["a"]), np.ones((1, 2), "float32"))
+    assert not cache.legacy_path.exists()
+
+
+def test_rebuild_encodes_only_changed_chunks(tmp_path, chunks, model, capsys):
+    csv = tmp_path / "rag_chunks.csv"
+    chunks.to_csv(csv, index=False)
+    first, stats = embed_csv(csv, MODEL, tmp_path / "work1", tmp_path / "cache", batch_rows=4, workers=1)
+    assert stats["encoded"] == len(chunks) and stats["hits"] == 0
+    assert "cache hits 0 (0.0% hit rate)" in capsys.readouterr().out
+
+    chunks.loc[0, "text"] = "a rewritten description"
+    chunks.to_csv(csv, index=False)
+    second, stats = embed_csv(csv, MODEL, tmp_path / "work2", tmp_path / "cache", batch_rows=4, workers=1)
+    assert (stats["encoded"], stats["hits"]) == (1, len(chunks) - 1)
+    assert "cache hits 7 (87.5% hit rate)" in capsys.readouterr().out
+    np.testing.assert_array_equal(second[1:], first[1:])
+    np.testing.assert_array_equal(second[:1], model.encode(["a rewritten description"]))
+
+
+def test_interrupted_build_resumes_and_streams_every_batch(tmp_path, chunks, model):
+    csv = tmp_path / "rag_chunks.csv"
+    chunks.to_csv(csv, index=False)
+
+    def stop_at_third(batch):
+        if batch.index[0] == 6:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        embed_csv(csv, MODEL, tmp_path / "work", batch_rows=3, workers=1, on_batch=stop_at_third)
+    seen = []
+    vectors, stats = embed_csv(csv, MODEL, tmp_path / "work", batch_rows=3, workers=1, on_batch=seen.append)
+    assert stats["resumed"] == 6 and stats["encoded"] == len(chunks) - 6  # both finished shards were kept
+    assert [len(b) for b in seen] == [3, 3, 2]  # resumed batches are handed on too
+    assert pd.concat(seen)["id"].tolist() == chunks["id"].tolist()
+    np.testing.assert_array_equal(vectors, model.encode(chunks["text"].tolist()))
+
+
+def test_build_index_streams_the_chunk_table(tmp_path, chunks, model):
+    import build_index
+    from metadata_store import ChunkStore, load_chunk_table
+
+    (tmp_path / "export").mkdir()
+    chunks.to_csv(tmp_path / "export" / "rag_chunks.csv", index=False)
+    out = tmp_path / "index"
+    build_index.main(tmp_path / "export", out, eval_queries=4, similar_k=2, work_dir=tmp_path / "work",
+                     batch_rows=3, workers=1)
+    table = load_chunk_table(out)
+    assert isinstance(table, ChunkStore) and table["id"].tolist() == chunks["id"].tolist()
+    assert pd.read_csv(out / "chunks.csv").equals(chunks)
+    assert {"faiss.index", "lexical.npz", "similar.npz", "config.json"} <= {p.name for p in out.iterdir()}
+    assert not (tmp_path / "work").exists()
+
+
+def test_build_without_similar_drops_the_old_graph(tmp_path, chunks, model):
+    import build_index
+
+    (tmp_path / "export").mkdir()
+    chunks.to_csv(tmp_path / "export" / "rag_chunks.csv", index=False)
+    out = tmp_path / "index"
+    build_index.main(tmp_path / "export", out, eval_queries=0, similar_k=2, workers=1)
+    assert (out / "similar.npz").exists()
+    build_index.main(tmp_path / "export", out, eval_queries=0, similar_k=0, workers=1)
+    assert not (out / "similar.npz").exists()
+
+
+def test_shard_builds_keep_their_own_cache(tmp_path, chunks, model):
+    import build_index
+
+    catalogs = {"cs": chunks[chunks["metadata.subject_code"] == "CS"],
+                "other": chunks[chunks["metadata.subject_code"] != "CS"]}
+    for name, table in catalogs.items():
+        (tmp_path / "export" / name).mkdir(parents=True)
+        table.to_csv(tmp_path / "export" / name / "rag_chunks.csv", index=False)
+
+    def build(name):
+        build_index.main(tmp_path / "export" / name, tmp_path / "shards" / name, eval_queries=0, similar_k=0,
+                         batch_rows=3, workers=1, shard=name, manifest=tmp_path / "shards.json")
+
+    build("cs")
+    build("other")  # must not prune the cs vectors from the cache
+    calls = model.calls
+    build("cs")
+    assert model.calls == calls  # every cs chunk is a cache hit
+    assert sorted(p.name for p in (tmp_path / "shards" / "embedding_cache").iterdir()) == ["cs", "other"]
+    assert not (tmp_path / "shards" / "build_shards" / "cs").exists()
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+import encoders
+from encoders import encoder_config, encoder_key, export_encoder, load_encoder
+
+
+class FakeSentenceTransformer:
+    """Records how load_encoder constructs the model instead of loading weights."""
+
+    def __init__(self, source, **kwargs):
+        self.source, self.kwargs = source, kwargs
+
+
+@pytest.fixture
+def fake_st(monkeypatch):
+    monkeypatch.setattr(encoders, "SentenceTransformer", FakeSentenceTransformer)
+
+
+def test_encoder_config_defaults_to_torch():
+    assert encoder_config({"model": "m"}) == {"backend": "torch"}
+    assert encoder_config({"model": "m", "encoder": None}) == {"backend": "torch"}
+    enc = {"backend": "onnx_int8", "path": "encoder", "file_name": "onnx/model_int8_avx2.onnx"}
+    cfg = {"model": "m", "encoder": enc}
+    assert encoder_config(cfg) == enc
+    encoder_config(cfg)["backend"] = "torch"
+    assert cfg["encoder"]["backend"] == "onnx_int8"  # the config itself is never modified
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown encoder backend 'tflite'"):
+        encoder_config({"model": "m", "encoder": {"backend": "tflite"}})
+    with pytest.raises(ValueError, match="Unknown encoder backend"):
+        export_encoder("m", "tflite", "unused")
+
+
+def test_encoder_key_separates_weights_not_other_settings():
+    base = {"model": "m", "dim": 384, "version": "v1"}
+    assert encoder_key(base) == encoder_key({**base, "version": "v2", "encoder": {"backend": "torch"}})
+    keys = {
+        encoder_key(base),
+        encoder_key({**base, "model": "other"}),
+        encoder_key({**base, "encoder": {"backend": "torch_int8"}}),
+        encoder_key({**base, "encoder": {"backend": "onnx", "path": "encoder"}}),
+        encoder_key({**base, "encoder": {"backend": "onnx_int8", "path": "encoder", "file_name": "a.onnx"}}),
+        encoder_key({**base, "encoder": {"backend": "onnx_int8", "path": "encoder", "file_name": "b.onnx"}}),
+    }
+    assert len(keys) == 6
+
+
+def test_torch_backend_loads_the_named_model(fake_st):
+    model = load_encoder({"model": "sentence-transformers/all-MiniLM-L6-v2"})
+    assert model.source == "sentence-transformers/all-MiniLM-L6-v2"
+    assert model.kwargs == {"device": None}
+
+
+def test_onnx_backend_prefers_the_local_export(fake_st, tmp_path):
+    (tmp_path / "encoder").mkdir()
+    cfg = {"model": "m", "encoder": {"backend": "onnx_int8", "path": "encoder", "file_name": "onnx/model_int8_avx2.onnx"}}
+    model = load_encoder(cfg, tmp_path)
+    assert model.source == str(tmp_path / "encoder")
+    assert model.kwargs == {"backend": "onnx", "model_kwargs": {"file_name": "onnx/model_int8_avx2.onnx"}}
+
+
+def test_onnx_backend_falls_back_to_the_hub_model(fake_st, tmp_path):
+    cfg = {"model": "m", "encoder": {"backend": "onnx", "path": "encoder"}}
+    model = load_encoder(cfg, tmp_path)  # no tmp_path/encoder on disk
+    assert model.source == "m" and model.kwargs == {"backend": "onnx", "model_kwargs": None}
+    assert load_encoder(cfg).source == "m"  # no index dir at all
+
+
+@pytest.mark.parametrize("backend", ["torch", "torch_int8"])
+def test_torch_export_writes_nothing(tmp_path, backend):
+    assert export_encoder("m", backend, tmp_path / "encoder") == {"backend": backend}
+    assert not (tmp_path / "encoder").exists()
+
+
+def test_reload_keeps_the_encoder_only_while_its_key_matches(api, monkeypatch):
+    loads = []
+    monkeypatch.setattr(api, "load_encoder", lambda cfg, index_dir=None: loads.append(cfg) or api.bundle.model)
+    path = api.DATA_DIR / "index" / "config.json"
+    cfg = json.loads(path.read_text())
+
+    path.write_text(json.dumps({**cfg, "version": "v2"}))
+    assert api.load_index() and loads == []
+
+    path.write_text(json.dumps({**cfg, "version": "v3", "encoder": {"backend": "torch_int8"}}))
+    assert api.load_index() and len(loads) == 1
+    assert api.app.test_client().get("/health").get_json()["encoder"] == "torch_int8"
+
+
+def test_onnx_backends_need_the_extra(monkeypatch, fake_st, tmp_path):
+    import build_index
+
+    monkeypatch.setattr(encoders, "find_spec", lambda name: None)
+    encoders.check_backend("torch_int8")
+    for backend in ("onnx", "onnx_int8"):
+        with pytest.raises(ImportError, match=r"sentence-transformers\[onnx\]"):
+            load_encoder({"model": "m", "encoder": {"backend": backend}})
+        with pytest.raises(ImportError, match="onnxruntime, optimum"):
+            export_encoder("m", backend, tmp_path / "encoder")
+    with pytest.raises(ImportError):  # before anything is embedded
+        build_index.main(tmp_path / "missing", tmp_path / "index", encoder="onnx")
+    assert not (tmp_path / "index").exists()
+
+
+def test_is_uncased_reads_the_tokenizer():
+    from types import SimpleNamespace
+
+    assert encoders.is_uncased(SimpleNamespace(tokenizer=SimpleNamespace(do_lower_case=True)))
+    assert not encoders.is_uncased(SimpleNamespace(tokenizer=SimpleNamespace(do_lower_case=False)))
+    assert not encoders.is_uncased(SimpleNamespace(tokenizer=SimpleNamespace()))  # e.g. sentencepiece models
+    assert not encoders.is_uncased(object())
@@ -0,0 +1,74 @@
+import faiss
+import numpy as np
+import pytest
+
+from filters import FilterIndex, Filters, parse_filters
+
+
+def test_parse_filters_normalizes():
+    f = parse_filters({"subject": ["cs", " math ", "CS"], "credits_min": 3, "completed": ["cs101", "MATH 180"]})
+    assert f == Filters(("CS", "MATH"), 3.0, None, False, ("CS 101", "MATH 180"))
+    assert parse_filters({"subject": "cs"}).subjects == ("CS",)
+    assert parse_filters(None) is None and parse_filters({}) is None
+    assert parse_filters({"no_prereqs": False}) is None  # nothing actually filtered
+
+
+@pytest.mark.parametrize("raw, message", [
+    ([], "object"),
+    ({"colour": "red"}, "Unknown filter"),
+    ({"subject": [""]}, "subject"),
+    ({"credits_min": "3"}, "credits_min"),
+    ({"credits_max": True}, "credits_max"),
+    ({"credits_min": 4, "credits_max": 3}, "exceed"),
+    ({"no_prereqs": "yes"}, "no_prereqs"),
+    ({"completed": "CS 101"}, "completed"),
+])
+def test_parse_filters_rejects(raw, message):
+    with pytest.raises(ValueError, match=message):
+        parse_filters(raw)
+
+
+def _codes(chunks, mask):
+    return sorted(set(chunks["metadata.course_code"][mask]))
+
+
+def test_masks(chunks):
+    fi = FilterIndex(chunks)
+    assert fi.mask(None) is None
+    assert _codes(chunks, fi.mask(parse_filters({"subject": ["MATH", "PHYS"]}))) == ["MATH 180", "MATH 181", "PHYS 141"]
+    assert _codes(chunks, fi.mask(parse_filters({"no_prereqs": True}))) == ["CS 101", "MATH 180", "PHYS 141"]
+    # credit ranges overlap the requested range: PHYS 141 is 1-4, MATH 180 is 4-5
+    assert _codes(chunks, fi.mask(parse_filters({"credits_min": 4.5}))) == ["MATH 180"]
+    assert _codes(chunks, fi.mask(parse_filters({"credits_max": 2}))) == ["PHYS 141"]
+    assert _codes(chunks, fi.mask(parse_filters({"subject": "CS", "credits_min": 4}))) == ["CS 301"]
+    assert _codes(chunks, fi.mask(parse_filters({"completed": ["CS 101"]}))) == ["CS 201", "MATH 180", "PHYS 141"]
+    assert not fi.mask(parse_filters({"subject": "BIOS"})).any()
+
+
+def test_search_only_returns_matching_rows(chunks, vectors):
+    fi = FilterIndex(chunks)
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    f = parse_filters({"subject": "MATH"})
+    allowed = set(np.flatnonzero(fi.mask(f)))
+    scores, idxs = fi.search(index, {}, vectors, 10, f)
+    assert idxs.shape == (len(vectors), len(allowed))  # k capped at the match count
+    assert all(set(row) == allowed for row in idxs.tolist())
+    # scores are the unfiltered scores of those rows
+    np.testing.assert_allclose(scores[0], np.sort(vectors[sorted(allowed)] @ vectors[0])[::-1], rtol=1e-5)
+
+
+def test_search_with_no_match_returns_no_hits(chunks, vectors):
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    scores, idxs = FilterIndex(chunks).search(index, {}, vectors[:2], 5, parse_filters({"subject": "BIOS"}))
+    assert scores.shape == idxs.shape == (2, 0)
+
+
+def test_ann_search_params_widen_with_selectivity(chunks, vectors):
+    fi = FilterIndex(chunks)
+    index = faiss.IndexHNSWFlat(vectors.shape[1], 8, faiss.METRIC_INNER_PRODUCT)
+    index.add(vectors)
+    bits = fi.bitmap(parse_filters({"subject": "PHYS"}))  # 1 of 8 rows
+    params = fi.search_params(bits, index, {"index": {"search": {"efSearch": 2}}}, k=1)
+    assert params.efSearch == 8  # 2 x (8 / 1), capped at the corpus size
@@ -0,0 +1,52 @@
+import json
+
+from ann_index import content_version
+
+
+def _set_version(app, version):
+    path = app.DATA_DIR / "index" / "config.json"
+    cfg = json.loads(path.read_text())
+    path.write_text(json.dumps({**cfg, "version": version}))
+
+
+def test_reload_swaps_in_the_new_version(api):
+    client = api.app.test_client()
+    assert client.get("/health").headers["X-Index-Version"] == "v1"
+    before = api.bundle
+    api.retrieve_and_group("calculus", 3)
+    assert len(api.results_cache) == 1
+
+    _set_version(api, "v2")
+    r = client.post("/load-index?wait=true")
+    assert r.status_code == 200 and r.get_json()["index_version"] == "v2"
+    assert api.bundle is not before and api.bundle.version == "v2"
+    assert api.bundle.model is before.model  # same encoder is kept, not loaded twice
+    assert len(api.results_cache) == 0  # old-version entries dropped
+    assert client.get("/health").headers["X-Index-Version"] == "v2"
+
+
+def test_failed_reload_keeps_serving_the_old_bundle(api):
+    before = api.bundle
+    (api.DATA_DIR / "index" / "faiss.index").unlink()
+    assert not api.load_index()
+    assert api.bundle is before and api.load_error
+    health = api.app.test_client().get("/health").get_json()
+    assert health["index_version"] == "v1" and health["load_error"]
+
+
+def test_requests_finish_on_the_bundle_they_started_with(api):
+    old = api.bundle
+    _set_version(api, "v2")
+    assert api.load_index()
+    results = api.retrieve_and_group("data structures", 2, b=old)  # a request that snapshotted `old`
+    assert results[0]["course_code"] == "CS 201"
+
+
+def test_content_version_tracks_file_bytes(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.write_bytes(b"index")
+    b.write_text(json.dumps({"x": 1}))
+    v = content_version([a, b])
+    assert len(v) == 12 and v == content_version([a, b])
+    b.write_text(json.dumps({"x": 2}))
+    assert content_version([a, b]) != v
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from lexical_index import (
+    LEXICAL_NAME, LOOKUP_FILL_SCALE, HybridRetriever, LexicalIndex, build_lexical_arrays, fuse,
+    load_lexical_index, tokenize, write_lexical_index,
+)
+
+
+@pytest.fixture
+def lexical(chunks):
+    return LexicalIndex(build_lexical_arrays(chunks))
+
+
+def test_tokenize_drops_stopwords_and_joins_course_codes():
+    assert tokenize("The Intro to CS-101 and Math 180") == ["intro", "cs", "101", "math", "180", "cs101", "math180"]
+
+
+def test_code_table_maps_codes_to_their_chunk_rows(lexical):
+    assert len(lexical) == 6
+    assert lexical.rows_for(["CS 101"]).tolist() == [0, 1]
+    assert lexical.rows_for(["CS 301", "NOPE 999", "PHYS 141"]).tolist() == [3, 4, 7]
+    assert lexical.rows_for([]).tolist() == []
+    assert lexical.find_codes("cs301 vs Math-180, then CS 301 again; ECON 999") == ["CS 301", "MATH 180"]
+
+
+def test_code_lookup_only_for_codes_plus_lookup_words(lexical):
+    assert lexical.is_code_lookup("CS 201 prerequisites", ["CS 201"])
+    assert lexical.is_code_lookup("what are the credits for math 180?", ["MATH 180"])
+    assert not lexical.is_code_lookup("courses like CS 201 about trees", ["CS 201"])
+    assert not lexical.is_code_lookup("prerequisites", [])
+
+
+def test_bm25_scores_rank_rare_terms_higher(lexical, chunks):
+    scores = lexical.scores("calculus physics")
+    assert scores.shape == (len(chunks),) and scores.dtype == np.float32
+    assert set(np.flatnonzero(scores)) == {5, 6, 7}
+    s, rows = lexical.search("calculus", k=5)
+    assert sorted(rows.tolist()) == [5, 6] and np.all(np.diff(s) <= 0)
+    assert lexical.search("unknownword", 5)[1].tolist() == []
+    s, rows = lexical.search("science", k=2)
+    assert len(rows) == 2
+    mask = np.zeros(len(chunks), dtype=bool)
+    mask[6] = True
+    assert lexical.search("calculus", 5, mask)[1].tolist() == [6]
+
+
+def test_lookup_puts_named_courses_first(lexical):
+    s, rows = lexical.lookup("CS 201 prerequisites", ["CS 201"], k=3)
+    assert rows[0] == 2 and s[0] == 1.0
+    assert np.all(s[1:] <= LOOKUP_FILL_SCALE)
+
+
+def test_fuse_scores_the_union_of_both_lists():
+    s, idx = fuse([0.9, 0.5, 0.0], [4, 2, -1], np.array([2.0, 1.0], dtype="float32"), np.array([2, 7]), weight=0.5)
+    assert dict(zip(idx.tolist(), s.tolist())) == pytest.approx({2: 0.75, 4: 0.45, 7: 0.5})  # 7: dense fill 0.5
+    assert idx.tolist() == [2, 7, 4]
+    s, idx = fuse([0.9, 0.5], [4, 2], np.array([1.0]), np.array([7]), weight=0.0)
+    assert idx.tolist() == [4, 2]
+
+
+def test_hybrid_retriever_skips_the_encoder_for_code_lookups(lexical):
+    calls = []
+
+    def dense(queries, k):
+        calls.append(list(queries))
+        return np.full((len(queries), k), 0.5, dtype="float32"), np.tile(np.arange(k), (len(queries), 1))
+
+    out = HybridRetriever(lexical).retrieve_batch(["MATH 181 coreqs", "calculus for physics"], 3, dense)
+    assert calls == [["calculus for physics"]]
+    assert out[0][1][0] == 6
+    assert {5, 6, 7} <= set(out[1][1].tolist())
+    with pytest.raises(ValueError):
+        HybridRetriever(lexical, weight=2)
+
+
+def test_write_and_load_round_trip(tmp_path, chunks):
+    write_lexical_index(chunks, tmp_path)
+    loaded = load_lexical_index(tmp_path, chunks)
+    np.testing.assert_allclose(loaded.scores("data structures"), LexicalIndex(build_lexical_arrays(chunks)).scores("data structures"))
+    rebuilt = load_lexical_index(tmp_path, chunks.iloc[:4])  # stale file: row count differs
+    assert rebuilt.size == 4
+    assert load_lexical_index(tmp_path / "missing", chunks).size == len(chunks)
+    assert (tmp_path / LEXICAL_NAME).exists()
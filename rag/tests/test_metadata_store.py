@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from metadata_store import (
+    STORE_DIRNAME, ChunkStore, ChunkTableWriter, ColumnarWriter, has_chunk_table, load_chunk_table, write_columnar,
+)
+
+
+def test_round_trip_matches_the_dataframe(tmp_path, chunks):
+    write_columnar(chunks, tmp_path)
+    store = load_chunk_table(tmp_path)
+    assert isinstance(store, ChunkStore)
+    assert len(store) == len(chunks) and store.columns == list(chunks.columns)
+    for col in chunks.columns:
+        assert store[col].tolist() == chunks[col].tolist()
+    rows = store.iloc[[4, 0, 2]]
+    assert rows.index.tolist() == [4, 0, 2]
+    assert rows["id"].tolist() == chunks["id"].iloc[[4, 0, 2]].tolist()
+    assert store.iloc[3]["metadata.course_code"] == chunks["metadata.course_code"].iloc[3]
+    assert store.column_values("metadata.credits_max", [1, 5]).tolist() == chunks["metadata.credits_max"].iloc[[1, 5]].tolist()
+
+
+def test_missing_strings_come_back_as_nan(tmp_path):
+    write_columnar(pd.DataFrame({"name": ["a", None, "ü"], "n": [1, 2, 3]}), tmp_path)
+    values = load_chunk_table(tmp_path)["name"].tolist()
+    assert values[0] == "a" and values[2] == "ü" and pd.isna(values[1])
+
+
+def test_rebuild_without_nulls_drops_the_old_null_mask(tmp_path):
+    write_columnar(pd.DataFrame({"name": ["old0", None]}), tmp_path)
+    write_columnar(pd.DataFrame({"name": ["new0", "new1"]}), tmp_path)
+    assert load_chunk_table(tmp_path)["name"].tolist() == ["new0", "new1"]
+    assert not list((tmp_path / STORE_DIRNAME).glob("*.nulls.npy"))
+    assert sorted(p.name for p in tmp_path.iterdir()) == [STORE_DIRNAME]
+
+
+def test_rebuild_keeps_an_open_store_readable(tmp_path):
+    write_columnar(pd.DataFrame({"name": ["old0", "old1"]}), tmp_path)
+    old = load_chunk_table(tmp_path)
+    write_columnar(pd.DataFrame({"name": ["new0", "new1", "new2"]}), tmp_path)
+    assert old["name"].tolist() == ["old0", "old1"]  # mapped before the swap
+    assert load_chunk_table(tmp_path)["name"].tolist() == ["new0", "new1", "new2"]
+
+
+def test_csv_fallback(tmp_path, chunks):
+    assert not has_chunk_table(tmp_path)
+    chunks.to_csv(tmp_path / "chunks.csv", index=False)
+    assert has_chunk_table(tmp_path)
+    table = load_chunk_table(tmp_path)
+    assert isinstance(table, pd.DataFrame) and len(table) == len(chunks)
+    with pytest.raises(FileNotFoundError):
+        load_chunk_table(tmp_path, fmt="columnar")
+    write_columnar(chunks, tmp_path)
+    assert isinstance(load_chunk_table(tmp_path, fmt="csv"), pd.DataFrame)
+
+
+def test_empty_string_column(tmp_path):
+    write_columnar(pd.DataFrame({"name": ["", ""], "x": np.zeros(2)}), tmp_path)
+    assert load_chunk_table(tmp_path)["name"].tolist() == ["", ""]
+
+
+def test_batches_stream_into_the_same_store_as_one_frame(tmp_path):
+    batches = [
+        pd.DataFrame({"code": [101, 102], "name": ["a", None], "credits": [3, 4]}),
+        pd.DataFrame({"code": ["CS 1", "CS 2"], "name": ["b", "c"], "credits": [np.nan, 1.5]}),
+        pd.DataFrame({"code": [103, None], "name": ["", "d"], "credits": [2, 2]}),
+    ]
+    writer = ColumnarWriter(tmp_path / "streamed")
+    for b in batches:
+        writer.append(b)
+    assert not (tmp_path / "streamed" / STORE_DIRNAME).exists()  # nothing replaced until close()
+    writer.close()
+    write_columnar(pd.concat(batches, ignore_index=True), tmp_path / "whole")
+    streamed, whole = (load_chunk_table(tmp_path / d) for d in ("streamed", "whole"))
+    assert streamed.columns == whole.columns and len(streamed) == 6
+    for col in whole.columns:
+        assert streamed[col].equals(whole[col]), col
+    assert streamed["code"].tolist()[:3] == ["101", "102", "CS 1"]
+    assert streamed._cols["credits"].values.dtype == np.float64
+    with pytest.raises(ValueError, match="same columns"):
+        writer.append(pd.DataFrame({"other": [1]}))
+
+
+def test_chunk_table_writer_keeps_the_old_table_until_close(tmp_path, chunks):
+    write_columnar(chunks.iloc[:2], tmp_path)
+    chunks.iloc[:2].to_csv(tmp_path / "chunks.csv", index=False)
+    writer = ChunkTableWriter(tmp_path)
+    for start in range(0, len(chunks), 3):
+        writer.append(chunks.iloc[start:start + 3])
+    assert len(load_chunk_table(tmp_path)) == 2 and len(pd.read_csv(tmp_path / "chunks.csv")) == 2
+    csv_path, store_dir = writer.close()
+    assert pd.read_csv(csv_path).equals(chunks)
+    assert load_chunk_table(tmp_path)["id"].tolist() == chunks["id"].tolist()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["chunks.cols", "chunks.csv"]
+    assert not list(store_dir.glob("*.part*"))
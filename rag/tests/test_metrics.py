@@ -0,0 +1,61 @@
+import time
+
+from metrics import Registry, StageTimer, server_timing
+
+
+def test_counter_renders_labelled_series():
+    reg = Registry()
+    c = reg.counter("requests_total", "Requests", ("endpoint", "status"))
+    c.inc("/query", "200")
+    c.inc("/query", "200", amount=2)
+    c.inc("/plan", '5"00')
+    out = reg.render().splitlines()
+    assert out[:2] == ["# HELP requests_total Requests", "# TYPE requests_total counter"]
+    assert 'requests_total{endpoint="/query",status="200"} 3.0' in out
+    assert 'requests_total{endpoint="/plan",status="5\\"00"} 1.0' in out  # quotes escaped
+
+
+def test_histogram_buckets_are_cumulative():
+    reg = Registry()
+    h = reg.histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.5, 3.0):
+        h.observe(v, "encode")
+    out = reg.render().splitlines()
+    assert 'latency_seconds_bucket{stage="encode",le="0.1"} 1' in out
+    assert 'latency_seconds_bucket{stage="encode",le="1.0"} 3' in out
+    assert 'latency_seconds_bucket{stage="encode",le="+Inf"} 4' in out
+    assert 'latency_seconds_count{stage="encode"} 4' in out
+    assert 'latency_seconds_sum{stage="encode"} 4.05' in out
+
+
+def test_collectors_run_at_render_time():
+    reg = Registry()
+    state = {"n": 1}
+    reg.collector(lambda: [("cache_entries", "gauge", "Entries", [({"cache": "results"}, state["n"])])])
+    assert 'cache_entries{cache="results"} 1.0' in reg.render()
+    state["n"] = 5
+    assert 'cache_entries{cache="results"} 5.0' in reg.render()
+
+
+def test_stage_timer_accumulates_per_stage():
+    timer = StageTimer()
+    for _ in range(2):
+        with timer.stage("encode"):
+            time.sleep(0.002)
+    with timer.stage("search"):
+        pass
+    assert set(timer.durations) == {"encode", "search"}
+    assert timer.durations["encode"] >= 0.004
+
+
+def test_server_timing_header():
+    assert server_timing({"encode": 0.0123, "total": 0.02}) == "encode;dur=12.30, total;dur=20.00"
+
+
+def test_api_exposes_metrics_and_server_timing():
+    import app
+    client = app.app.test_client()
+    assert "total;dur=" in client.get("/health").headers["Server-Timing"]
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'rag_http_requests_total{endpoint="/health",method="GET",status="200"}' in body
+    assert "# TYPE rag_stage_duration_seconds histogram" in body
@@ -0,0 +1,108 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+
+from pagination import GROWTH, HitPager
+
+PARENTS = np.array([0, 0, 1, 2, 2, 3, 4, 5])  # chunk row -> course, as in `chunks`
+
+
+class Fetcher:
+    """fetch(k) over a fixed ranking of chunk rows (best first)."""
+
+    def __init__(self, ranking):
+        self.ranking = list(ranking)
+        self.ks = []
+
+    def __call__(self, k):
+        self.ks.append(k)
+        idxs = self.ranking[:k]
+        return np.linspace(1, 0.1, len(self.ranking))[:len(idxs)], idxs, k < len(self.ranking)
+
+
+def test_pages_list_each_course_once_in_rank_order():
+    fetch = Fetcher([1, 0, 3, 4, 2, 7, 6, 5])
+    pager = HitPager(PARENTS, fetch, k=2, limit=8)
+    assert pager.page(0, 2)[0] == [1, 3]  # row 0 is a second chunk of course 0
+    assert pager.page(2, 2)[0] == [2, 7]
+    assert pager.page(4, 5)[0] == [6, 5]
+    assert fetch.ks == [2, min(2 * GROWTH, 8)] and not pager.more  # one widening reached the limit
+    assert not pager.has_more(6) and pager.page(6, 2) == ([], [])
+
+
+def test_listed_courses_keep_their_place_when_the_search_widens():
+    first, wider = [5, 2, 0], [0, 5, 2, 3, 7]
+    calls = iter([(np.array([0.9, 0.8, 0.7]), first, True), (np.linspace(1, 0.5, 5), wider, False)])
+    pager = HitPager(PARENTS, lambda k: next(calls), k=3, limit=8)
+    assert pager.page(0, 3)[0] == [5, 2, 0]
+    assert pager.page(3, 2)[0] == [3, 7] and pager.rows == [5, 2, 0, 3, 7]
+
+
+def test_k_is_bounded_by_the_limit_and_missing_rows_are_skipped():
+    calls = []
+
+    def fetch(k):
+        calls.append(k)
+        return np.array([0.5, 0.0]), np.array([2, -1]), True
+
+    pager = HitPager(PARENTS, fetch, k=100, limit=8)
+    assert calls == [8] and pager.rows == [2] and not pager.has_more(1)
+
+
+def _cursor(**fields):
+    payload = {"session_id": "s", "offset": 0, "version": "v1", "query": "q", "page_size": 2, "filters": None, "shard": None}
+    payload.update(fields)
+    raw = json.dumps(list(payload.values())).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def test_parse_cursor_round_trips_and_validates(api):
+    cursor = api.parse_cursor({"cursor": _cursor(filters={"subject": ["cs"], "completed": None})})
+    assert cursor.page_size == 2 and cursor.filters.subjects == ("CS",)
+    for bad in ({"page_size": 0}, {"page_size": api.MAX_TOP_COURSES + 1}, {"page_size": True},
+                {"offset": -1}, {"query": 5}, {"shard": 3}, {"filters": {"bogus": 1}}):
+        with pytest.raises(ValueError, match="Malformed cursor"):
+            api.parse_cursor({"cursor": _cursor(**bad)})
+    for body in (None, {}, {"cursor": ""}, {"cursor": "!!!"}, {"cursor": base64.b64encode(b"[1]").decode()}):
+        with pytest.raises(ValueError):
+            api.parse_cursor(body)
+
+
+def test_paginate_requires_a_bounded_page_size(api):
+    assert api.parse_paginate({"paginate": True, "top_courses": 3})
+    with pytest.raises(ValueError):
+        api.parse_paginate({"paginate": "yes"})
+    for top in (0, api.MAX_TOP_COURSES + 1, "3"):
+        with pytest.raises(ValueError, match="between 1 and"):
+            api.parse_paginate({"paginate": True, "top_courses": top})
+
+
+def test_query_next_walks_every_course_once(api):
+    client = api.app.test_client()
+    page = client.post("/query", json={"query": "calculus", "top_courses": 4, "paginate": True}).get_json()
+    seen = [r["course_code"] for r in page["results"]]
+    assert len(seen) == 4 and page["offset"] == 0
+    while page["next_cursor"]:
+        page = client.post("/query/next", json={"cursor": page["next_cursor"]}).get_json()
+        seen += [r["course_code"] for r in page["results"]]
+    assert sorted(seen) == ["CS 101", "CS 201", "CS 301", "MATH 180", "MATH 181", "PHYS 141"]
+
+
+def test_expired_session_resumes_with_a_capped_page_size(api, monkeypatch):
+    client = api.app.test_client()
+    page = client.post("/query", json={"query": "calculus", "top_courses": 2, "paginate": True}).get_json()
+    api.page_sessions.clear()
+    resumed = client.post("/query/next", json={"cursor": page["next_cursor"]}).get_json()
+    assert resumed["offset"] == 2 and resumed["count"] == 2
+
+    monkeypatch.setattr(api, "MAX_TOP_COURSES", 1)  # lowered after the cursor was issued
+    session = api._new_session(api.bundle, "calculus", 50, None, api.StageTimer())
+    assert session.page_size == 1
+
+
+def test_cursor_from_an_older_index_is_gone(api):
+    client = api.app.test_client()
+    assert client.post("/query/next", json={"cursor": _cursor(version="old")}).status_code == 410
+    assert client.post("/query/next", json={"cursor": "garbage"}).status_code == 400
@@ -0,0 +1,68 @@
+import pytest
+
+import app
+from filters import Filters
+
+
+def test_parse_query_request_defaults():
+    query, top_courses, filters = app.parse_query_request({"query": "machine learning"})
+    assert (query, top_courses, filters) == ("machine learning", 8, None)
+
+
+def test_parse_query_request_with_filters():
+    _, top_courses, filters = app.parse_query_request(
+        {"query": "ml", "top_courses": 3, "filters": {"subject": "cs", "no_prereqs": True}})
+    assert top_courses == 3
+    assert filters == Filters(("CS",), None, None, True, None)
+
+
+@pytest.mark.parametrize("body", [None, [], {}, {"query": ""}, {"query": "   "}, {"query": 5}])
+def test_parse_query_request_rejects_missing_query(body):
+    with pytest.raises(ValueError):
+        app.parse_query_request(body)
+
+
+@pytest.mark.parametrize("top_courses", ["abc", -1, 0, 2.5, True, None, app.MAX_TOP_COURSES + 1])
+def test_parse_query_request_rejects_bad_top_courses(top_courses):
+    with pytest.raises(ValueError, match="top_courses"):
+        app.parse_query_request({"query": "ml", "top_courses": top_courses})
+
+
+def test_parse_query_request_accepts_the_cap():
+    assert app.parse_query_request({"query": "ml", "top_courses": app.MAX_TOP_COURSES})[1] == app.MAX_TOP_COURSES
+
+
+def test_parse_batch_request_mixes_strings_and_objects():
+    pairs = app.parse_batch_request({
+        "queries": ["ml", {"query": "stats", "top_courses": 3, "filters": {"subject": "MATH"}}],
+        "top_courses": 5,
+    })
+    assert pairs == [("ml", 5, None), ("stats", 3, Filters(("MATH",), None, None, False, None))]
+
+
+def test_parse_batch_request_applies_default_filters():
+    pairs = app.parse_batch_request({"queries": ["a", {"query": "b", "filters": None}], "filters": {"no_prereqs": True}})
+    assert pairs[0][2] == Filters(None, None, None, True, None)
+    assert pairs[1][2] is None
+
+
+@pytest.mark.parametrize("body, message", [
+    (None, "queries"),
+    ([1], "queries"),
+    ("str", "queries"),
+    ({"queries": "ml"}, "queries"),
+    ({"queries": [""]}, "#0"),
+    ({"queries": ["ml", {"top_courses": 3}]}, "#1"),
+    ({"queries": [{"query": "ml", "top_courses": 0}]}, "#0"),
+    ({"queries": ["ml"], "top_courses": "8"}, "#0"),
+    ({"queries": [{"query": "ml", "filters": {"bogus": 1}}]}, "#0"),
+])
+def test_parse_batch_request_rejects(body, message):
+    with pytest.raises(ValueError, match=message):
+        app.parse_batch_request(body)
+
+
+def test_parse_batch_request_limit(monkeypatch):
+    monkeypatch.setattr(app, "QUERY_BATCH_LIMIT", 2)
+    with pytest.raises(ValueError, match="Too many"):
+        app.parse_batch_request({"queries": ["a", "b", "c"]})
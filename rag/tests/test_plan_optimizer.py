@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from filters import FilterIndex
+from plan_optimizer import PlanOptimizer, Requirement
+from prereq_graph import PrereqGraph
+
+
+@pytest.fixture
+def planner(chunks):
+    graph = PrereqGraph(chunks)
+    return PlanOptimizer(graph, FilterIndex(chunks, graph).credits_max)
+
+
+def _terms(plan):
+    return [[c["code"] for c in term] for term in plan["terms"]]
+
+
+def test_plans_prerequisites_in_the_fewest_terms(planner):
+    plan = planner.solve([], [Requirement("Core", 1, ["CS 301"])])
+    assert _terms(plan) == [["CS 101", "MATH 180"], ["CS 201"], ["CS 301"]]
+    assert plan["complete"] and plan["optimal"]
+    assert plan["total_credits"] == 3 + 5 + 3 + 4  # MATH 180 counts at its 5-credit maximum
+    first = {c["code"]: c for c in plan["terms"][0]}
+    assert first["CS 101"]["category"] is None and first["CS 101"]["required_for"] == ["CS 301"]
+    assert plan["terms"][2][0]["category"] == "Core"
+
+
+def test_completed_and_in_progress_courses_are_skipped(planner):
+    plan = planner.solve(["cs101"], [Requirement("Core", 1, ["CS 301", "XYZ 999"])], in_progress=["MATH 180"])
+    assert _terms(plan) == [["CS 201"], ["CS 301"]]
+    assert plan["unknown_codes"] == ["XYZ 999"]
+
+
+def test_courses_that_cannot_fit_are_unreachable(planner):
+    req = [Requirement("Core", 1, ["CS 301"])]
+    short = planner.solve([], req, max_terms=2)
+    assert short["unreachable"] == ["CS 301"] and not short["complete"] and short["terms"] == []
+    capped = planner.solve([], req, max_credits=4)  # MATH 180 is 5 credits
+    assert capped["unreachable"] == ["CS 301"]
+    assert planner.solve([], req, max_credits=4, credit_overrides={"MATH 180": 4.0})["complete"]
+
+
+def test_a_course_counts_toward_one_requirement(planner):
+    plan = planner.solve([], [Requirement("A", 1, ["MATH 180"]), Requirement("B", 1, ["MATH 180", "PHYS 141"])])
+    assert plan["complete"] and _terms(plan) == [["MATH 180", "PHYS 141"]]
+    assert {r["category"]: r["planned"] for r in plan["requirements"]} == {"A": 1, "B": 1}
+    plan = planner.solve([], [Requirement("A", 1, ["MATH 180"]), Requirement("B", 1, ["MATH 180"])])
+    assert not plan["complete"] and sum(r["planned"] for r in plan["requirements"]) == 1
+
+
+def test_credit_cap_spreads_courses_over_terms(planner):
+    plan = planner.solve([], [Requirement("Gen", 3, ["CS 101", "MATH 180", "PHYS 141"])], max_credits=8)
+    assert plan["complete"] and len(plan["terms"]) == 2
+    assert all(sum(c["credits"] for c in t) <= 8 for t in plan["terms"])
+
+
+def test_invalid_bounds_raise(planner):
+    with pytest.raises(ValueError):
+        planner.solve([], [], min_credits=10, max_credits=5)
+    with pytest.raises(ValueError):
+        planner.solve([], [], max_terms=0)
+
+
+AUDIT = {"remainingRequirements": [{"category": "Core", "coursesNeeded": 1, "courses": [{"code": "CS 301"}]}]}
+
+
+def test_plan_endpoint(api):
+    body = api.app.test_client().post("/plan", json={"audit": AUDIT, "preferences": {"creditLoad": [12, 15]}}).get_json()
+    assert [[c["code"] for c in t["courses"]] for t in body["terms"]] == [["CS 101", "MATH 180"], ["CS 201"], ["CS 301"]]
+    assert body["terms"][2]["courses"][0]["title"] == "Algorithms" and body["terms"][0]["credits"] == 8
+
+
+@pytest.mark.parametrize("raw", [
+    '{"audit": %s, "max_terms": Infinity}',
+    '{"audit": %s, "max_terms": NaN}',
+    '{"audit": %s, "min_credits": -Infinity}',
+    '{"audit": %s, "max_credits": Infinity}',
+    '{"audit": %s, "time_budget_ms": Infinity}',
+    '{"audit": %s, "preferences": {"creditLoad": [12, Infinity]}}',
+])
+def test_non_finite_numbers_are_400(api, raw):
+    r = api.app.test_client().post("/plan", data=raw % json.dumps(AUDIT), content_type="application/json")
+    assert r.status_code == 400
+
+
+def test_non_finite_credits_fall_back_to_the_catalog(api):
+    audit = {"remainingRequirements": [{"category": "Core", "courses": [{"code": "MATH 180", "credits": float("nan")}]}]}
+    params = api.parse_plan_request({"audit": audit})
+    assert params["requirements"][0].needed == 1 and params["credit_overrides"] == {}
+    r = api.app.test_client().post("/plan", data=json.dumps({"audit": audit}), content_type="application/json")
+    assert r.status_code == 200 and r.get_json()["complete"]
+
+
+@pytest.mark.parametrize("needed", ["2", 1e30, 1.5, float("inf"), True, -1])
+def test_bad_courses_needed_is_400(api, needed):
+    audit = {"remainingRequirements": [{"category": "Core", "coursesNeeded": needed, "courses": ["CS 301"]}]}
+    with pytest.raises(ValueError, match="coursesNeeded"):
+        api.parse_plan_request({"audit": audit})
+    r = api.app.test_client().post("/plan", data=json.dumps({"audit": audit}), content_type="application/json")
+    assert r.status_code == 400
+
+
+def test_courses_needed_is_capped_at_the_listed_courses(api):
+    audit = {"remainingRequirements": [{"category": "Core", "coursesNeeded": 10**30, "courses": ["CS 301", "MATH 181"]}]}
+    assert api.parse_plan_request({"audit": audit})["requirements"][0].needed == 2
+
+
+@pytest.mark.parametrize("body", [None, [AUDIT], "audit"])
+def test_non_object_plan_bodies_are_400(api, body):
+    r = api.app.test_client().post("/plan", json=body)
+    assert r.status_code == 400 and "error" in r.get_json()
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from conftest import make_chunks
+from prereq_graph import PrereqGraph, _code_list, parse_code
+
+
+@pytest.fixture
+def graph(chunks):
+    return PrereqGraph(chunks)
+
+
+def _codes(graph, mask):
+    return [graph.codes[i] for i in np.flatnonzero(mask)]
+
+
+def test_parse_code_and_code_lists():
+    assert parse_code(" cs-101 ") == "CS 101" and parse_code("math180") == "MATH 180"
+    assert parse_code("calculus") is None
+    assert _code_list("['CS 101', 'math 180']") == ["CS 101", "MATH 180"]
+    assert _code_list("CS 101, PHYS141") == ["CS 101", "PHYS 141"]
+    assert _code_list("['CS 101', unbalanced") == ["CS 101"]  # falls back to a regex scan
+    assert _code_list(np.nan) == [] and _code_list("[]") == [] and _code_list(None) == []
+
+
+def test_graph_has_catalog_courses_then_referenced_ones():
+    chunks = make_chunks()
+    chunks.loc[chunks["metadata.course_code"] == "CS 201", "metadata.prereq_codes"] = "['CS 101', 'ENGL 101']"
+    g = PrereqGraph(chunks)
+    assert g.catalog_size == 6 and g.codes[6:] == ["ENGL 101"]
+    assert g.first_row[g.ids["CS 301"]] == 3 and g.first_row[g.ids["ENGL 101"]] == -1
+    assert "ENGL 101" not in _codes(g, g.eligible(g.resolve([])[0]))  # never offered: not in the catalog
+
+
+def test_eligible_requires_every_prerequisite(graph):
+    none = graph.resolve([])[0]
+    assert _codes(graph, graph.eligible(none)) == ["CS 101", "MATH 180", "PHYS 141"]
+    done, unknown = graph.resolve(["cs101", "Math 180", "XYZ 999", "nonsense"])
+    assert unknown == ["XYZ 999", "nonsense"]
+    assert _codes(graph, graph.eligible(done)) == ["CS 201", "PHYS 141"]  # completed courses drop out
+    done = graph.resolve(["CS 101", "CS 201", "MATH 180", "PHYS 141"])[0]
+    assert _codes(graph, graph.eligible(done)) == ["CS 301", "MATH 181"]
+
+
+def test_concurrent_allows_corequisites_in_the_same_term(graph):
+    done = graph.resolve(["MATH 180"])[0]
+    assert "MATH 181" not in _codes(graph, graph.eligible(done))
+    assert "MATH 181" in _codes(graph, graph.eligible(done, concurrent=True))
+    assert graph.pending_coreqs(graph.ids["MATH 181"], done) == ["PHYS 141"]
+    assert "MATH 181" not in _codes(graph, graph.eligible(graph.resolve([])[0], concurrent=True))  # MATH 180 is hard
+
+
+def test_unlocks_only_newly_eligible_courses(graph):
+    done = graph.resolve(["CS 101"])[0]
+    assert _codes(graph, graph.unlocks(done, graph.ids["CS 201"])) == []  # CS 301 still needs MATH 180
+    done = graph.resolve(["CS 101", "MATH 180"])[0]
+    assert _codes(graph, graph.unlocks(done, graph.ids["CS 201"])) == ["CS 301"]
+    assert _codes(graph, graph.unlocks(graph.resolve([])[0], graph.ids["CS 101"])) == ["CS 201"]
+
+
+def test_leads_to_is_transitive(graph):
+    assert _codes(graph, graph.leads_to(graph.ids["CS 101"])) == ["CS 201", "CS 301"]
+    assert _codes(graph, graph.leads_to(graph.ids["PHYS 141"])) == ["MATH 181"]
+    assert _codes(graph, graph.leads_to(graph.ids["CS 301"])) == []
+
+
+def test_cycles_reach_a_fixpoint():
+    catalog = [
+        ("AAA 100", "A", "X", (3, 3), ["BBB 100"], [], 1),
+        ("BBB 100", "B", "X", (3, 3), ["AAA 100"], [], 1),
+        ("CCC 100", "C", "X", (3, 3), ["BBB 100"], [], 1),
+    ]
+    g = PrereqGraph(make_chunks(catalog))
+    assert sorted(g.codes[i] for i in g.cyclic) == ["AAA 100", "BBB 100", "CCC 100"]  # on or behind the cycle
+    assert _codes(g, g.leads_to(g.ids["AAA 100"])) == ["AAA 100", "BBB 100", "CCC 100"]
+    assert _codes(g, g.eligible(g.resolve([])[0])) == []
+
+
+def test_row_mask_and_bitsets_span_words():
+    catalog = [(f"SUBJ {100 + i}", f"C{i}", "S", (3, 3), [], [], 1) for i in range(70)]
+    catalog[69] = ("SUBJ 169", "C69", "S", (3, 3), ["SUBJ 100", "SUBJ 168"], [], 1)
+    g = PrereqGraph(make_chunks(catalog))
+    assert g.words == 2
+    done = g.resolve(["SUBJ 100", "SUBJ 168"])[0]
+    assert g.members(done).tolist() == [0, 68]
+    assert g.eligible(done)[69] and not g.eligible(g.resolve(["SUBJ 100"])[0])[69]
+    rows = g.row_mask(g.leads_to(g.ids["SUBJ 168"]))
+    assert np.flatnonzero(rows).tolist() == [69]
+
+
+def test_eligible_and_unlocks_endpoints(api):
+    client = api.app.test_client()
+    r = client.post("/eligible", json={"completed": ["MATH 180"], "concurrent": True, "subject": "math"})
+    body = r.get_json()
+    assert r.status_code == 200 and [c["course_code"] for c in body["eligible"]] == ["MATH 181"]
+    assert body["eligible"][0]["pending_coreqs"] == ["PHYS 141"]
+
+    body = client.post("/unlocks", json={"course": "cs101"}).get_json()
+    assert body["course"] == "CS 101"
+    assert [c["course_code"] for c in body["unlocks"]] == ["CS 201"]
+    assert [c["course_code"] for c in body["leads_to"]] == ["CS 201", "CS 301"]
+    assert client.post("/unlocks", json={"course": "XYZ 999"}).status_code == 404
+
+
+BAD_BODIES = [
+    ("/eligible", None),
+    ("/eligible", [1]),
+    ("/eligible", "CS 101"),
+    ("/eligible", {"completed": "CS 101"}),
+    ("/eligible", {"completed": [101]}),
+    ("/eligible", {"concurrent": "yes"}),
+    ("/eligible", {"subject": 5}),
+    ("/unlocks", {}),
+    ("/unlocks", ["CS 101"]),
+    ("/unlocks", "CS 101"),
+    ("/unlocks", {"course": "  "}),
+    ("/unlocks", {"course": "CS 101", "completed": ["CS 101", None]}),
+]
+
+
+@pytest.mark.parametrize("path, body", BAD_BODIES)
+def test_bad_bodies_are_400(api, path, body):
+    r = api.app.test_client().post(path, json=body)
+    assert r.status_code == 400 and "error" in r.get_json()
+
+
+@pytest.mark.parametrize("path, body", BAD_BODIES)
+def test_asgi_bad_bodies_are_400(api, path, body):
+    from starlette.testclient import TestClient
+    import asgi
+
+    r = TestClient(asgi.app).post(path, json=body)  # no lifespan: the api fixture already loaded the index
+    assert r.status_code == 400 and "error" in r.json()
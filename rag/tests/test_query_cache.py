@@ -0,0 +1,71 @@
+import query_cache
+from query_cache import TTLCache, normalize_query
+
+
+def test_get_put_and_stats():
+    cache = TTLCache(maxsize=4, ttl=60)
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b", "miss") == "miss"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 1)
+    assert stats["hit_rate"] == round(1 / 3, 4)
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=4, ttl=10)
+    cache.put("a", 1)
+    now[0] += 9.9
+    assert cache.get("a") == 1
+    now[0] += 0.2
+    assert cache.get("a") is None
+    assert len(cache) == 0 and cache.evictions == 1
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = TTLCache(maxsize=0)
+    cache.put("a", 1)
+    assert len(cache) == 0 and cache.get("a") is None
+
+
+def test_clear():
+    cache = TTLCache()
+    cache.put("a", 1)
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_normalize_query_folds_whitespace_only_by_default():
+    assert normalize_query("  Intro   to\tML ") == "Intro to ML"
+    assert normalize_query("US history") != normalize_query("us history")
+
+
+def test_normalize_query_folds_case_for_uncased_encoders():
+    assert normalize_query("  Intro   to\tML ", lowercase=True) == "intro to ml"
+    assert normalize_query("Intro to ML", True) == normalize_query("intro to ml", True)
+
+
+def test_cache_keys_fold_case_only_for_uncased_encoders(api):
+    api.retrieve_and_group("Calculus", 3)
+    api.retrieve_and_group("calculus", 3)
+    assert len(api.results_cache) == 2  # the stand-in encoder has no lowercasing tokenizer
+
+    api.results_cache.clear()
+    api.bundle = api.bundle._replace(uncased=True)
+    api.retrieve_and_group("Calculus", 3)
+    api.retrieve_and_group("calculus  ", 3)
+    assert len(api.results_cache) == 1
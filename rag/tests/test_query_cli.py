@@ -0,0 +1,43 @@
+import json
+
+import faiss
+
+import query
+
+
+def test_run_queries_file_writes_one_line_per_query(tmp_path, chunks, encoder):
+    index = faiss.IndexFlatIP(encoder.dim)
+    index.add(encoder.encode(chunks["text"].tolist()))
+    queries = tmp_path / "queries.txt"
+    queries.write_text("data structures\n\ncalculus\n")
+
+    query.run_queries_file(str(queries), None, index.search, chunks, encoder, k=10, top_courses=2)
+
+    lines = [json.loads(ln) for ln in (tmp_path / "queries.results.jsonl").read_text().splitlines()]
+    assert [ln["query"] for ln in lines] == ["data structures", "calculus"]
+    assert all(ln["count"] == len(ln["results"]) <= 2 for ln in lines)
+    assert lines[0]["results"][0]["course_code"] == "CS 201"
+    assert lines[1]["results"][0]["course_code"] in ("MATH 180", "MATH 181")
+
+
+def test_batch_retrieval_matches_one_at_a_time(chunks, encoder):
+    index = faiss.IndexFlatIP(encoder.dim)
+    index.add(encoder.encode(chunks["text"].tolist()))
+    qs = ["programming", "physics", "algorithms"]
+    batch = query.retrieve_chunks_batch(qs, 5, index.search, chunks, encoder)
+    for q, got in zip(qs, batch):
+        one = query.retrieve_chunks(q, 5, index.search, chunks, encoder)
+        assert got["id"].tolist() == one["id"].tolist()
+        assert got["score"].tolist() == one["score"].tolist()
+
+
+def test_batch_courses_widen_k_like_one_at_a_time(chunks, encoder):
+    index = faiss.IndexFlatIP(encoder.dim)
+    index.add(encoder.encode(chunks["text"].tolist()))
+    qs = ["programming", "calculus", "physics"]
+    batch = query.retrieve_courses_batch(qs, 1, 3, index.search, chunks, encoder)
+    for q, (got_chunks, got_courses) in zip(qs, batch):
+        one_chunks, one_courses = query.retrieve_courses(q, 1, 3, index.search, chunks, encoder)
+        assert len(got_chunks) == 4 and len(got_courses) == 3  # k=1 found one course; widened once to 4
+        assert got_chunks["id"].tolist() == one_chunks["id"].tolist()
+        assert got_courses["course_code"].tolist() == one_courses["course_code"].tolist()
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from query_expansion import TOPIC_SYNONYMS, QueryExpander, expand_query
+
+
+def test_overlapping_keys_at_the_same_offset_all_match():
+    ex = QueryExpander({r"\bdata\b": ["d"], r"\bdata science\b": ["ds"], r"\bscience\b": ["s"]})
+    assert ex.matched_groups("Intro to Data Science") == [0, 1, 2]
+    assert ex.expand("data science") == "data science | d ; ds ; s"
+    assert ex.matched_groups("database") == []
+
+
+def test_default_topics_match_whole_words_case_insensitively():
+    ex = QueryExpander()
+    keys = list(TOPIC_SYNONYMS)
+    assert ex.matched_groups("NLP and ML") == [keys.index(r"\bnlp\b"), keys.index(r"\bml\b|\bmachine learning\b")]
+    assert ex.matched_groups("html") == []
+    assert ex.matched_groups("stats or econ") == sorted(
+        keys.index(k) for k in (r"\bstats?\b|\bstatistics\b", r"\boptimization\b|\boperations research\b|\bor\b",
+                                r"\beconomics?\b|\becon\b"))
+
+
+def test_expand_keeps_the_query_and_dedupes_phrases():
+    ex = QueryExpander({r"\ba\b": ["x", "y"], r"\bb\b": ["y", "z"]})
+    assert ex.expand("a b") == "a b | x ; y ; z"
+    assert ex.expand("nothing here") == "nothing here"
+    assert expand_query("tableau").startswith("tableau | data visualization")
+
+
+def test_invalid_settings_are_rejected():
+    with pytest.raises(ValueError, match="Unknown expansion mode"):
+        QueryExpander(mode="both")
+    with pytest.raises(ValueError, match="query_weight"):
+        QueryExpander(query_weight=1.5)
+
+
+def test_prepare_per_mode():
+    queries = ["nlp course", "pottery"]
+    texts, matched = QueryExpander(mode="concat").prepare(queries)
+    assert texts[0].startswith("nlp course | ") and texts[1] == "pottery" and matched is None
+    assert QueryExpander(mode="none").prepare(queries) == (queries, None)
+    texts, matched = QueryExpander(mode="vector").prepare(queries)
+    assert texts == queries and matched == [[0], []]
+
+
+def test_group_vectors_are_normalized_and_encoded_once_per_model(encoder):
+    ex = QueryExpander({r"\ba\b": ["alpha beta", "gamma"], r"\bb\b": ["delta"]}, mode="vector")
+    vecs = ex.group_vectors(encoder)
+    assert vecs.shape == (2, encoder.dim)
+    np.testing.assert_allclose(np.linalg.norm(vecs, axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_allclose(vecs[1], encoder.encode(["delta"])[0], rtol=1e-6)
+    assert ex.group_vectors(encoder) is vecs and encoder.calls == 2  # one for the groups, one above
+
+
+def test_combine_blends_only_queries_with_matched_groups():
+    ex = QueryExpander({r"\ba\b": ["p"], r"\bb\b": ["q"]}, mode="vector", query_weight=0.5)
+    q = np.array([[1, 0, 0], [1, 0, 0]], dtype="float32")
+    groups = np.array([[0, 1, 0], [0, 0, 1]], dtype="float32")
+    out = ex.combine(q, [[0, 1], []], groups)
+    topic = np.array([0, 1, 1]) / np.sqrt(2)
+    expected = 0.5 * np.array([1, 0, 0]) + 0.5 * topic
+    np.testing.assert_allclose(out[0], expected / np.linalg.norm(expected), rtol=1e-6)
+    np.testing.assert_allclose(out[1], q[1])
+    np.testing.assert_allclose(q[0], [1, 0, 0])  # input left untouched
+
+
+def test_encode_vector_mode_encodes_only_the_raw_query(encoder):
+    ex = QueryExpander({r"\bml\b": ["machine learning"]}, mode="vector", query_weight=1.0)
+    np.testing.assert_allclose(ex.encode(encoder, ["ml basics"]), encoder.encode(["ml basics"]), rtol=1e-6)
@@ -0,0 +1,54 @@
+import json
+
+import faiss
+import pytest
+
+from course_table import CourseTable
+from run_benchmarks import BENCH_DIR, STAGES, check_budgets, percentiles, run_query, score_query
+
+
+def test_score_query():
+    assert score_query(["A", "B", "C"], ["C", "D"]) == {"recall": 0.5, "rr": 1 / 3, "rank": 3}
+    assert score_query(["A"], ["B"]) == {"recall": 0.0, "rr": 0.0, "rank": None}
+
+
+def test_percentiles_are_milliseconds():
+    p = percentiles([0.001, 0.002, 0.003])
+    assert p["mean"] == 2.0 and p["p50"] == 2.0
+
+
+def test_check_budgets_reports_each_violation():
+    report = {"quality": {"mrr": 0.4}, "latency_ms": {"total": {"p95": 10}}}
+    budgets = {"checks": [
+        {"metric": "quality.mrr", "min": 0.5},
+        {"metric": "latency_ms.total.p95", "max": 60},
+        {"metric": "latency_ms.total.p95", "min": 20, "max": 5},
+    ]}
+    assert check_budgets(report, budgets) == [
+        "quality.mrr = 0.4 < min 0.5",
+        "latency_ms.total.p95 = 10 < min 20",
+        "latency_ms.total.p95 = 10 > max 5",
+    ]
+
+
+def test_run_query_times_every_stage(chunks, encoder):
+    index = faiss.IndexFlatIP(encoder.dim)
+    index.add(encoder.encode(chunks["text"].tolist()))
+    results, t = run_query("calculus", 3, index, encoder, CourseTable(chunks))
+    assert 0 < len(results) <= 3
+    assert set(t) == set(STAGES) and t["total"] >= t["encode"] + t["search"] + t["group"]
+
+
+@pytest.mark.parametrize("path", sorted((BENCH_DIR / "golden").glob("golden_queries_v*.json")), ids=lambda p: p.name)
+def test_golden_sets_are_well_formed(path):
+    queries = json.loads(path.read_text())["queries"]
+    assert len({q["id"] for q in queries}) == len(queries)
+    assert all(q["query"].strip() and q["expected"] for q in queries)
+
+
+def test_budget_metrics_exist_in_reports():
+    budgets = json.loads((BENCH_DIR / "budgets.json").read_text())
+    for chk in budgets["checks"]:
+        section = chk["metric"].split(".")[0]
+        assert section in ("quality", "latency_ms", "memory"), chk
+        assert "min" in chk or "max" in chk
@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from conftest import CATALOG, make_chunks, write_index_dir
+from course_table import CourseTable
+from shards import ShardSet, ShardUnavailable, group_hits, load_manifest, merge_hits, register_shard
+
+
+def test_merge_hits_is_the_global_top_k():
+    rng = np.random.default_rng(0)
+    scores = rng.random(30).astype("float32")
+    parts = [(scores[:10], np.arange(10)), (scores[10:25], np.arange(15)), (scores[25:], np.arange(5))]
+    s, shard_nos, rows = merge_hits(parts, 7)
+    top = np.argsort(-scores)[:7]
+    np.testing.assert_array_equal(s, scores[top])
+    starts = np.array([0, 10, 25])
+    np.testing.assert_array_equal(starts[shard_nos] + rows, top)
+
+
+def test_merge_hits_skips_missing_rows_and_keeps_shard_order_on_ties():
+    s, shard_nos, rows = merge_hits([([0.5, 0.0], [3, -1]), ([0.5, 0.4], [1, 2]), ([], [])], 10)
+    assert s.tolist() == [0.5, 0.5, pytest.approx(0.4)]
+    assert shard_nos.tolist() == [0, 1, 1] and rows.tolist() == [3, 1, 2]
+
+
+def test_group_hits_keeps_same_parent_ids_of_different_shards_apart():
+    chunks = make_chunks()
+    tables = [CourseTable(chunks), CourseTable(chunks)]  # identical parent ids in both shards
+    scores, shard_nos, rows = merge_hits([([0.9, 0.8], [0, 1]), ([0.85, 0.7], [0, 2])], 10)
+    grouped = group_hits(tables, scores, shard_nos, rows, 3)
+    assert [(s, r["course_code"]) for s, r in grouped] == [(0, "CS 101"), (1, "CS 101"), (1, "CS 201")]
+    assert grouped[0][1]["score"] == pytest.approx(0.9)
+    assert group_hits(tables, *merge_hits([([], [])], 5), 3) == []
+
+
+def test_manifest_paths_default_and_select(tmp_path):
+    path = tmp_path / "shards.json"
+    path.write_text(json.dumps({"shards": {"a": {"path": "idx/a", "term": "Fall"}, "b": {"path": str(tmp_path / "b")}}}))
+    m = load_manifest(path)
+    assert m.default == "a" and len(m) == 2
+    assert m.path("a") == (tmp_path / "idx" / "a").resolve() and m.shards["a"].info == {"term": "Fall"}
+    assert m.select(None) is None
+    assert m.select("b") == ("b",) and m.select(["b", "a", "b"]) == ("b", "a") and m.select("*") == ("a", "b")
+    for raw in ([], 5, ["a", 1], "c"):
+        with pytest.raises(ValueError):
+            m.select(raw)
+    with pytest.raises(ValueError, match="single"):
+        m.select("*", single=True)
+
+
+@pytest.mark.parametrize("raw", [[], {"shards": {}}, {"shards": {"a": {}}}, {"shards": {"a": {"path": "x"}}, "default": "z"}])
+def test_malformed_manifests_are_rejected(tmp_path, raw):
+    (tmp_path / "shards.json").write_text(json.dumps(raw))
+    with pytest.raises(ValueError):
+        load_manifest(tmp_path / "shards.json")
+
+
+def test_register_shard_keeps_the_first_default_and_extra_keys(tmp_path):
+    path = tmp_path / "processed" / "shards.json"
+    register_shard(path, "fall", tmp_path / "processed" / "shards" / "fall")
+    raw = json.loads(path.read_text())
+    raw["shards"]["fall"]["term"] = "Fall 2025"
+    path.write_text(json.dumps(raw))
+    register_shard(path, "spring", tmp_path / "elsewhere")
+    register_shard(path, "fall", tmp_path / "processed" / "fall-v2")
+    raw = json.loads(path.read_text())
+    assert raw["default"] == "fall"
+    assert raw["shards"]["fall"] == {"path": "fall-v2", "term": "Fall 2025"}
+    assert raw["shards"]["spring"]["path"] == (tmp_path / "elsewhere").resolve().as_posix()
+    assert load_manifest(path).path("fall") == (tmp_path / "processed" / "fall-v2").resolve()
+
+
+def test_shard_set_drops_the_least_recently_used():
+    loaded = []
+    s = ShardSet(lambda name: loaded.append(name) or name.upper(), max_resident=2)
+    assert s.get("a") == "A" and s.get("b") == "B"
+    s.get("a")
+    s.get("c")  # evicts b, the least recently used
+    assert s.resident() == ["a", "c"] and s.get("a") == "A"
+    s.get("b")
+    assert loaded == ["a", "b", "c", "b"]
+    assert s.stats() == {"resident": ["a", "b"], "max_resident": 2, "loads": 4, "evictions": 2}
+
+
+def test_concurrent_requests_load_a_shard_once():
+    calls = []
+
+    def slow(name):
+        calls.append(name)
+        time.sleep(0.05)
+        return object()
+
+    s = ShardSet(slow, 4)
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(s.get("a"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["a"] and len({id(o) for o in out}) == 1
+
+
+def test_failed_load_is_shard_unavailable_and_retried():
+    attempts = []
+
+    def flaky(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise FileNotFoundError("no index")
+        return name
+
+    s = ShardSet(flaky, 1)
+    with pytest.raises(ShardUnavailable, match="'x' could not be loaded"):
+        s.get("x")
+    assert s.get("x") == "x" and s.resident() == ["x"]
+
+
+@pytest.fixture
+def sharded(api, monkeypatch, encoder):
+    """`api` serving a manifest: "cs" (the loaded default index) and "sci" (MATH + PHYS courses only)."""
+    sci = [c for c in CATALOG if not c[0].startswith("CS")]
+    write_index_dir(api.DATA_DIR / "sci", make_chunks(sci), encoder, version="sci-v1")
+    path = api.DATA_DIR / "shards.json"
+    path.write_text(json.dumps({"default": "cs", "shards": {"cs": {"path": "index"}, "sci": {"path": "sci", "term": "Fall"}}}))
+    monkeypatch.setattr(api, "manifest", load_manifest(path))
+    monkeypatch.setattr(api, "shards", ShardSet(api._load_shard, 1))
+    return api
+
+
+def test_query_fans_out_over_named_shards(sharded):
+    client = sharded.app.test_client()
+    body = client.post("/query", json={"query": "calculus", "top_courses": 6, "shards": "*"}).get_json()
+    by_shard = {}
+    for r in body["results"]:
+        by_shard.setdefault(r["shard"], []).append(r["course_code"])
+    assert set(by_shard["sci"]) <= {"MATH 180", "MATH 181", "PHYS 141"} and "MATH 180" in by_shard["sci"]
+    assert body["count"] == 6 and "cs" in by_shard
+
+    listing = client.get("/shards").get_json()
+    assert listing["default"] == "cs"
+    assert {s["name"]: s["resident"] for s in listing["shards"]} == {"cs": True, "sci": True}
+    assert client.post("/query", json={"query": "x", "shards": "nope"}).status_code == 400
+    assert client.post("/eligible", json={"shards": ["cs", "sci"]}).status_code == 400
+
+
+def test_missing_shard_is_503(sharded):
+    import shutil
+    shutil.rmtree(sharded.DATA_DIR / "sci")
+    r = sharded.app.test_client().post("/query", json={"query": "calculus", "shards": "sci"})
+    assert r.status_code == 503
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from ann_index import build_index
+from course_table import CourseTable
+from similar_courses import (
+    SIMILAR_NAME, SimilarCourses, build_similarity_arrays, course_vectors, load_similar_courses,
+    nearest_courses, write_similarity_index,
+)
+
+
+def _brute_force(vecs, k):
+    sims = vecs @ vecs.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1, kind="stable")[:, :k]
+
+
+def test_course_vectors_average_chunks_per_course(chunks, vectors):
+    keys, vecs = course_vectors(chunks, vectors)
+    assert keys.tolist() == ["cs-101", "cs-201", "cs-301", "math-180", "math-181", "phys-141"]
+    mean = vectors[0] + vectors[1]
+    np.testing.assert_allclose(vecs[0], mean / np.linalg.norm(mean), rtol=1e-5)
+    np.testing.assert_allclose(vecs[1], vectors[2], rtol=1e-5)
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 1024])
+def test_nearest_courses_match_brute_force_across_blocks(block_size):
+    rng = np.random.default_rng(1)
+    vecs = rng.standard_normal((25, 8)).astype("float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    rows, scores = nearest_courses(vecs, 5, block_size=block_size)
+    assert rows.shape == (25, 5) and rows.dtype == np.int32
+    np.testing.assert_array_equal(rows, _brute_force(vecs, 5))
+    assert np.all(np.diff(scores, axis=1) <= 0) and not np.any(rows == np.arange(25)[:, None])
+
+
+def test_k_is_capped_at_the_other_courses():
+    vecs = np.eye(3, dtype="float32")
+    assert nearest_courses(vecs, 10)[0].shape == (3, 2)
+    assert nearest_courses(vecs[:1], 10)[0].shape == (1, 0)
+
+
+def test_lookup_by_course_code(chunks, vectors):
+    table = CourseTable(chunks)
+    similar = SimilarCourses(build_similarity_arrays(chunks, vectors, n_neighbors=3), table)
+    assert len(similar) == 6 and similar.k == 3
+    i, rows, scores = similar.lookup("MATH 181")
+    assert i == 4 and len(rows) == 3 and 4 not in rows.tolist()
+    assert len(similar.lookup("MATH 181", 1)[1]) == 1
+    assert similar.lookup("XYZ 999") is None
+
+
+def test_stored_graph_is_only_used_with_its_own_catalog(tmp_path, chunks, vectors):
+    write_similarity_index(chunks, vectors, tmp_path, n_neighbors=2)
+    assert (tmp_path / SIMILAR_NAME).exists()
+    assert load_similar_courses(tmp_path, CourseTable(chunks)).k == 2
+    other = chunks[chunks["metadata.parent_id"] != "phys-141"]
+    assert load_similar_courses(tmp_path, CourseTable(other)) is None
+
+
+def test_missing_file_falls_back_to_the_index_vectors(tmp_path, chunks, vectors):
+    table = CourseTable(chunks)
+    flat, _ = build_index(vectors, "flat")
+    similar = load_similar_courses(tmp_path, table, flat)
+    expected = SimilarCourses(build_similarity_arrays(chunks, vectors), table)
+    np.testing.assert_array_equal(similar.neighbors, expected.neighbors)
+    assert load_similar_courses(tmp_path, table) is None
+
+
+def test_similar_endpoint(api):
+    client = api.app.test_client()
+    body = client.get("/similar/cs101?k=2").get_json()
+    assert body["course"]["course_code"] == "CS 101" and body["count"] == 2
+    assert "CS 101" not in [c["course_code"] for c in body["similar"]]
+    assert client.get("/similar/XYZ%20999").status_code == 404
+    for k in ("0", "abc", "999"):
+        assert client.get(f"/similar/CS%20101?k={k}").status_code == 400
@@ -0,0 +1,90 @@
+import faiss
+import numpy as np
+import pytest
+
+from ann_index import RERANK_NAME, RerankIndex, _projection, build_index, bytes_per_vector, first_pass, read_index, write_index
+from conftest import make_chunks, write_index_dir
+
+
+@pytest.fixture(scope="module")
+def embs():
+    rng = np.random.default_rng(2)
+    x = rng.standard_normal((3000, 32)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("storage, code_size", [("float16", 64), ("int8", 32)])
+def test_compact_storage_reranks_at_full_precision(embs, storage, code_size):
+    index, cfg = build_index(embs, "flat", storage=storage, rerank_factor=4)
+    assert isinstance(index, RerankIndex) and bytes_per_vector(index) == code_size
+    assert cfg["build"] == {"storage": storage, "dim": 32} and cfg["rerank"] == {"file": RERANK_NAME, "factor": 4}
+    queries = embs[:50]
+    scores, idxs = index.search(queries, 10)
+    np.testing.assert_allclose(scores, np.einsum("qd,qkd->qk", queries, embs[idxs]), rtol=1e-5)
+    assert (idxs[:, 0] == np.arange(50)).all()
+    _, truth = faiss.knn(queries, embs, 10, metric=faiss.METRIC_INNER_PRODUCT)
+    assert np.mean([len(set(a) & set(b)) / 10 for a, b in zip(truth, idxs)]) > 0.95
+
+
+def test_projection_keeps_inner_products_within_the_subspace():
+    rng = np.random.default_rng(3)
+    basis = np.linalg.qr(rng.standard_normal((16, 4)))[0]  # data lives in 4 of 16 dimensions
+    x = (rng.standard_normal((500, 4)) @ basis.T).astype("float32")
+    lt, energy = _projection(x, 4)
+    assert energy == pytest.approx(1.0, abs=1e-6)
+    y = lt.apply(x)
+    np.testing.assert_allclose(y @ y.T, x @ x.T, atol=1e-3)
+    A = faiss.vector_to_array(lt.A).reshape(4, 16)
+    np.testing.assert_allclose(A @ A.T, np.eye(4), atol=1e-5)
+    assert 0 < _projection(x, 2)[1] < 1
+
+
+def test_projected_int8_records_the_energy_kept(embs):
+    index, cfg = build_index(embs, "flat", storage="int8", project_dim=16)
+    assert cfg["build"]["dim"] == 16 and 0 < cfg["build"]["energy_kept"] < 1
+    assert bytes_per_vector(index) == 16 and index.d == 32
+    hits = lambda idxs: int((idxs[:, 0] == np.arange(100)).sum())
+    # the exact re-score finds the query's own vector more often than the projected int8 scores alone
+    assert hits(index.search(embs[:100], 10)[1]) > hits(first_pass(index).search(embs[:100], 10)[1])
+
+
+@pytest.mark.parametrize("params, match", [
+    ({"storage": "bf16"}, "Unknown vector storage"),
+    ({"project_dim": 16}, "needs --vectors float16 or int8"),
+    ({"storage": "int8", "project_dim": 64}, "between 1 and dim"),
+])
+def test_invalid_storage_settings(embs, params, match):
+    with pytest.raises(ValueError, match=match):
+        build_index(embs, "flat", **params)
+    with pytest.raises(ValueError, match="needs --index-type flat"):
+        build_index(embs, "hnsw", storage="int8")
+
+
+def test_short_candidate_lists_are_padded():
+    embs = np.eye(3, dtype="float32")
+    index, _ = build_index(embs, "flat", storage="float16", rerank_factor=1)
+    scores, idxs = index.search(embs[:1], 5)
+    assert idxs[0].tolist()[:3] == [0, 1, 2] and idxs[0, 3:].tolist() == [-1, -1]
+    np.testing.assert_array_equal(index.reconstruct_n(1, 2), embs[1:])
+
+
+def test_side_file_round_trip(tmp_path, embs):
+    index, cfg = build_index(embs, "flat", storage="int8", rerank_factor=3)
+    paths = write_index(index, tmp_path / "faiss.index")
+    assert paths == [tmp_path / "faiss.index", tmp_path / RERANK_NAME]
+    loaded = read_index(tmp_path / "faiss.index", {"index": cfg})
+    assert isinstance(loaded, RerankIndex) and loaded.factor == 3
+    assert isinstance(loaded.vectors, np.memmap)
+    np.testing.assert_array_equal(loaded.search(embs[:10], 5)[1], index.search(embs[:10], 5)[1])
+    assert isinstance(first_pass(loaded), faiss.IndexScalarQuantizer)
+
+    write_index(build_index(embs, "flat")[0], tmp_path / "faiss.index")
+    assert not (tmp_path / RERANK_NAME).exists()  # a plain rebuild leaves no stale side file
+
+
+def test_api_serves_a_compact_index(api, encoder):
+    write_index_dir(api.DATA_DIR / "index", make_chunks(), encoder, version="int8", storage="int8")
+    assert api.load_index() and isinstance(api.bundle.index, RerankIndex)
+    results = api.retrieve_and_group("data structures", 2)
+    assert results[0]["course_code"] == "CS 201"
+    assert api.bundle.similar is not None  # built from the side file's vectors
@@ -0,0 +1,60 @@
+import json
+
+from metrics import Registry
+from worker_sync import WorkerSync
+
+
+def test_reload_announced_by_one_worker_reaches_the_others(tmp_path):
+    a, b = WorkerSync(tmp_path, check_secs=0), WorkerSync(tmp_path, check_secs=0)
+    assert a.pending_reload() is None and b.pending_reload() is None
+    a.announce_reload()
+    assert a.pending_reload() is None  # the announcing worker loads on its own
+    token = b.pending_reload()
+    assert token is not None
+    assert b.pending_reload() == token  # until the reload actually starts
+    b.reload_started(token)
+    assert b.pending_reload() is None
+
+
+def test_workers_forked_after_a_reload_do_not_repeat_it(tmp_path):
+    WorkerSync(tmp_path, check_secs=0).announce_reload()
+    assert WorkerSync(tmp_path, check_secs=0).pending_reload() is None
+
+
+def test_reload_checks_are_rate_limited(tmp_path):
+    a, b = WorkerSync(tmp_path), WorkerSync(tmp_path, check_secs=60)
+    assert b.pending_reload() is None  # first check: nothing yet
+    a.announce_reload()
+    assert b.pending_reload() is None  # next check not due for a minute
+
+
+def test_metrics_are_summed_over_workers(tmp_path):
+    def worker():
+        reg = Registry()
+        return reg, reg.counter("hits_total", "Hits", ("route",)), reg.histogram("secs", "Secs", buckets=(1.0,))
+
+    mine, hits, secs = worker()
+    hits.inc("/query", amount=2)
+    secs.observe(0.5)
+    other, other_hits, other_secs = worker()
+    other_hits.inc("/query")
+    other_hits.inc("/plan")
+    other_secs.observe(2.0)
+    (tmp_path / "metrics-1.json").write_text(json.dumps(other.snapshot()))
+    (tmp_path / "metrics-2.json").write_text("{not json")  # half-written files are skipped
+
+    sync = WorkerSync(tmp_path)
+    sync.publish(mine.snapshot)
+    snapshots = sync.others()
+    assert len(snapshots) == 1  # its own file is not counted twice
+    out = mine.render(snapshots).splitlines()
+    assert 'hits_total{route="/query"} 3.0' in out
+    assert 'hits_total{route="/plan"} 1.0' in out
+    assert 'secs_bucket{le="1.0"} 1' in out and 'secs_count 2' in out
+
+
+def test_single_process_is_a_no_op():
+    sync = WorkerSync(None)
+    sync.announce_reload()
+    sync.publish(dict)
+    assert not sync.enabled and sync.pending_reload() is None and sync.others() == []
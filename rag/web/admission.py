@@ -0,0 +1,186 @@
+"""
+Bounded, batching inference executor for the ASGI server (asgi.py).
+
+A fixed number of worker threads (sized to the machine's cores) run model
+encode + FAISS search. Each worker takes everything queued when it becomes
+free, up to `max_batch` jobs, and runs them as one batch, so batches grow
+with load without any added wait when the server is idle.
+
+At most `max_pending` jobs may be admitted (queued or running) at once;
+beyond that run() fails immediately with Overloaded, so a burst turns into
+fast 503s instead of an ever-growing queue. Each job carries a deadline:
+a job whose deadline passes while it is still queued is removed and never
+runs.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class Overloaded(Exception):
+    """Admission refused; `retry_after` is a suggested wait in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """Runs `process_batch(items)` (one result per item, in order) on `workers` threads.
+
+    A batch that raises is retried item by item, so one bad job fails alone.
+    """
+
+    def __init__(self, process_batch, workers: int, max_pending: int, max_batch: int = 32):
+        self.process_batch = process_batch
+        self.workers = max(1, int(workers))
+        self.max_pending = max(self.workers, int(max_pending))
+        self.max_batch = max(1, int(max_batch))
+        self._cv = threading.Condition()
+        self._jobs = deque()  # (future, item, deadline); futures compare by identity
+        self._running = 0
+        self._threads = []
+        self._pid = None
+        self._batch_secs = 0.05  # moving average of batch run time, for Retry-After
+        self.admitted = self.rejected = self.expired = self.completed = self.batches = 0
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained (1..30)."""
+        batches = math.ceil((len(self._jobs) + self._running) / self.max_batch / self.workers)
+        return int(min(30, max(1, math.ceil(batches * self._batch_secs))))
+
+    def _ensure_workers(self):
+        # Threads do not survive fork, so (re)start them in each worker process
+        if self._pid == os.getpid():
+            return
+        with self._cv:
+            if self._pid == os.getpid():
+                return
+            self._jobs.clear()
+            self._running = 0
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"infer-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for t in self._threads:
+                t.start()
+
+    def _take(self):
+        """Block for work; return up to max_batch live jobs (expired/cancelled ones are dropped)."""
+        with self._cv:
+            while True:
+                while not self._jobs:
+                    self._cv.wait()
+                now = time.monotonic()
+                batch = []
+                while self._jobs and len(batch) < self.max_batch:
+                    fut, item, deadline = self._jobs.popleft()
+                    if not fut.set_running_or_notify_cancel():
+                        continue  # caller gave up
+                    if deadline is not None and now >= deadline:
+                        self.expired += 1
+                        fut.set_exception(DeadlineExceeded("Deadline passed while queued"))
+                    else:
+                        batch.append((item, fut))
+                if batch:
+                    self._running += len(batch)
+                    return batch
+
+    def _call(self, items: list) -> list:
+        results = self.process_batch(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"batch returned {len(results)} results for {len(items)} items")
+        return results
+
+    def _process(self, items: list) -> list:
+        """[(True, result) or (False, exception)] per item.
+
+        When the batch raises, its items are run again one at a time, so only
+        the jobs that fail on their own get the exception.
+        """
+        try:
+            return [(True, r) for r in self._call(items)]
+        except Exception as e:
+            if len(items) == 1:
+                return [(False, e)]
+        out = []
+        for item in items:
+            try:
+                out.append((True, self._call([item])[0]))
+            except Exception as e:
+                out.append((False, e))
+        return out
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            t0 = time.perf_counter()
+            outcomes = self._process([item for item, _ in batch])
+            secs = time.perf_counter() - t0
+            with self._cv:
+                self._running -= len(batch)
+                self._batch_secs = 0.9 * self._batch_secs + 0.1 * secs
+                self.batches += 1
+                self.completed += len(batch)
+            for (_, fut), (ok, value) in zip(batch, outcomes):
+                if ok:
+                    fut.set_result(value)
+                else:
+                    fut.set_exception(value)
+
+    async def run(self, item, deadline: float = None):
+        """Queue `item` and await its result; `deadline` is a time.monotonic() timestamp.
+
+        Raises Overloaded when max_pending jobs are already admitted and
+        DeadlineExceeded when the deadline passes first (a job still queued is
+        withdrawn; one already running finishes but its result is dropped).
+        """
+        self._ensure_workers()
+        fut = Future()
+        job = (fut, item, deadline)
+        with self._cv:
+            if len(self._jobs) + self._running >= self.max_pending:
+                self.rejected += 1
+                raise Overloaded(self.retry_after())
+            self._jobs.append(job)
+            self.admitted += 1
+            self._cv.notify()
+
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), timeout)
+        except asyncio.TimeoutError:
+            with self._cv:
+                try:
+                    self._jobs.remove(job)
+                    self.expired += 1
+                except ValueError:
+                    pass  # already taken by a worker
+            fut.cancel()
+            raise DeadlineExceeded("Deadline exceeded")
+
+    def stats(self) -> dict:
+        with self._cv:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "max_batch": self.max_batch,
+                "queued": len(self._jobs),
+                "running": self._running,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "completed": self.completed,
+                "batches": self.batches,
+                "avg_batch_size": round(self.completed / self.batches, 2) if self.batches else 0.0,
+            }
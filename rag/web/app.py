@@ -4,99 +4,187 @@ Provides a /query endpoint that accepts course-related questions
 and returns relevant course recommendations using the FAISS index.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, has_request_context, request, jsonify
 from flask_cors import CORS
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import base64
 import json
-import re
+import math
+import secrets
 import time
 import threading
 
-import faiss
 import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer
 import os
+import sys
+
+# Shared index helpers live in rag/src (also used by build_index.py / query.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from ann_index import apply_search_params, content_version, read_index
+from course_table import CourseTable
+from encoders import encoder_config, encoder_key, is_uncased, load_encoder
+from filters import FilterIndex, parse_filters
+from lexical_index import DEFAULT_LEXICAL_WEIGHT, RETRIEVAL_MODES, HybridRetriever, load_lexical_index
+from metadata_store import STORE_DIRNAME, has_chunk_table, load_chunk_table
+from pagination import HitPager
+from plan_optimizer import DEFAULT_MAX_TERMS, PlanOptimizer, Requirement
+from prereq_graph import PrereqGraph, parse_code
+from shards import MANIFEST_NAME, ShardSet, ShardUnavailable, group_hits, load_manifest, merge_hits
+from similar_courses import load_similar_courses
+from query_expansion import DEFAULT_QUERY_WEIGHT, QueryExpander, TOPIC_SYNONYMS, expand_query  # noqa: F401
+
+from coalescer import QueryCoalescer
+from metrics import Registry, StageTimer, server_timing
+from query_cache import TTLCache, normalize_query
+from worker_sync import WorkerSync
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
 
-# Global variables for index and model
-index = None
-chunks_df = None
-model = None
-config = None
+# Everything a query reads, loaded together and never mutated afterwards.
+#   course_table  parent-id array + per-course summaries for fast grouping
+#   filter_index  subject / no-prereq bitmaps + credit arrays for filtered search
+#   prereqs       prerequisite graph with closure bitsets (/eligible, /unlocks, "completed" filter)
+#   planner       multi-term plan search over prereqs + per-course credits (/plan)
+#   lexical       course-code table + BM25 postings (None when RETRIEVAL_MODE=dense)
+#   similar       precomputed top-N similar courses per course (/similar; None if unavailable)
+#   topic_vectors synonym-group embeddings for vector-mode expansion (None otherwise)
+#   uncased       the encoder lowercases its input, so cache keys fold case too
+#   version       content hash from config.json; part of every cache key
+IndexBundle = namedtuple("IndexBundle", [
+    "index", "chunks", "course_table", "filter_index", "prereqs", "planner", "lexical", "similar", "model", "topic_vectors", "uncased", "config", "version", "loaded_at",
+])
+
+# The active bundle. load_index() builds a new one off to the side and swaps it in
+# with a single assignment; request code takes one snapshot (b = bundle) and uses
+# only that, so in-flight requests finish on the bundle they started with.
+bundle = None
 index_loaded = False
-loading_in_progress = False
-
-# Query expansion dictionary (same as query.py)
-TOPIC_SYNONYMS = {
-    r"\bnlp\b": [
-        "natural language processing", "computational linguistics",
-        "text mining", "language modeling", "transformers", "sequence models"
-    ],
-    r"\bml\b|\bmachine learning\b": [
-        "supervised learning", "unsupervised learning", "classification",
-        "regression", "neural networks", "support vector machines", "clustering"
-    ],
-    r"\bai\b": [
-        "artificial intelligence", "knowledge representation", "search algorithms",
-        "planning", "intelligent agents"
-    ],
-    r"\bdata viz\b|\bvisuali[sz]ation\b|\btableau\b": [
-        "data visualization", "tableau", "plotting", "dashboards", "visual analytics"
-    ],
-    r"\bstats?\b|\bstatistics\b": [
-        "statistical inference", "probability", "hypothesis testing",
-        "regression analysis", "experimental design"
-    ],
-    r"\boptimization\b|\boperations research\b|\bor\b": [
-        "linear programming", "integer programming", "stochastic optimization",
-        "operations research"
-    ],
-    r"\bcomputational biology\b|\bbioinformatics\b": [
-        "genomics", "sequence analysis", "biostatistics", "systems biology"
-    ],
-    r"\bsecurity\b|\bcybersecurity\b": [
-        "cryptography", "network security", "secure systems", "access control"
-    ],
-    r"\bdatabases?\b": [
-        "relational databases", "sql", "transaction processing", "query optimization"
-    ],
-    r"\beconomics?\b|\becon\b": [
-        "microeconomics", "macroeconomics", "econometrics"
-    ],
-    r"\bpsychology\b|\bcognitive\b": [
-        "cognitive science", "perception", "human factors", "behavioral science"
-    ],
-}
-
-def expand_query(q: str) -> str:
-    """Add synonyms/related phrases to the query while keeping the original text."""
-    q_low = q.lower()
-    expansions = []
-    for pattern, syns in TOPIC_SYNONYMS.items():
-        if re.search(pattern, q_low):
-            expansions.extend(syns)
-    if expansions:
-        return q + " | " + " ; ".join(dict.fromkeys(expansions))
-    return q
+load_error = None
+_load_lock = threading.Lock()  # one load at a time; held for the whole load
+
+# Multi-worker gunicorn: each worker has its own bundle. gunicorn.conf.py sets
+# WORKER_STATE_DIR, through which a /load-index on one worker makes every worker
+# reload (each notices within WORKER_SYNC_SECS, on its next request) and /metrics
+# sums the counters of all workers. Unset (a single process), nothing is shared.
+worker_sync = WorkerSync(os.environ.get("WORKER_STATE_DIR"), float(os.environ.get("WORKER_SYNC_SECS", 1)))
+
+# Caches for repeated queries (keys include the bundle version; cleared after a swap)
+CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", 600))
+embedding_cache = TTLCache(maxsize=int(os.environ.get("EMBEDDING_CACHE_SIZE", 2048)), ttl=CACHE_TTL)
+results_cache = TTLCache(maxsize=int(os.environ.get("RESULTS_CACHE_SIZE", 1024)), ttl=CACHE_TTL)
+
+# Cursor pagination: a /query with "paginate": true keeps its ranked hits in a session
+# and /query/next serves further pages from them. A session expires PAGE_SESSION_TTL
+# seconds after its last page; at most PAGE_SESSIONS are kept (LRU). Cursors also carry
+# the query, so a worker without the session (evicted, or created on another worker)
+# rebuilds it with one encode.
+PageSession = namedtuple("PageSession", ["pager", "query", "page_size", "filters", "version", "shard"])
+Cursor = namedtuple("Cursor", ["session_id", "offset", "version", "query", "page_size", "filters", "shard"],
+                    defaults=(None,))
+page_sessions = TTLCache(maxsize=int(os.environ.get("PAGE_SESSIONS", 1024)),
+                         ttl=float(os.environ.get("PAGE_SESSION_TTL", 300)))
+
+# Prometheus metrics served on /metrics
+metrics_registry = Registry()
+REQUESTS = metrics_registry.counter("rag_http_requests_total", "HTTP requests by endpoint, method and status", ("endpoint", "method", "status"))
+ERRORS = metrics_registry.counter("rag_http_errors_total", "HTTP 5xx responses by endpoint", ("endpoint",))
+REQUEST_LATENCY = metrics_registry.histogram("rag_http_request_duration_seconds", "End-to-end request latency", ("endpoint",))
+STAGE_LATENCY = metrics_registry.histogram("rag_stage_duration_seconds", "Time per retrieval stage (lexical/expand/encode/search/group once per batch)", ("stage",))
+CODE_LOOKUPS = metrics_registry.counter("rag_code_lookups_total", "Queries answered from the course-code table without the encoder")
+PLANS = metrics_registry.counter("rag_plans_total", "Plans built by /plan, by whether the search finished or hit its time budget", ("search",))
+BATCH_SIZE = metrics_registry.histogram("rag_batch_size", "Queries per encode+search batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+
+# Query expansion: concat (append synonym text, the original behaviour), vector
+# (blend per-topic vectors precomputed at load time into the raw query embedding)
+# or none. EXPANSION_QUERY_WEIGHT is the raw query's share in vector mode.
+expander = QueryExpander(
+    mode=os.environ.get("QUERY_EXPANSION", "concat"),
+    query_weight=float(os.environ.get("EXPANSION_QUERY_WEIGHT", DEFAULT_QUERY_WEIGHT)),
+)
+
+# Retrieval: hybrid (exact course-code lookups skip the model; other queries fuse
+# BM25 with the dense hits, LEXICAL_WEIGHT being BM25's share) or dense only.
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+    raise ValueError(f"Unknown retrieval mode '{RETRIEVAL_MODE}' (expected one of {', '.join(RETRIEVAL_MODES)})")
+LEXICAL_WEIGHT = float(os.environ.get("LEXICAL_WEIGHT", DEFAULT_LEXICAL_WEIGHT))
+
+# /plan: the search returns its best plan after PLAN_TIME_BUDGET_MS (a request may
+# ask for less) and never plans more than PLAN_MAX_TERMS terms.
+PLAN_TIME_BUDGET_MS = float(os.environ.get("PLAN_TIME_BUDGET_MS", 500))
+PLAN_MAX_TERMS = int(os.environ.get("PLAN_MAX_TERMS", 12))
+
+# Index shards: a manifest (SHARD_MANIFEST, default data/processed/shards.json) lets one
+# server search several catalogs. Its default shard is the active bundle; the others are
+# loaded on the first request that names them, at most RESIDENT_SHARDS at a time (LRU).
+# A query over several shards is encoded once and searched on SHARD_SEARCH_THREADS
+# threads. Without a manifest the single index in data/processed/index is served.
+DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "processed"
+SHARD_MANIFEST = Path(os.environ.get("SHARD_MANIFEST", DATA_DIR / MANIFEST_NAME))
+manifest = load_manifest(SHARD_MANIFEST) if SHARD_MANIFEST.exists() else None
+RESIDENT_SHARDS = int(os.environ.get("RESIDENT_SHARDS", 4))
+SHARD_SEARCH_THREADS = int(os.environ.get("SHARD_SEARCH_THREADS", 0)) or min(8, os.cpu_count() or 1)
+shard_pool = ThreadPoolExecutor(SHARD_SEARCH_THREADS, thread_name_prefix="shard-search")
+
+def _has_index_files(index_dir: Path) -> bool:
+    return (index_dir / "faiss.index").exists() and has_chunk_table(index_dir) and (index_dir / "config.json").exists()
+
+def _read_bundle(index_dir: Path, current=None):
+    """Load one index directory into an IndexBundle (sharing `current`'s encoder when it is the same)."""
+    idx_path, cfg_path = index_dir / "faiss.index", index_dir / "config.json"
+    config = json.loads(cfg_path.read_text())
+    # Indexes built before versioning was added get a hash of their files instead
+    version = config.get("version") or content_version([idx_path, cfg_path])
+    index = read_index(idx_path, config)  # memory-mapped so forked workers share it
+    chunks_df = load_chunk_table(index_dir)  # mmap'd columnar store, falls back to CSV
+    apply_search_params(index, config)  # efSearch / nprobe for ANN index types
+    if current is not None and encoder_key(current.config) == encoder_key(config):
+        model = current.model  # same encoder: don't hold a second copy of the weights
+    else:
+        model = load_encoder(config, index_dir)  # torch / torch_int8 / onnx / onnx_int8 per config.json
+    prereqs = PrereqGraph(chunks_df)
+    filter_index = FilterIndex(chunks_df, prereqs)
+    course_table = CourseTable(chunks_df)
+    return IndexBundle(
+        index=index,
+        chunks=chunks_df,
+        course_table=course_table,
+        filter_index=filter_index,
+        prereqs=prereqs,
+        planner=PlanOptimizer(prereqs, filter_index.credits_max),
+        lexical=load_lexical_index(index_dir, chunks_df) if RETRIEVAL_MODE == "hybrid" else None,
+        similar=load_similar_courses(index_dir, course_table, index),
+        model=model,
+        topic_vectors=expander.group_vectors(model) if expander.mode == "vector" else None,
+        uncased=is_uncased(model),
+        config=config,
+        version=version,
+        loaded_at=time.time(),
+    )
 
 def load_index():
-    """Load FAISS index, chunks CSV, and embedding model."""
-    global index, chunks_df, model, config, index_loaded, loading_in_progress
-    
-    if loading_in_progress:
-        return
+    """Load FAISS index, chunks and embedding model into a new bundle and swap it in.
+
+    Queries keep running against the current bundle for the whole load. Returns
+    True when a new bundle was installed, False if the load failed (the old
+    bundle stays active) or another load was already running.
+    """
+    global bundle, index_loaded, load_error
     
-    loading_in_progress = True
+    if not _load_lock.acquire(blocking=False):
+        return False
     
     try:
         print("🚀 Starting index loading...")
         
         # Determine index directory path (relative to this file)
         base_path = Path(__file__).resolve().parent.parent
-        index_dir = base_path / "data" / "processed" / "index"
+        index_dir = manifest.path(manifest.default) if manifest is not None else DATA_DIR / "index"
+        if manifest is not None:
+            print(f"📁 Shard manifest {SHARD_MANIFEST}: {len(manifest)} shard(s), default '{manifest.default}'")
         
         print(f"📁 Looking for data in: {index_dir}")
         print(f"📁 Absolute path: {index_dir.resolve()}")
@@ -116,9 +204,10 @@ def load_index():
         
         print(f"📄 faiss.index exists: {idx_path.exists()}")
         print(f"📄 chunks.csv exists: {tbl_path.exists()}")
+        print(f"📄 {STORE_DIRNAME} exists: {(index_dir / STORE_DIRNAME).exists()}")
         print(f"📄 config.json exists: {cfg_path.exists()}")
         
-        if not idx_path.exists() or not tbl_path.exists() or not cfg_path.exists():
+        if not _has_index_files(index_dir):
             print(f"❌ Missing index files in {index_dir}")
             # List what's actually in the index directory
             if index_dir.exists():
@@ -128,78 +217,743 @@ def load_index():
             raise FileNotFoundError(f"Missing index files in {index_dir}")
         
         print(f"[app] Loading index from {index_dir}...")
-        index = faiss.read_index(str(idx_path))
-        chunks_df = pd.read_csv(tbl_path)
-        config = json.loads(cfg_path.read_text())
-        model = SentenceTransformer(config["model"])
+        new_bundle = _read_bundle(index_dir, bundle)
+        chunks_df, config, version, prereqs = new_bundle.chunks, new_bundle.config, new_bundle.version, new_bundle.prereqs
+        
+        bundle = new_bundle  # the swap: one reference assignment
         index_loaded = True
-        print(f"✅ Loaded index with {len(chunks_df):,} chunks")
-        print(f"✅ Model: {config['model']}")
+        load_error = None
+        embedding_cache.clear()  # old-version entries can no longer be hit
+        results_cache.clear()
+        page_sessions.clear()  # their hits are rows of the old index
+        if shards is not None:
+            shards.clear()  # other shards are read from disk again on their next request
+        print(f"✅ Loaded index with {len(chunks_df):,} chunks ({len(new_bundle.course_table):,} courses)")
+        print(f"✅ Model: {config['model']} ({encoder_config(config)['backend']} encoder)")
+        print(f"✅ Index type: {config.get('index', {}).get('type', 'flat')}")
+        print(f"✅ Prerequisite graph: {prereqs.catalog_size:,} courses, {prereqs.edges:,} edges, "
+              f"{len(prereqs.cyclic):,} in cycles")
+        if new_bundle.lexical is not None:
+            print(f"✅ Retrieval: hybrid ({len(new_bundle.lexical):,} course codes, "
+                  f"{len(new_bundle.lexical.term_ids):,} BM25 terms, lexical weight {LEXICAL_WEIGHT})")
+        if new_bundle.similar is not None:
+            print(f"✅ Similar courses: top {new_bundle.similar.k} for {len(new_bundle.similar):,} courses")
+        else:
+            print("⚠️ No similar-courses graph (rebuild the index to add similar.npz); /similar is disabled")
+        print(f"✅ Index version: {version}")
+        return True
         
     except Exception as e:
         print(f"❌ Failed to load index: {e}")
         import traceback
         print(f"❌ Traceback: {traceback.format_exc()}")
-        index_loaded = False
+        load_error = str(e)
+        if bundle is not None:
+            print(f"⚠️ Still serving index version {bundle.version}")
+        return False
     finally:
-        loading_in_progress = False
+        _load_lock.release()
+
+def _load_shard(name: str):
+    index_dir = manifest.path(name)
+    if not _has_index_files(index_dir):
+        raise FileNotFoundError(f"Missing index files in {index_dir}")
+    t0 = time.perf_counter()
+    b = _read_bundle(index_dir, bundle)
+    print(f"✅ Loaded shard '{name}': {len(b.chunks):,} chunks ({len(b.course_table):,} courses), "
+          f"version {b.version}, in {time.perf_counter() - t0:.1f}s")
+    return b
+
+shards = ShardSet(_load_shard, RESIDENT_SHARDS) if manifest is not None else None
+
+def load_index_in_background() -> bool:
+    """Start load_index() on a daemon thread. False if a load is already running."""
+    if _load_lock.locked():
+        return False
+    threading.Thread(target=load_index, name="index-loader", daemon=True).start()
+    return True
+
+def _current_bundle():
+    """Snapshot the active bundle (and remember its version for this request's response header)."""
+    b = bundle
+    if b is not None and has_request_context():
+        g.index_version = b.version
+    return b
+
+def _chunk_k(top_courses: int) -> int:
+    # Pull more chunks than courses so multiple classes can surface
+    return max(50, top_courses * 5)
+
+def _encode_queries(b, texts):
+    """Embed query texts in one model call, reusing cached embeddings."""
+    embs = [None] * len(texts)
+    missing = {}
+    for i, t in enumerate(texts):
+        emb_key = (normalize_query(t, b.uncased), b.version)
+        cached = embedding_cache.get(emb_key)
+        if cached is not None:
+            embs[i] = cached
+        else:
+            missing.setdefault(emb_key, []).append(i)
+    
+    if missing:
+        keys = list(missing)
+        new_embs = b.model.encode([texts[missing[k][0]] for k in keys], normalize_embeddings=True).astype("float32")
+        for k, emb in zip(keys, new_embs):
+            emb = emb.reshape(1, -1)
+            embedding_cache.put(k, emb)
+            for i in missing[k]:
+                embs[i] = emb
+    
+    return np.vstack(embs)
+
+def _search(b, q_embs, k: int, filters=None):
+    """index.search, restricted inside FAISS to chunks matching `filters` (None = all)."""
+    return b.filter_index.search(b.index, b.config, q_embs, k, filters)
+
+def _retrieve_batch_timed(b, requests):
+    """retrieve_and_group_batch plus the {stage: seconds} it spent on the batch."""
+    timer = StageTimer()
+    if not requests:
+        return [], timer.durations
+    
+    ks = [_chunk_k(top_courses) for _, top_courses, _ in requests]
+    by_filters = {}
+    for i, (_, _, filters) in enumerate(requests):
+        by_filters.setdefault(filters, []).append(i)
+    
+    out = [None] * len(requests)
+    hybrid = {}
+    if b.lexical is not None:
+        # Course-code lookups are answered here and never reach the encoder
+        with timer.stage("lexical"):
+            for filters, rows in by_filters.items():
+                h = hybrid[filters] = HybridRetriever(b.lexical, LEXICAL_WEIGHT, b.filter_index.mask(filters))
+                for i in rows:
+                    hit = h.code_lookup(requests[i][0], ks[i])
+                    if hit is not None:
+                        out[i] = b.course_table.group(*hit, requests[i][1])
+                        CODE_LOOKUPS.inc()
+    dense = [i for i in range(len(requests)) if out[i] is None]
+    if not dense:
+        return _finish_batch(requests, out, timer)
+    
+    with timer.stage("expand"):
+        texts, matched = expander.prepare([requests[i][0] for i in dense])
+    with timer.stage("encode"):
+        q_embs = _encode_queries(b, texts)
+        if matched is not None:
+            q_embs = expander.combine(q_embs, matched, b.topic_vectors)
+    pos = {i: j for j, i in enumerate(dense)}
+    
+    def hits(i, h, row_scores, row_idxs, k):
+        if h is None:
+            return row_scores, row_idxs
+        with timer.stage("lexical"):
+            return h.fuse(requests[i][0], row_scores, row_idxs, k)
+    
+    for filters, rows in by_filters.items():
+        rows = [i for i in rows if out[i] is None]
+        if not rows:
+            continue
+        h = hybrid.get(filters)
+        with timer.stage("search"):
+            scores, idxs = _search(b, q_embs[[pos[i] for i in rows]], max(ks[i] for i in rows), filters)
+        for j, i in enumerate(rows):
+            top_courses, k = requests[i][1], ks[i]
+            dense_idxs = idxs[j, :k]
+            row_scores, row_idxs = hits(i, h, scores[j, :k], dense_idxs, k)
+            with timer.stage("group"):
+                results = b.course_table.group(row_scores, row_idxs, top_courses)
+            # Filtered: widen k while every slot was filled but too few distinct courses came back
+            while filters is not None and len(results) < top_courses and (dense_idxs >= 0).sum() == k:
+                k *= 4
+                with timer.stage("search"):
+                    row_scores, row_idxs = _search(b, q_embs[pos[i]:pos[i] + 1], k, filters)
+                dense_idxs = row_idxs[0]
+                row_scores, row_idxs = hits(i, h, row_scores[0], dense_idxs, k)
+                with timer.stage("group"):
+                    results = b.course_table.group(row_scores, row_idxs, top_courses)
+            out[i] = results
+    
+    return _finish_batch(requests, out, timer)
+
+def _finish_batch(requests, out, timer):
+    """Record batch size and stage timings; returns (out, durations)."""
+    BATCH_SIZE.observe(len(requests))
+    for stage, secs in timer.durations.items():
+        STAGE_LATENCY.observe(secs, stage)
+    return out, timer.durations
+
+def retrieve_and_group_batch(requests, b=None):
+    """Run one encode + one FAISS search for a list of (query, top_courses, filters) triples.
 
-def retrieve_and_group(query: str, top_courses: int = 8):
-    """Retrieve top courses based on query using RAG."""
+    Requests are searched together per distinct filter set. Returns one grouped
+    result list per request, identical to calling retrieve_and_group on each
+    query separately. `b` defaults to the active bundle.
+    """
+    b = b or bundle
+    if b is None:
+        return [[] for _ in requests]
+    return _retrieve_batch_timed(b, requests)[0]
+
+def _retrieve_batch_for_coalescer(items):
+    """(bundle, query, top_courses, filters) items -> [(results, durations)].
+
+    Items queued on either side of a reload carry different bundles; each group
+    is searched against the bundle its request started with.
+    """
+    by_bundle = {}
+    for i, item in enumerate(items):
+        by_bundle.setdefault(id(item[0]), []).append(i)
+    out = [None] * len(items)
+    for rows in by_bundle.values():
+        results, durations = _retrieve_batch_timed(items[rows[0]][0], [items[i][1:] for i in rows])
+        for i, r in zip(rows, results):
+            out[i] = (r, durations)
+    return out
+
+def _note_timings(durations: dict):
+    """Add stage durations to the current request's Server-Timing header."""
+    if has_request_context() and hasattr(g, "timings"):
+        for stage, secs in durations.items():
+            g.timings[stage] = g.timings.get(stage, 0.0) + secs
+
+# Coalesces concurrent /query requests into batched encode + search calls.
+# QUERY_BATCH_WINDOW_MS=0 disables it (each request searches on its own).
+QUERY_BATCH_WINDOW_MS = float(os.environ.get("QUERY_BATCH_WINDOW_MS", 2))
+QUERY_BATCH_MAX = int(os.environ.get("QUERY_BATCH_MAX", 32))
+QUERY_BATCH_LIMIT = int(os.environ.get("QUERY_BATCH_LIMIT", 1000))  # max queries per /query/batch call
+MAX_TOP_COURSES = int(os.environ.get("MAX_TOP_COURSES", 100))  # max top_courses (page size) per query
+coalescer = QueryCoalescer(_retrieve_batch_for_coalescer, window_ms=QUERY_BATCH_WINDOW_MS, max_batch=QUERY_BATCH_MAX)
+
+def retrieve_and_group(query: str, top_courses: int = 8, filters=None, b=None):
+    """Retrieve top courses based on query using RAG (optionally metadata-filtered)."""
     
-    if not index_loaded or index is None or model is None:
+    b = b or _current_bundle()
+    if b is None:
         return []
     
-    # Expand query
-    q_expanded = expand_query(query)
+    t0 = time.perf_counter()
+    results_key = (normalize_query(query, b.uncased), top_courses, filters, b.version)
+    cached = results_cache.get(results_key)
+    cache_secs = time.perf_counter() - t0
+    STAGE_LATENCY.observe(cache_secs, "cache")
+    _note_timings({"cache": cache_secs})
+    if cached is not None:
+        return [dict(r) for r in cached]
     
-    # Encode and search
-    q_emb = model.encode([q_expanded], normalize_embeddings=True).astype("float32")
-    chunk_k = max(50, top_courses * 5)
-    scores, idxs = index.search(q_emb, chunk_k)
-    idxs = idxs[0].tolist()
-    scores = scores[0].tolist()
+    t0 = time.perf_counter()
+    if QUERY_BATCH_WINDOW_MS > 0:
+        results, durations = coalescer.submit((b, query, top_courses, filters))
+    else:
+        results, durations = _retrieve_batch_for_coalescer([(b, query, top_courses, filters)])[0]
+    # Time spent waiting for a batch to form / for the batch ahead of us
+    queue_secs = max(0.0, time.perf_counter() - t0 - sum(durations.values()))
+    _note_timings({**durations, "queue": queue_secs})
     
-    # Get matching chunks
-    res_df = chunks_df.iloc[idxs].copy()
-    res_df.insert(0, "score", scores)
+    results_cache.put(results_key, [dict(r) for r in results])
+    return results
+
+def retrieve_and_group_many(requests, b=None):
+    """Cached front end to retrieve_and_group_batch for bulk callers."""
+    b = b or _current_bundle()
+    if b is None:
+        return [[] for _ in requests]
     
-    # Group by course (parent_id) and get best chunk per course
-    if "metadata.parent_id" not in res_df.columns:
-        res_df["metadata.parent_id"] = res_df["id"]
+    out = [None] * len(requests)
+    todo = []
+    for i, (q, top_courses, filters) in enumerate(requests):
+        cached = results_cache.get((normalize_query(q, b.uncased), top_courses, filters, b.version))
+        if cached is not None:
+            out[i] = [dict(r) for r in cached]
+        else:
+            todo.append(i)
     
-    best = (
-        res_df
-        .sort_values("score", ascending=False)
-        .drop_duplicates(subset=["metadata.parent_id"], keep="first")
-        .copy()
-    )
+    if todo:
+        batch, durations = _retrieve_batch_timed(b, [requests[i] for i in todo])
+        _note_timings(durations)
+        for i, results in zip(todo, batch):
+            q, top_courses, filters = requests[i]
+            results_cache.put((normalize_query(q, b.uncased), top_courses, filters, b.version), [dict(r) for r in results])
+            out[i] = results
     
-    top = best.head(top_courses).copy()
+    return out
+
+def _embed_query(b, query, timer):
+    """One query's embedding, expanded the way the dense search expects."""
+    with timer.stage("expand"):
+        texts, matched = expander.prepare([query])
+    with timer.stage("encode"):
+        q_emb = _encode_queries(b, texts)
+        if matched is not None:
+            q_emb = expander.combine(q_emb, matched, b.topic_vectors)
+    return q_emb
+
+def _hit_fetcher(b, query, filters, timer, encode=None):
+    """k -> (scores, idxs, more) for one query; the query is encoded here, once, not per call.
+
+    `encode()`, when given, supplies the embedding instead (shards searched together share one).
+    """
+    h = HybridRetriever(b.lexical, LEXICAL_WEIGHT, b.filter_index.mask(filters)) if b.lexical is not None else None
+    if h is not None and h.code_lookup(query, 1) is not None:
+        CODE_LOOKUPS.inc()
+        def lookup(k):
+            scores, idxs = h.code_lookup(query, k)
+            return scores, idxs, len(idxs) >= k
+        return lookup
     
-    # Extract fields safely
-    def safe_get(row, col, default=""):
-        val = row.get(col, default)
-        return str(val) if pd.notna(val) else default
+    q_emb = encode() if encode is not None else _embed_query(b, query, timer)
     
-    results = []
-    for _, row in top.iterrows():
-        course_code = safe_get(row, "metadata.course_code")
-        class_name = safe_get(row, "metadata.class_name")
-        subject = safe_get(row, "metadata.subject") or safe_get(row, "metadata.subject_code")
-        text = safe_get(row, "text")
-        score = float(row["score"]) if "score" in row else 0.0
-        
-        results.append({
-            "course_code": course_code,
-            "class_name": class_name,
-            "subject": subject,
-            "description": text,
-            "score": score
-        })
+    def search(k):
+        scores, idxs = _search(b, q_emb, k, filters)
+        more = (idxs[0] >= 0).sum() == k  # every slot filled: a larger k may find more
+        if h is None:
+            return scores[0], idxs[0], more
+        return (*h.fuse(query, scores[0], idxs[0], k), more)
+    return search
+
+def search_shards(targets, query: str, top_courses: int = 8, filters=None) -> list:
+    """Top courses for one query over several shards ([(name, bundle)]).
+
+    The query is encoded once and every shard is searched in parallel on
+    shard_pool; the per-shard hit lists are merged into one top-k by score and
+    then grouped into courses, each tagged with the shard it came from.
+    Filtered queries widen k on the shards that may hold more hits until
+    `top_courses` courses come back, like the single-index search.
+    """
+    # shard_bundles only lets shards with one model be searched together
+    results_key = (normalize_query(query, targets[0][1].uncased), top_courses, filters, tuple(b.version for _, b in targets))
+    cached = results_cache.get(results_key)
+    if cached is not None:
+        return [dict(r) for r in cached]
+    
+    timer = StageTimer()
+    shared = []
+    def encode():
+        if not shared:
+            shared.append(_embed_query(targets[0][1], query, timer))
+        return shared[0]
+    fetchers = [_hit_fetcher(b, query, filters, timer, encode) for _, b in targets]
+    tables = [b.course_table for _, b in targets]
+    ks = [_chunk_k(top_courses)] * len(targets)
+    hits = [None] * len(targets)
+    todo = list(range(len(targets)))
+    while todo:
+        with timer.stage("search"):
+            for i, hit in zip(todo, shard_pool.map(lambda i: fetchers[i](ks[i]), todo)):
+                hits[i] = hit
+        with timer.stage("group"):
+            grouped = group_hits(tables, *merge_hits([h[:2] for h in hits], max(ks)), top_courses)
+        if filters is None or len(grouped) >= top_courses:
+            break
+        todo = [i for i, h in enumerate(hits) if h[2]]
+        for i in todo:
+            ks[i] *= 4
     
+    results = [{**r, "shard": targets[s][0]} for s, r in grouped]
+    for stage, secs in timer.durations.items():
+        STAGE_LATENCY.observe(secs, stage)
+    _note_timings(timer.durations)
+    results_cache.put(results_key, [dict(r) for r in results])
     return results
 
+def _encode_cursor(sid, offset, session) -> str:
+    f = session.filters
+    filters = f and {
+        "subject": list(f.subjects or []), "credits_min": f.credits_min, "credits_max": f.credits_max,
+        "no_prereqs": f.no_prereqs, "completed": list(f.completed) if f.completed is not None else None,
+    }
+    payload = [sid, offset, session.version, session.query, session.page_size, filters, session.shard]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def _new_session(b, query, page_size, filters, timer, shard=None) -> PageSession:
+    page_size = min(page_size, MAX_TOP_COURSES)  # also bounds sessions resumed from a cursor
+    fetch = _hit_fetcher(b, query, filters, timer)
+    with timer.stage("search"):
+        pager = HitPager(b.course_table.parent_ids, fetch, _chunk_k(page_size), b.index.ntotal)
+    return PageSession(pager, query, page_size, filters, b.version, shard)
+
+def _read_page(b, sid, session, offset, timer):
+    with timer.stage("search"):
+        rows, scores = session.pager.page(offset, session.page_size)
+    with timer.stage("group"):
+        results = b.course_table.records(rows, scores)
+    page_sessions.put(sid, session)  # reading a page restarts the session's TTL
+    end = offset + len(rows)
+    _note_timings(timer.durations)
+    return {
+        "query": session.query,
+        "results": results,
+        "count": len(results),
+        "offset": offset,
+        "next_cursor": _encode_cursor(sid, end, session) if session.pager.has_more(end) else None,
+    }
+
+def start_pages(b, query, page_size, filters, shard=None) -> dict:
+    """First page of a paginated query; later pages come from next_page with its cursor."""
+    timer = StageTimer()
+    session = _new_session(b, query, page_size, filters, timer, shard)
+    return _read_page(b, secrets.token_urlsafe(12), session, 0, timer)
+
+def next_page(b, cursor) -> dict:
+    """The page a cursor points at; None when it was issued for another index version."""
+    if cursor.version != b.version:
+        return None  # its offsets count courses ranked by the old index
+    timer = StageTimer()
+    session = page_sessions.get(cursor.session_id)
+    if session is None or session.version != b.version:
+        session = _new_session(b, cursor.query, cursor.page_size, cursor.filters, timer, cursor.shard)
+    return _read_page(b, cursor.session_id, session, cursor.offset, timer)
+
+def _valid_top_courses(val) -> bool:
+    return isinstance(val, int) and not isinstance(val, bool) and 1 <= val <= MAX_TOP_COURSES
+
+def parse_query_request(data):
+    """Validate a /query body -> (query, top_courses, filters). Raises ValueError."""
+    if not isinstance(data, dict) or "query" not in data:
+        raise ValueError("Missing 'query' field in request")
+    user_query = data["query"]
+    top_courses = data.get("top_courses", 8)
+    filters = parse_filters(data.get("filters"))
+    if not isinstance(user_query, str) or not user_query.strip():
+        raise ValueError("Query cannot be empty")
+    if not _valid_top_courses(top_courses):
+        raise ValueError(f"'top_courses' must be an integer between 1 and {MAX_TOP_COURSES}")
+    return user_query, top_courses, filters
+
+def parse_paginate(data) -> bool:
+    """Validate the optional "paginate" flag of a /query body."""
+    paginate = data.get("paginate", False)
+    if not isinstance(paginate, bool):
+        raise ValueError("'paginate' must be true or false")
+    if paginate and not _valid_top_courses(data.get("top_courses", 8)):
+        raise ValueError(f"'top_courses' must be an integer between 1 and {MAX_TOP_COURSES}")
+    return paginate
+
+def parse_cursor(data) -> Cursor:
+    """Validate a /query/next body -> Cursor. Raises ValueError."""
+    raw = data.get("cursor") if isinstance(data, dict) else None
+    if not isinstance(raw, str) or not raw:
+        raise ValueError("Missing 'cursor' field in request")
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)))
+        cursor = Cursor(*payload)
+        # Cursors come back from clients: filters go through the same validation as /query's
+        filters = parse_filters({k: v for k, v in cursor.filters.items() if v is not None} if cursor.filters else None)
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Malformed cursor") from None
+    if not (isinstance(cursor.session_id, str) and isinstance(cursor.offset, int) and cursor.offset >= 0
+            and isinstance(cursor.query, str) and _valid_top_courses(cursor.page_size)
+            and (cursor.shard is None or isinstance(cursor.shard, str))):
+        raise ValueError("Malformed cursor")
+    return cursor._replace(filters=filters)
+
+def parse_shards(data, single=False):
+    """Validate the optional "shards" of a request -> shard names, or None for the default index."""
+    raw = data.get("shards") if isinstance(data, dict) else None
+    if raw is None:
+        return None
+    if manifest is None:
+        raise ValueError("This server has no shard manifest; drop 'shards'")
+    return manifest.select(raw, single)
+
+def shard_bundles(b, names) -> list:
+    """[(shard name, bundle)] for the selected shards, loading any that aren't resident.
+
+    `b` is the active bundle, which is the default shard. Raises ShardUnavailable
+    when a shard fails to load, ValueError when the shards can't share one query
+    embedding.
+    """
+    if names is None:
+        targets = [(manifest.default if manifest is not None else None, b)]
+    else:
+        targets = [(n, b if n == manifest.default else shards.get(n)) for n in names]
+    if len({t.config["model"] for _, t in targets}) > 1:
+        raise ValueError("The selected shards were embedded with different models; search them separately")
+    if has_request_context():
+        g.index_version = ",".join(t.version for _, t in targets)
+    return targets
+
+def parse_batch_request(data):
+    """Validate a /query/batch body -> [(query, top_courses, filters)]. Raises ValueError."""
+    if not isinstance(data, dict) or not isinstance(data.get("queries"), list):
+        raise ValueError("Missing 'queries' list in request")
+    
+    items = data["queries"]
+    if len(items) > QUERY_BATCH_LIMIT:
+        raise ValueError(f"Too many queries (max {QUERY_BATCH_LIMIT} per batch)")
+    
+    default_top = data.get("top_courses", 8)
+    default_filters = data.get("filters")
+    pairs = []
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            item = {"query": item}
+        if not isinstance(item, dict) or not isinstance(item.get("query"), str) or not item["query"].strip():
+            raise ValueError(f"Query #{i} must be a non-empty string or an object with a 'query' field")
+        top_courses = item.get("top_courses", default_top)
+        if not _valid_top_courses(top_courses):
+            raise ValueError(f"Query #{i}: 'top_courses' must be an integer between 1 and {MAX_TOP_COURSES}")
+        try:
+            filters = parse_filters(item.get("filters", default_filters))
+        except ValueError as e:
+            raise ValueError(f"Query #{i}: {e}")
+        pairs.append((item["query"], top_courses, filters))
+    return pairs
+
+def _parse_completed(data) -> list:
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    completed = data.get("completed", [])
+    if not isinstance(completed, list) or not all(isinstance(x, str) for x in completed):
+        raise ValueError("'completed' must be a list of course codes")
+    if not isinstance(data.get("concurrent", False), bool):
+        raise ValueError("'concurrent' must be true or false")
+    return completed
+
+def parse_eligible_request(data):
+    """Validate an /eligible body -> (completed, concurrent, subjects). Raises ValueError."""
+    completed = _parse_completed(data)
+    subjects = data.get("subject")
+    if isinstance(subjects, str):
+        subjects = [subjects]
+    if subjects is not None and (not isinstance(subjects, list) or not all(isinstance(x, str) for x in subjects)):
+        raise ValueError("'subject' must be a subject code or a list of codes")
+    return completed, data.get("concurrent", False), {x.strip().upper() for x in subjects} if subjects else None
+
+def parse_unlocks_request(data):
+    """Validate an /unlocks body -> (course, completed, concurrent). Raises ValueError."""
+    if not isinstance(data, dict) or not isinstance(data.get("course"), str) or not data["course"].strip():
+        raise ValueError("Missing 'course' field in request")
+    return data["course"], _parse_completed(data), data.get("concurrent", False)
+
+def _course_records(b, nodes, completed_bits) -> list:
+    """Graph node ids -> course dicts (code, name, subject, corequisites still to take)."""
+    g, table = b.prereqs, b.course_table
+    summaries = table.summaries
+    return [
+        {**summaries[table.parent_ids[g.first_row[n]]], "pending_coreqs": g.pending_coreqs(n, completed_bits)}
+        for n in nodes.tolist()
+    ]
+
+def eligible_courses(b, completed, concurrent=False, subjects=None) -> dict:
+    """Courses whose prerequisites are all in `completed` (a few bitset ops over the graph)."""
+    g = b.prereqs
+    completed_bits, unknown = g.resolve(completed)
+    nodes = np.flatnonzero(g.eligible(completed_bits, concurrent))
+    if subjects:
+        nodes = np.array([n for n in nodes.tolist() if g.codes[n].split(" ")[0] in subjects], dtype=np.int64)
+    records = _course_records(b, nodes, completed_bits)
+    return {"eligible": records, "count": len(records), "unknown_codes": unknown}
+
+def unlocked_courses(b, course, completed, concurrent=False) -> dict:
+    """What completing `course` opens up: newly eligible courses and everything that builds on it.
+
+    Returns None when `course` is not in the catalog.
+    """
+    g = b.prereqs
+    code = parse_code(course)
+    if code not in g.ids or g.ids[code] >= g.catalog_size:
+        return None
+    node = g.ids[code]
+    completed_bits, unknown = g.resolve(completed)
+    return {
+        "course": code,
+        "unlocks": _course_records(b, np.flatnonzero(g.unlocks(completed_bits, node, concurrent)), completed_bits),
+        "leads_to": _course_records(b, np.flatnonzero(g.leads_to(node)), completed_bits),
+        "unknown_codes": unknown,
+    }
+
+def _audit_codes(courses, field) -> list:
+    if not isinstance(courses, list):
+        raise ValueError(f"'audit.{field}' must be a list")
+    codes = []
+    for c in courses:
+        code = c.get("code") if isinstance(c, dict) else c
+        if not isinstance(code, str):
+            raise ValueError(f"Every entry in 'audit.{field}' needs a course code")
+        codes.append(code)
+    return codes
+
+def _is_number(val) -> bool:
+    # JSON's Infinity/NaN parse as floats; int() of them raises outside the ValueError path
+    return isinstance(val, (int, float)) and not isinstance(val, bool) and math.isfinite(val)
+
+def _number(data, key, default, kind=float):
+    val = data.get(key, default)
+    if not _is_number(val):
+        raise ValueError(f"'{key}' must be a number")
+    return kind(val)
+
+def parse_plan_request(data):
+    """Validate a /plan body (the frontend's parsedAudit + preferences) -> PlanOptimizer.solve kwargs. Raises ValueError."""
+    if not isinstance(data, dict) or not isinstance(data.get("audit"), dict):
+        raise ValueError("Missing 'audit' object in request")
+    audit, prefs = data["audit"], data.get("preferences") or {}
+    if not isinstance(prefs, dict):
+        raise ValueError("'preferences' must be an object")
+    selected = prefs.get("requirements")
+    if selected is not None and (not isinstance(selected, list) or not all(isinstance(x, str) for x in selected)):
+        raise ValueError("'preferences.requirements' must be a list of category names")
+
+    requirements, overrides = [], {}
+    remaining = audit.get("remainingRequirements") or []
+    if not isinstance(remaining, list):
+        raise ValueError("'audit.remainingRequirements' must be a list")
+    for i, req in enumerate(remaining):
+        if not isinstance(req, dict) or not isinstance(req.get("category"), str):
+            raise ValueError(f"Requirement #{i} needs a 'category'")
+        if selected and req["category"] not in selected:
+            continue
+        needed = req.get("coursesNeeded")
+        if needed is None:
+            needed = 1
+        elif not isinstance(needed, int) or isinstance(needed, bool) or needed < 0:
+            raise ValueError(f"Requirement #{i}: 'coursesNeeded' must be a non-negative integer")
+        courses = _audit_codes(req.get("courses") or [], f"remainingRequirements[{i}].courses")
+        needed = min(needed, len(courses))  # the planner can't pick more courses than the audit lists
+        for c in req.get("courses") or []:
+            # Credits from the audit win over the catalog's
+            if isinstance(c, dict) and _is_number(c.get("credits")) and c["credits"] > 0 and parse_code(c["code"]):
+                overrides[parse_code(c["code"])] = float(c["credits"])
+        if needed > 0 and courses:
+            requirements.append(Requirement(req["category"], needed, courses))
+
+    # creditLoad is the frontend's list of acceptable loads; like generatePlan, its max is the cap
+    max_credits = prefs.get("creditLoad", data.get("max_credits", 15))
+    if isinstance(max_credits, list) and max_credits and all(_is_number(x) for x in max_credits):
+        max_credits = max(max_credits)
+    if not _is_number(max_credits):
+        raise ValueError("'preferences.creditLoad' must be a number or a non-empty list of numbers")
+    min_credits = _number(data, "min_credits", 0)
+    max_terms = _number(data, "max_terms", DEFAULT_MAX_TERMS, int)
+    if not 1 <= max_terms <= PLAN_MAX_TERMS:
+        raise ValueError(f"'max_terms' must be between 1 and {PLAN_MAX_TERMS}")
+    budget = _number(data, "time_budget_ms", PLAN_TIME_BUDGET_MS)
+    if not max_credits > 0 or not 0 <= min_credits <= max_credits:
+        raise ValueError("Credit bounds must satisfy 0 <= min_credits <= max_credits, max_credits > 0")
+    return {
+        "completed": _audit_codes(audit.get("completedCourses") or [], "completedCourses"),
+        "in_progress": _audit_codes(audit.get("inProgressCourses") or [], "inProgressCourses"),
+        "requirements": requirements,
+        "min_credits": min_credits,
+        "max_credits": max_credits,
+        "max_terms": max_terms,
+        "time_budget_ms": min(max(budget, 1.0), PLAN_TIME_BUDGET_MS),
+        "credit_overrides": overrides,
+    }
+
+def build_plan(b, params) -> dict:
+    """Run the plan search and attach course names to the result."""
+    result = b.planner.solve(**params)
+    PLANS.inc("timed_out" if result["stats"]["timed_out"] else "finished")
+    g, table = b.prereqs, b.course_table
+    for i, term in enumerate(result["terms"]):
+        courses = [
+            {**c, "title": table.summaries[table.parent_ids[g.first_row[g.ids[c["code"]]]]]["class_name"]}
+            for c in term
+        ]
+        result["terms"][i] = {"term": i + 1, "credits": sum(c["credits"] for c in courses), "courses": courses}
+    return result
+
+def parse_similar_k(raw, limit: int) -> int:
+    """Validate the ?k= of /similar (defaults to, and is capped at, the stored neighbour count)."""
+    if raw is None:
+        return limit
+    try:
+        k = int(raw)
+    except ValueError:
+        raise ValueError("'k' must be an integer") from None
+    if not 1 <= k <= limit:
+        raise ValueError(f"'k' must be between 1 and {limit}")
+    return k
+
+def similar_courses(b, course, k) -> dict:
+    """Precomputed nearest courses to `course`; None when it is not in the catalog."""
+    hit = b.similar.lookup(parse_code(course), k)
+    if hit is None:
+        return None
+    i, rows, scores = hit
+    summaries = b.course_table.summaries
+    similar = [{**summaries[r], "score": round(float(s), 4)} for r, s in zip(rows.tolist(), scores.tolist())]
+    return {"course": summaries[i], "similar": similar, "count": len(similar)}
+
+def shard_listing() -> dict:
+    """The manifest's shards, with which of them are loaded right now."""
+    if manifest is None:
+        return {"default": None, "shards": [], "max_resident": 0}
+    resident = set(shards.resident())
+    if bundle is not None:
+        resident.add(manifest.default)
+    return {
+        "default": manifest.default,
+        "shards": [{"name": s.name, **s.info, "resident": s.name in resident} for s in manifest.shards.values()],
+        "max_resident": shards.max_resident,
+    }
+
+@app.before_request
+def _start_request_timer():
+    g.t0 = time.perf_counter()
+    g.timings = {}
+
+@app.before_request
+def _follow_reloads():
+    """Reload in the background when another worker has loaded a new index."""
+    token = worker_sync.pending_reload()
+    if token is not None and load_index_in_background():
+        worker_sync.reload_started(token)
+
+@app.after_request
+def _record_request(response):
+    """Request counters/latency histogram + Server-Timing header on every response."""
+    t0 = getattr(g, "t0", None)
+    if t0 is None:
+        return response
+    total = time.perf_counter() - t0
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    if response.status_code >= 500:
+        ERRORS.inc(endpoint)
+    REQUEST_LATENCY.observe(total, endpoint)
+    response.headers["Server-Timing"] = server_timing({**g.timings, "total": total})
+    response.headers["Timing-Allow-Origin"] = "*"  # let the React app read it cross-origin
+    # The bundle this request was answered from (or the active one, for non-query routes)
+    version = g.get("index_version") or (bundle.version if bundle is not None else None)
+    if version:
+        response.headers["X-Index-Version"] = version
+    worker_sync.start_publishing(metrics_registry.snapshot)
+    return response
+
+@metrics_registry.collector
+def _state_metrics():
+    """Cache, batching and index gauges, read at scrape time."""
+    caches = {"embeddings": embedding_cache.stats(), "results": results_cache.stats(), "page_sessions": page_sessions.stats()}
+    batching = coalescer.stats()
+    b = bundle
+    return [
+        ("rag_cache_hits_total", "counter", "Cache hits", [({"cache": n}, c["hits"]) for n, c in caches.items()]),
+        ("rag_cache_misses_total", "counter", "Cache misses", [({"cache": n}, c["misses"]) for n, c in caches.items()]),
+        ("rag_cache_evictions_total", "counter", "Cache evictions (LRU or TTL)", [({"cache": n}, c["evictions"]) for n, c in caches.items()]),
+        ("rag_cache_entries", "gauge", "Entries currently cached", [({"cache": n}, c["size"]) for n, c in caches.items()]),
+        ("rag_coalescer_batches_total", "counter", "Batches run by the request coalescer", [({}, batching["batches"])]),
+        ("rag_index_loaded", "gauge", "1 when an index is loaded", [({}, int(index_loaded))]),
+        ("rag_index_info", "gauge", "Version of the active index", [({"version": b.version}, 1)] if b is not None else []),
+        ("rag_index_loaded_timestamp_seconds", "gauge", "When the active index was swapped in", [({}, b.loaded_at if b is not None else 0)]),
+        ("rag_index_loading", "gauge", "1 while a background index load is running", [({}, int(_load_lock.locked()))]),
+        ("rag_index_vectors", "gauge", "Vectors in the FAISS index", [({}, b.index.ntotal if b is not None else 0)]),
+        ("rag_index_courses", "gauge", "Distinct courses in the index", [({}, len(b.course_table) if b is not None else 0)]),
+        ("rag_shards_resident", "gauge", "Shards loaded besides the default one", [({}, len(shards.resident()) if shards is not None else 0)]),
+        ("rag_shard_loads_total", "counter", "Shards loaded on demand", [({}, shards.loads if shards is not None else 0)]),
+        ("rag_shard_evictions_total", "counter", "Shards dropped to stay under RESIDENT_SHARDS", [({}, shards.evictions if shards is not None else 0)]),
+    ]
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics (text exposition format), counters and histograms summed over workers."""
+    worker_sync.publish(metrics_registry.snapshot)
+    return Response(metrics_registry.render(worker_sync.others()), mimetype="text/plain; version=0.0.4")
+
 @app.route("/")
 def home():
     """Health check endpoint."""
@@ -212,14 +966,33 @@ def home():
 @app.route("/health")
 def health():
     """Detailed health check."""
+    b = _current_bundle()
     return jsonify({
-        "status": "ok" if index_loaded else "loading",
-        "index_loaded": index_loaded,
-        "model_loaded": model is not None,
-        "loading_in_progress": loading_in_progress,
+        "status": "ok" if b is not None else "loading",
+        "index_loaded": b is not None,
+        "model_loaded": b is not None,
+        "loading_in_progress": _load_lock.locked(),
+        "index_version": b.version if b is not None else None,
+        "index_loaded_at": b.loaded_at if b is not None else None,
+        "encoder": encoder_config(b.config)["backend"] if b is not None else None,
+        "query_expansion": expander.mode,
+        "retrieval": RETRIEVAL_MODE,
+        "load_error": load_error,
+        "cache": {
+            "embeddings": embedding_cache.stats(),
+            "results": results_cache.stats(),
+            "page_sessions": page_sessions.stats(),
+        },
+        "batching": coalescer.stats(),
+        "shards": shards.stats() if shards is not None else None,
         "timestamp": time.time()
     })
 
+@app.route("/shards")
+def list_shards():
+    """Catalogs this server can search (empty without a shard manifest)."""
+    return jsonify(shard_listing())
+
 @app.route("/test")
 def test():
     """Simple test endpoint."""
@@ -227,46 +1000,211 @@ def test():
 
 @app.route("/load-index", methods=["POST"])
 def load_index_endpoint():
-    """Manually trigger index loading."""
-    if loading_in_progress:
-        return jsonify({"status": "loading", "message": "Index loading in progress"})
+    """Load the index on disk in the background; queries keep using the current one.
+
+    ?wait=true blocks until the load finishes (for deploy scripts). The other
+    gunicorn workers reload too, each on its next request.
+    """
+    current = bundle.version if bundle is not None else None
+    worker_sync.announce_reload()
+    if request.args.get("wait", "").lower() in ("1", "true", "yes") and not _load_lock.locked():
+        if not load_index():
+            return jsonify({"status": "failed", "error": load_error, "index_version": current}), 500
+        return jsonify({"status": "done", "index_loaded": index_loaded, "index_version": bundle.version})
     
-    load_index()
-    return jsonify({"status": "done", "index_loaded": index_loaded})
+    if not load_index_in_background():
+        return jsonify({"status": "loading", "message": "Index loading in progress", "index_version": current}), 202
+    return jsonify({"status": "loading", "message": "Loading index in the background", "index_version": current}), 202
 
 @app.route("/query", methods=["POST"])
 def query():
     """
     Query endpoint that accepts a question and returns relevant courses.
     """
-    if not index_loaded:
+    b = _current_bundle()
+    if b is None:
         return jsonify({"error": "Index not loaded. Please wait or trigger loading via /load-index", "index_loaded": False}), 503
     
     try:
-        data = request.get_json()
-        
-        if not data or "query" not in data:
-            return jsonify({"error": "Missing 'query' field in request"}), 400
+        try:
+            data = request.get_json()
+            user_query, top_courses, filters = parse_query_request(data)
+            paginate = parse_paginate(data)
+            targets = shard_bundles(b, parse_shards(data, single=paginate))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except ShardUnavailable as e:
+            return jsonify({"error": str(e)}), 503
+        shard, b = targets[0]
         
-        user_query = data["query"]
-        top_courses = data.get("top_courses", 8)
+        if paginate:
+            # Keeps the ranked hits for /query/next; bypasses the results cache and the coalescer
+            return jsonify({**start_pages(b, user_query, top_courses, filters, shard), "index_version": b.version})
         
-        if not user_query.strip():
-            return jsonify({"error": "Query cannot be empty"}), 400
+        # Retrieve courses (several shards: fan out and merge; not coalesced)
+        if len(targets) > 1:
+            results = search_shards(targets, user_query, top_courses, filters)
+        else:
+            results = retrieve_and_group(user_query, top_courses, filters, b)
         
-        # Retrieve courses
-        results = retrieve_and_group(user_query, top_courses)
-        
-        return jsonify({
+        t0 = time.perf_counter()
+        response = jsonify({
             "query": user_query,
             "results": results,
-            "count": len(results)
+            "count": len(results),
+            "index_version": g.index_version
         })
+        serialize_secs = time.perf_counter() - t0
+        STAGE_LATENCY.observe(serialize_secs, "serialize")
+        _note_timings({"serialize": serialize_secs})
+        return response
     
     except Exception as e:
         print(f"[app] Error processing query: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/query/next", methods=["POST"])
+def query_next():
+    """
+    Next page of a paginated /query, read from its stored hit list (the query is not encoded again).
+    Body: {"cursor": "<next_cursor from the previous page>"}
+    """
+    b = _current_bundle()
+    if b is None:
+        return jsonify({"error": "Index not loaded. Please wait or trigger loading via /load-index", "index_loaded": False}), 503
+    try:
+        cursor = parse_cursor(request.get_json(silent=True))
+        _, b = shard_bundles(b, parse_shards({"shards": cursor.shard}, single=True))[0]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ShardUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    page = next_page(b, cursor)
+    if page is None:
+        return jsonify({"error": "The index was reloaded since this cursor was issued; run the query again"}), 410
+    return jsonify({**page, "index_version": b.version})
+
+@app.route("/query/batch", methods=["POST"])
+def query_batch():
+    """
+    Batch query endpoint for bulk workloads.
+    Body: {"queries": [{"query": "...", "top_courses": 8, "filters": {...}}, "plain string", ...]}
+    All queries are embedded in one model call and searched in one FAISS call.
+    """
+    b = _current_bundle()
+    if b is None:
+        return jsonify({"error": "Index not loaded. Please wait or trigger loading via /load-index", "index_loaded": False}), 503
+    
+    try:
+        try:
+            data = request.get_json()
+            pairs = parse_batch_request(data)
+            targets = shard_bundles(b, parse_shards(data))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except ShardUnavailable as e:
+            return jsonify({"error": str(e)}), 503
+        
+        if len(targets) > 1:
+            batch = [search_shards(targets, *p) for p in pairs]
+        else:
+            batch = retrieve_and_group_many(pairs, targets[0][1])
+        
+        return jsonify({
+            "results": [
+                {"query": q, "results": results, "count": len(results)}
+                for (q, _, _), results in zip(pairs, batch)
+            ],
+            "count": len(batch),
+            "index_version": g.index_version
+        })
+    
+    except Exception as e:
+        print(f"[app] Error processing batch query: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/eligible", methods=["POST"])
+def eligible():
+    """
+    Courses the student can take now, given the courses they have completed.
+    """
+    b = _current_bundle()
+    if b is None:
+        return jsonify({"error": "Index not loaded. Please wait or trigger loading via /load-index", "index_loaded": False}), 503
+    try:
+        data = request.get_json(silent=True)
+        completed, concurrent, subjects = parse_eligible_request(data)
+        _, b = shard_bundles(b, parse_shards(data, single=True))[0]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ShardUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({**eligible_courses(b, completed, concurrent, subjects), "index_version": b.version})
+
+@app.route("/unlocks", methods=["POST"])
+def unlocks():
+    """
+    Courses that completing one more course would make eligible, and everything that requires it.
+    """
+    b = _current_bundle()
+    if b is None:
+        return jsonify({"error": "Index not loaded. Please wait or trigger loading via /load-index", "index_loaded": False}), 503
+    try:
+        data = request.get_json(silent=True)
+        course, completed, concurrent = parse_unlocks_request(data)
+        _, b = shard_bundles(b, parse_shards(data, single=True))[0]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ShardUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    result = unlocked_courses(b, course, completed, concurrent)
+    if result is None:
+        return jsonify({"error": f"Unknown course '{course}'"}), 404
+    return jsonify({**result, "index_version": b.version})
+
+@app.route("/plan", methods=["POST"])
+def plan():
+    """
+    Multi-term course plan for a parsed degree audit (best found within the time budget).
+    """
+    b = _current_bundle()
+    if b is None:
+        return jsonify({"error": "Index not loaded. Please wait or trigger loading via /load-index", "index_loaded": False}), 503
+    try:
+        data = request.get_json(silent=True)
+        params = parse_plan_request(data)
+        _, b = shard_bundles(b, parse_shards(data, single=True))[0]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ShardUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({**build_plan(b, params), "index_version": b.version})
+
+@app.route("/similar/<course_code>")
+def similar(course_code):
+    """
+    Courses most like the given one, read from the precomputed similarity graph.
+    """
+    b = _current_bundle()
+    if b is None:
+        return jsonify({"error": "Index not loaded. Please wait or trigger loading via /load-index", "index_loaded": False}), 503
+    try:
+        _, b = shard_bundles(b, parse_shards(request.args.to_dict(), single=True))[0]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ShardUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    if b.similar is None:
+        return jsonify({"error": "No similar-courses graph for this index; rebuild it with build_index.py"}), 503
+    try:
+        k = parse_similar_k(request.args.get("k"), b.similar.k)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result = similar_courses(b, course_code, k)
+    if result is None:
+        return jsonify({"error": f"Unknown course '{course_code}'"}), 404
+    return jsonify({**result, "index_version": b.version})
+
 # Initialize the app when it starts
 def initialize_app():
     """Load the index when the app starts in a separate thread."""
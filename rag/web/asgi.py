@@ -0,0 +1,361 @@
+"""
+ASGI entry point for the Schedule Sculptor RAG API:  uvicorn asgi:app
+
+Serves the same routes as app.py on top of its retrieval core (index bundle,
+caches, parsing, metrics), but handles requests on an event loop. Encode +
+search run in batches on a BoundedExecutor sized to the available cores (it
+replaces app.py's coalescer here). Once MAX_PENDING requests are queued or
+running, new ones get an immediate 503 with Retry-After instead of waiting in
+an unbounded queue. Every request has a deadline; work still queued when it
+passes is dropped and the request gets a 504.
+
+Environment (in addition to app.py's; QUERY_BATCH_MAX caps the batch size):
+  INFERENCE_WORKERS   executor threads (default: available cores)
+  MAX_PENDING         requests admitted at once, queued + running (default 64 x workers)
+  REQUEST_TIMEOUT_MS  per-request deadline (default 10000); a client may ask for
+                      less with an X-Request-Timeout-Ms header
+"""
+
+import os
+import time
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import app as core
+from admission import BoundedExecutor, DeadlineExceeded, Overloaded
+from embed_pipeline import available_cores
+from metrics import server_timing
+from shards import ShardUnavailable
+
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0)) or available_cores()
+MAX_PENDING = int(os.environ.get("MAX_PENDING", 0)) or 64 * INFERENCE_WORKERS
+REQUEST_TIMEOUT_MS = float(os.environ.get("REQUEST_TIMEOUT_MS", 10000))
+
+
+def _process_jobs(jobs):
+    """[(bundle, [(query, top_courses, filters), ...])] -> one result-list list per job.
+
+    Jobs from the same bundle share one cached, batched retrieve_and_group_many call.
+    A job over several shards carries their [(name, bundle)] list instead and is
+    fanned out query by query.
+    """
+    out = [None] * len(jobs)
+    by_bundle = {}
+    for i, (b, pairs) in enumerate(jobs):
+        if isinstance(b, list):
+            out[i] = [core.search_shards(b, *p) for p in pairs]
+            continue
+        by_bundle.setdefault(id(b), []).append(i)
+    for rows in by_bundle.values():
+        b = jobs[rows[0]][0]
+        results = core.retrieve_and_group_many([p for i in rows for p in jobs[i][1]], b)
+        pos = 0
+        for i in rows:
+            n = len(jobs[i][1])
+            out[i], pos = results[pos:pos + n], pos + n
+    return out
+
+
+executor = BoundedExecutor(_process_jobs, INFERENCE_WORKERS, MAX_PENDING, max_batch=core.QUERY_BATCH_MAX)
+
+REJECTED = core.metrics_registry.counter("rag_rejected_requests_total", "Requests refused by the ASGI server", ("reason",))
+
+
+@core.metrics_registry.collector
+def _executor_metrics():
+    s = executor.stats()
+    return [
+        ("rag_executor_queued", "gauge", "Requests waiting for an inference thread", [({}, s["queued"])]),
+        ("rag_executor_running", "gauge", "Requests in a batch being run", [({}, s["running"])]),
+        ("rag_executor_batches_total", "counter", "Batches run by the inference executor", [({}, s["batches"])]),
+    ]
+
+
+def _deadline(request) -> float:
+    ms = REQUEST_TIMEOUT_MS
+    try:
+        ms = min(ms, float(request.headers.get("x-request-timeout-ms", ms)))
+    except ValueError:
+        pass
+    return time.monotonic() + ms / 1000
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+async def _targets(b, data, single=False) -> list:
+    """[(shard name, bundle)] a request selected; off the event loop, as naming a shard may load it."""
+    return await run_in_threadpool(core.shard_bundles, b, core.parse_shards(data, single))
+
+
+def _version(targets) -> str:
+    return ",".join(b.version for _, b in targets)
+
+
+def _not_loaded():
+    return JSONResponse({"error": "Index not loaded. Please wait or trigger loading via /load-index", "index_loaded": False}, 503)
+
+
+async def home(request):
+    return JSONResponse({"status": "ok", "message": "Schedule Sculptor RAG API is running", "index_loaded": core.index_loaded})
+
+
+async def test(request):
+    return JSONResponse({"status": "ok", "message": "Test endpoint working"})
+
+
+async def health(request):
+    b = core.bundle
+    return JSONResponse({
+        "status": "ok" if b is not None else "loading",
+        "index_loaded": b is not None,
+        "loading_in_progress": core._load_lock.locked(),
+        "index_version": b.version if b is not None else None,
+        "load_error": core.load_error,
+        "cache": {
+            "embeddings": core.embedding_cache.stats(),
+            "results": core.results_cache.stats(),
+        },
+        "executor": executor.stats(),
+        "shards": core.shards.stats() if core.shards is not None else None,
+        "timestamp": time.time(),
+    })
+
+
+async def shards(request):
+    return JSONResponse(core.shard_listing())
+
+
+async def metrics(request):
+    return Response(core.metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+async def load_index(request):
+    """Load the index on disk in the background; queries keep using the current one."""
+    current = core.bundle.version if core.bundle is not None else None
+    started = core.load_index_in_background()
+    message = "Loading index in the background" if started else "Index loading in progress"
+    return JSONResponse({"status": "loading", "message": message, "index_version": current}, 202)
+
+
+async def query(request):
+    b = core.bundle
+    if b is None:
+        return _not_loaded()
+    try:
+        data = await _json_body(request)
+        user_query, top_courses, filters = core.parse_query_request(data)
+        paginate = core.parse_paginate(data)
+        targets = await _targets(b, data, single=paginate)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    shard, b = targets[0]
+    version = _version(targets)
+
+    if paginate:
+        # Not coalesced: encodes and searches this one query in a worker thread
+        page = await run_in_threadpool(core.start_pages, b, user_query, top_courses, filters, shard)
+        return JSONResponse({**page, "index_version": version}, headers={"X-Index-Version": version})
+    job = (targets if len(targets) > 1 else b, [(user_query, top_courses, filters)])
+    results = (await executor.run(job, deadline=_deadline(request)))[0]
+    return JSONResponse({"query": user_query, "results": results, "count": len(results), "index_version": version},
+                        headers={"X-Index-Version": version})
+
+
+async def query_next(request):
+    b = core.bundle
+    if b is None:
+        return _not_loaded()
+    try:
+        cursor = core.parse_cursor(await _json_body(request))
+        _, b = (await _targets(b, {"shards": cursor.shard}, single=True))[0]
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    # Usually a slice of the stored hits, but may widen the FAISS search: keep it off the event loop
+    page = await run_in_threadpool(core.next_page, b, cursor)
+    if page is None:
+        return JSONResponse({"error": "The index was reloaded since this cursor was issued; run the query again"}, 410)
+    return JSONResponse({**page, "index_version": b.version}, headers={"X-Index-Version": b.version})
+
+
+async def query_batch(request):
+    b = core.bundle
+    if b is None:
+        return _not_loaded()
+    try:
+        data = await _json_body(request)
+        pairs = core.parse_batch_request(data)
+        targets = await _targets(b, data)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    version = _version(targets)
+
+    batch = await executor.run((targets if len(targets) > 1 else targets[0][1], pairs), deadline=_deadline(request))
+    return JSONResponse({
+        "results": [
+            {"query": q, "results": results, "count": len(results)}
+            for (q, _, _), results in zip(pairs, batch)
+        ],
+        "count": len(batch),
+        "index_version": version,
+    }, headers={"X-Index-Version": version})
+
+
+async def eligible(request):
+    b = core.bundle
+    if b is None:
+        return _not_loaded()
+    try:
+        data = await _json_body(request)
+        completed, concurrent, subjects = core.parse_eligible_request(data)
+        _, b = (await _targets(b, data, single=True))[0]
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    # Bitset ops over the prerequisite graph: fast enough to run on the event loop
+    return JSONResponse({**core.eligible_courses(b, completed, concurrent, subjects), "index_version": b.version},
+                        headers={"X-Index-Version": b.version})
+
+
+async def unlocks(request):
+    b = core.bundle
+    if b is None:
+        return _not_loaded()
+    try:
+        data = await _json_body(request)
+        course, completed, concurrent = core.parse_unlocks_request(data)
+        _, b = (await _targets(b, data, single=True))[0]
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    result = core.unlocked_courses(b, course, completed, concurrent)
+    if result is None:
+        return JSONResponse({"error": f"Unknown course '{course}'"}, 404)
+    return JSONResponse({**result, "index_version": b.version}, headers={"X-Index-Version": b.version})
+
+
+async def plan(request):
+    b = core.bundle
+    if b is None:
+        return _not_loaded()
+    try:
+        data = await _json_body(request)
+        params = core.parse_plan_request(data)
+        _, b = (await _targets(b, data, single=True))[0]
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    # Up to PLAN_TIME_BUDGET_MS of CPU: keep it off the event loop
+    result = await run_in_threadpool(core.build_plan, b, params)
+    return JSONResponse({**result, "index_version": b.version}, headers={"X-Index-Version": b.version})
+
+
+async def similar(request):
+    b = core.bundle
+    if b is None:
+        return _not_loaded()
+    try:
+        _, b = (await _targets(b, dict(request.query_params), single=True))[0]
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    if b.similar is None:
+        return JSONResponse({"error": "No similar-courses graph for this index; rebuild it with build_index.py"}, 503)
+    course = request.path_params["course_code"]
+    try:
+        k = core.parse_similar_k(request.query_params.get("k"), b.similar.k)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    # A row slice of the precomputed graph: no model or FAISS call
+    result = core.similar_courses(b, course, k)
+    if result is None:
+        return JSONResponse({"error": f"Unknown course '{course}'"}, 404)
+    return JSONResponse({**result, "index_version": b.version}, headers={"X-Index-Version": b.version})
+
+
+async def _overloaded(request, exc: Overloaded):
+    REJECTED.inc("queue_full")
+    return JSONResponse({"error": str(exc)}, 503, headers={"Retry-After": str(exc.retry_after)})
+
+
+async def _shard_unavailable(request, exc: ShardUnavailable):
+    return JSONResponse({"error": str(exc)}, 503)
+
+
+async def _deadline_exceeded(request, exc: DeadlineExceeded):
+    REJECTED.inc("deadline")
+    return JSONResponse({"error": str(exc)}, 504)
+
+
+class RequestMetrics:
+    """Same request counters, latency histogram and headers as the Flask app (plain ASGI middleware)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["Server-Timing"] = server_timing({"total": time.perf_counter() - t0})
+                headers["Timing-Allow-Origin"] = "*"
+                if "x-index-version" not in headers and core.bundle is not None:
+                    headers["X-Index-Version"] = core.bundle.version
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            route = scope.get("route")
+            endpoint = route.path if route is not None else "unmatched"
+            core.REQUESTS.inc(endpoint, scope["method"], str(status[0]))
+            if status[0] >= 500 and status[0] not in (503, 504):
+                core.ERRORS.inc(endpoint)
+            core.REQUEST_LATENCY.observe(time.perf_counter() - t0, endpoint)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    print(f"🚀 ASGI server: {executor.workers} inference thread(s), up to {executor.max_pending} pending requests")
+    if core.bundle is None:
+        core.load_index_in_background()
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/", home),
+        Route("/test", test),
+        Route("/health", health),
+        Route("/metrics", metrics),
+        Route("/shards", shards),
+        Route("/load-index", load_index, methods=["POST"]),
+        Route("/query", query, methods=["POST"]),
+        Route("/query/next", query_next, methods=["POST"]),
+        Route("/query/batch", query_batch, methods=["POST"]),
+        Route("/eligible", eligible, methods=["POST"]),
+        Route("/unlocks", unlocks, methods=["POST"]),
+        Route("/plan", plan, methods=["POST"]),
+        Route("/similar/{course_code}", similar),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["Server-Timing", "X-Index-Version", "Retry-After"]),
+        Middleware(RequestMetrics),
+    ],
+    exception_handlers={Overloaded: _overloaded, DeadlineExceeded: _deadline_exceeded, ShardUnavailable: _shard_unavailable},
+    lifespan=lifespan,
+)
@@ -0,0 +1,105 @@
+"""
+Request coalescer for the RAG API.
+Concurrent callers submit single items; a background thread gathers the items
+that arrive within a short window (up to a max batch size) and hands them to
+one batch function, so encode/search run once per batch instead of per request.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueryCoalescer:
+    """Collects submitted items into batches and runs `process_batch` on them.
+
+    `process_batch(items)` must return one result per item, in order. When it
+    raises, the batch's items are retried one at a time, so the exception only
+    reaches the callers whose item fails on its own.
+    """
+
+    def __init__(self, process_batch, window_ms: float = 2.0, max_batch: int = 32):
+        self.process_batch = process_batch
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item, timeout: float = None):
+        """Queue `item` and block until its batch has been processed."""
+        self._ensure_worker()
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut.result(timeout=timeout)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork (gunicorn --preload), so (re)start per process
+        if self._worker is not None and self._pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid() and self._worker.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name="query-coalescer", daemon=True)
+            self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _process(self, items):
+        results = self.process_batch(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"batch returned {len(results)} results for {len(items)} items")
+        self.batches += 1
+        self.items += len(items)
+        return results
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self._process([item for item, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._run_singly(batch)
+                continue
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
+
+    def _run_singly(self, batch):
+        # One bad item must not fail the callers batched with it
+        for item, fut in batch:
+            try:
+                fut.set_result(self._process([item])[0])
+            except Exception as e:
+                fut.set_exception(e)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,74 @@
+"""
+Gunicorn settings for the RAG API (used by start.sh).
+
+The app is preloaded in the master: the SentenceTransformer weights, the
+memory-mapped FAISS index and the memory-mapped chunk metadata are loaded once
+and then shared copy-on-write by every forked worker. gc.freeze() before the
+fork keeps the garbage collector from touching (and so copying) those pages,
+and each worker caps its torch/FAISS threads so N workers don't oversubscribe
+the container's cores.
+
+Workers share a temporary state directory (WORKER_STATE_DIR, see
+worker_sync.py): a POST /load-index on one worker makes all of them reload,
+and /metrics sums the counters and histograms of every worker.
+
+Environment:
+  PORT              listen port (default 8080)
+  GUNICORN_WORKERS  worker processes (default 1)
+  GUNICORN_THREADS  request threads per worker (default 8)
+  TORCH_THREADS     intra-op threads per worker (default: cores // workers, min 1)
+"""
+
+import gc
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+worker_class = "gthread"
+preload_app = True
+timeout = 300
+accesslog = "-"
+errorlog = "-"
+
+os.environ.setdefault("GUNICORN_PRELOAD", "true")  # app.py loads the index at import
+# Set before the app is preloaded so the master and every forked worker see it
+_state_dir = None
+if not os.environ.get("WORKER_STATE_DIR"):
+    _state_dir = os.environ["WORKER_STATE_DIR"] = tempfile.mkdtemp(prefix="rag-workers-")
+
+
+def _threads_per_worker() -> int:
+    if os.environ.get("TORCH_THREADS"):
+        return max(1, int(os.environ["TORCH_THREADS"]))
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def when_ready(server):
+    # Everything allocated so far (model, tables, caches' structures) becomes
+    # permanent: the GC never scans it again, so its pages stay shared after fork
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"preloaded app frozen for fork; {workers} worker(s) x {threads} thread(s)")
+
+
+def post_fork(server, worker):
+    n = _threads_per_worker()
+    try:
+        import torch
+        torch.set_num_threads(n)
+    except ImportError:
+        pass
+    try:
+        import faiss
+        faiss.omp_set_num_threads(n)
+    except ImportError:
+        pass
+    server.log.info(f"worker {worker.pid}: torch/faiss threads = {n}")
+
+
+def on_exit(server):
+    if _state_dir:
+        shutil.rmtree(_state_dir, ignore_errors=True)
@@ -0,0 +1,159 @@
+"""
+Minimal Prometheus-format metrics for the RAG API (no extra dependency).
+Counters and histograms are plain dicts behind one lock, cheap enough to
+update on every request; render() produces the text exposition format.
+snapshot() exports a process's counters and histograms so that another
+process can add them into its own render() (multi-worker gunicorn).
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond grouping up to slow cold encodes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v) -> str:
+    return repr(float(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            return [[list(lv), v] for lv, v in self._values.items()]
+
+    def render(self, others=()) -> list:
+        """Exposition lines; `others` are samples() from other processes, added in."""
+        with self._lock:
+            values = dict(self._values)
+        for samples in others:
+            for lv, v in samples:
+                values[tuple(lv)] = values.get(tuple(lv), 0.0) + v
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for lv, v in sorted(values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labels, lv)} {_fmt_value(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def samples(self) -> list:
+        with self._lock:
+            return [[list(lv), list(s)] for lv, s in self._series.items()]
+
+    def render(self, others=()) -> list:
+        """Exposition lines; `others` are samples() from other processes, added in."""
+        with self._lock:
+            series = {lv: list(s) for lv, s in self._series.items()}
+        for samples in others:
+            for lv, s in samples:
+                if len(s) != len(self.buckets) + 2:
+                    continue  # written with other buckets
+                mine = series.setdefault(tuple(lv), [0] * (len(self.buckets) + 1) + [0.0])
+                series[tuple(lv)] = [a + b for a, b in zip(mine, s)]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for lv, s in sorted(series.items()):
+            cum = 0
+            for b, c in zip(self.buckets, s):
+                cum += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, lv, [('le', repr(b))])} {cum}")
+            cum += s[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, lv, [('le', '+Inf')])} {cum}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, lv)} {repr(s[-1])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, lv)} {cum}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # callables returning extra (name, type, help, [(labels dict, value)])
+
+    def counter(self, *args, **kwargs) -> Counter:
+        m = Counter(*args, **kwargs)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        m = Histogram(*args, **kwargs)
+        self._metrics.append(m)
+        return m
+
+    def collector(self, fn):
+        """Register fn() -> [(name, type, help, [(labels dict, value), ...]), ...] evaluated at scrape time."""
+        self._collectors.append(fn)
+        return fn
+
+    def snapshot(self) -> dict:
+        """{metric name: samples} of the counters and histograms (JSON-friendly)."""
+        return {m.name: m.samples() for m in self._metrics}
+
+    def render(self, others=()) -> str:
+        """Text exposition. `others` are snapshot()s of other processes: their counters and
+        histograms are added to this process's; collector gauges stay this process's own."""
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render([o[m.name] for o in others if m.name in o]))
+        for fn in self._collectors:
+            for name, mtype, help, samples in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {mtype}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_fmt_labels(list(labels), list(labels.values()))} {_fmt_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Accumulates wall-clock seconds per named stage: `with timer.stage("encode"): ...`."""
+
+    def __init__(self):
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + time.perf_counter() - t0
+
+
+def server_timing(durations: dict) -> str:
+    """Server-Timing header value (milliseconds) for a {stage: seconds} dict."""
+    return ", ".join(f"{name};dur={secs * 1000:.2f}" for name, secs in durations.items())
@@ -2,12 +2,13 @@
 # start.sh
 echo "Starting Schedule Sculptor API..."
 cd /app/web
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # Async server with bounded inference executor and load shedding (asgi.py)
+    echo "Starting Uvicorn (ASGI)..."
+    exec uvicorn asgi:app --host 0.0.0.0 --port "${PORT:-8080}"
+fi
 echo "Starting Gunicorn..."
 export GUNICORN_PRELOAD="true" # Set environment variable for app.py logic
-exec gunicorn app:app \
-    --bind 0.0.0.0:${PORT:-8080} \
-    --workers 1 \
-    --timeout 300 \
-    --access-logfile - \
-    --error-logfile - \
-    --preload
\ No newline at end of file
+# Workers, threads and preload/fork settings live in gunicorn.conf.py
+# (GUNICORN_WORKERS / GUNICORN_THREADS / TORCH_THREADS env vars)
+exec gunicorn -c gunicorn.conf.py app:app
@@ -0,0 +1,122 @@
+"""
+Coordination between the worker processes of one multi-worker gunicorn server.
+
+Each worker holds its own index bundle and its own metrics. gunicorn.conf.py
+gives the workers of one server a shared state directory (WORKER_STATE_DIR):
+  reload.stamp        POST /load-index writes a new token here; every worker
+                      compares it with the last token it acted on (on a request,
+                      at most once per `check_secs`) and reloads when it changed,
+                      so all workers end up on the same index version
+  metrics-<pid>.json  each worker's counters and histograms, rewritten every
+                      `check_secs` by a background thread; /metrics adds the
+                      other workers' files to the answering worker's own values
+Without a state directory (one process: python app.py, uvicorn) every method
+is a no-op.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+STAMP_NAME = "reload.stamp"
+METRICS_GLOB = "metrics-*.json"
+
+
+class WorkerSync:
+    def __init__(self, state_dir=None, check_secs: float = 1.0):
+        self.dir = Path(state_dir) if state_dir else None
+        self.check_secs = float(check_secs)
+        self._lock = threading.Lock()
+        self._seen = self._read_stamp()  # inherited by forked workers
+        self._next_check = 0.0
+        self._publisher_pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.dir is not None
+
+    def _read_stamp(self):
+        if self.dir is None:
+            return None
+        try:
+            return (self.dir / STAMP_NAME).read_text()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, name: str, text: str):
+        tmp = self.dir / f".{name}.{os.getpid()}.tmp"
+        tmp.write_text(text)
+        tmp.replace(self.dir / name)  # readers see the old file or the new one, never half of it
+
+    def announce_reload(self):
+        """Ask every other worker to reload; the caller loads the index itself."""
+        if self.dir is None:
+            return
+        token = f"{os.getpid()}:{time.time_ns()}"
+        with self._lock:
+            self._write(STAMP_NAME, token)
+            self._seen = token
+
+    def pending_reload(self):
+        """The newest reload token this worker has not acted on yet, or None (checked at most every check_secs)."""
+        if self.dir is None:
+            return None
+        now = time.monotonic()
+        if now < self._next_check:
+            return None
+        with self._lock:
+            if now < self._next_check:
+                return None
+            self._next_check = now + self.check_secs
+            token = self._read_stamp()
+            return token if token is not None and token != self._seen else None
+
+    def reload_started(self, token: str):
+        """Record that this worker is reloading for `token`."""
+        with self._lock:
+            self._seen = token
+
+    def start_publishing(self, snapshot):
+        """Write `snapshot()` (a JSON-able dict) to this worker's metrics file every check_secs.
+
+        Starts a daemon thread once per process; threads do not survive fork,
+        so each worker starts its own on its first request.
+        """
+        if self.dir is None or self._publisher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._publisher_pid == os.getpid():
+                return
+            self._publisher_pid = os.getpid()
+        threading.Thread(target=self._publish_loop, args=(snapshot,), name="metrics-publisher", daemon=True).start()
+
+    def _publish_loop(self, snapshot):
+        while True:
+            time.sleep(self.check_secs)
+            self.publish(snapshot)
+
+    def publish(self, snapshot):
+        """Write this worker's metrics snapshot now."""
+        if self.dir is None:
+            return
+        try:
+            self._write(f"metrics-{os.getpid()}.json", json.dumps(snapshot()))
+        except OSError as e:
+            print(f"[worker-sync] could not write metrics snapshot: {e}")
+
+    def others(self) -> list:
+        """Metrics snapshots written by the other workers (including ones that have exited)."""
+        if self.dir is None:
+            return []
+        own = f"metrics-{os.getpid()}.json"
+        out = []
+        for path in sorted(self.dir.glob(METRICS_GLOB)):
+            if path.name == own:
+                continue
+            try:
+                out.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue  # being replaced right now; picked up on the next scrape
+        return out